@@ -9,8 +9,107 @@ MAX_BARCODES_SMALL = 30
 # maximum number of days to retain the content of the task directory
 MAX_DAYS_RETENTION = 30
 
+# number of days after which DONE task directories are packed in one bundle, locally and remotely
+ARCHIVE_AFTER_DAYS = 7
+
 # task hour for large task
 LARGE_TASK_HOUR = 26
 
+# processing windows by size of task: start and end hours. The predicted durations of the tasks of one date
+# must fit in the window of their size
+PROCESSING_WINDOW_HOURS = {'LARGE': (LARGE_TASK_HOUR % 24, 8), 'SMALL': (8, 22)}
+
+# items processed per hour by a task when no DONE task is available to measure the throughput
+DEFAULT_ITEMS_PER_HOUR = 300
+
+# number of last DONE tasks of a source IZ used to measure the items processed per hour
+THROUGHPUT_HISTORY_TASKS = 10
+
+# regular expressions of the valid barcodes by source IZ (cell B3 of the "General" sheet of the form), the whole
+# barcode must match. The "*DEFAULT*" pattern is used for the IZ without pattern
+BARCODE_PATTERNS = {'*DEFAULT*': r'[A-Za-z0-9][A-Za-z0-9._/-]*'}
+
+# invalid barcodes found by the form check: 'reject' sets the task in ERROR, 'flag' reports them in
+# form_check_result.txt and they are not processed
+INVALID_BARCODES_ACTION = 'reject'
+
+# number of days the barcodes transferred by DONE tasks stay in the barcode index, they are rejected by the form
+# check during this time and can be transferred again after
+BARCODE_INDEX_DONE_DAYS = 30
+
 # list of directories to be processed (account column in task_summary.xlsx file)
-SBK_DIR = ['sbkuzh', 'sbkzbz', 'sbkzhk', 'sbkubs', 'sbkrzs', 'sbkhsg', 'sbkzbs']
\ No newline at end of file
+SBK_DIR = ['sbkuzh', 'sbkzbz', 'sbkzhk', 'sbkubs', 'sbkrzs', 'sbkhsg', 'sbkzbs']
+
+# number of record snapshots written at once in the records archive of a task
+RECORDS_ARCHIVE_BATCH_SIZE = 50
+
+# maximum number of seconds pending record snapshots wait before being written in the records archive
+RECORDS_ARCHIVE_FLUSH_SECONDS = 30
+
+# maximum number of Alma API calls per second for all the threads (Alma allows 25 calls per second)
+ALMA_API_CALLS_PER_SECOND = 20
+
+# Alma API daily quota, used by the dry run when Alma doesn't return the number of remaining calls
+ALMA_DAILY_API_QUOTA = 500000
+
+# number of seconds the source records fetched from Alma are kept in the local cache, 0 to disable the cache
+ALMA_CACHE_TTL_SECONDS = 43200
+
+# maximum size in bytes of the local cache of the source records, least recently used records are evicted
+ALMA_CACHE_MAX_BYTES = 200000000
+
+# number of workers of each stage of the transfer pipeline. Bib records and holdings of the same NZ record are
+# always handled by the same worker of their stage
+PIPELINE_CONCURRENCY = {'fetch': 4, 'bib': 2, 'holding': 2, 'item': 2, 'rename': 2}
+
+# maximum number of jobs started per second by each stage of the transfer pipeline, None for no limit other than
+# ALMA_API_CALLS_PER_SECOND
+PIPELINE_JOBS_PER_SECOND = {'fetch': None, 'bib': None, 'holding': None, 'item': None, 'rename': None}
+
+# maximum number of barcodes waiting in each queue of the transfer pipeline
+PIPELINE_QUEUE_SIZE = 20
+
+# seconds between two logs of the depths of the queues of the transfer pipeline
+PIPELINE_LOG_SECONDS = 60
+
+# when True, all items are created in the destination IZ before the barcodes of the source items are updated
+TWO_PHASE_RENAME = False
+
+# number of source items renamed in parallel in the second phase of the transfer
+RENAME_CONCURRENCY = 5
+
+# number of items checked in parallel by the reconciliation of the tasks
+RECONCILIATION_CONCURRENCY = 8
+
+# error labels of the processing file caused by temporary failures of Alma, the barcodes with these errors are
+# retried at the end of the task
+TRANSIENT_ERRORS = ['error_503_failed_to_create', 'unknown_holding_error', 'source_fetch_timeout']
+
+# number of retry sweeps of the barcodes with transient errors at the end of a task
+RETRY_SWEEPS = 1
+
+# seconds waited before each retry sweep
+RETRY_SWEEP_DELAY_SECONDS = 60
+
+# when True, the barcodes with transient errors remaining after the retry sweeps are processed again by a SMALL
+# continuation task created with a RESTART form
+AUTO_RESTART_TRANSIENT_ERRORS = True
+
+# number of NEW tasks downloaded and checked in parallel
+CHECK_FORMS_CONCURRENCY = 4
+
+# number of processes parsing and writing Excel files, 0 to handle them in the main process
+EXCEL_PROCESSES = 2
+
+# daemon mode: seconds between two runs of the SMALL tasks workflow
+DAEMON_SMALL_INTERVAL_SECONDS = 3600
+
+# daemon mode: seconds between two checks of the schedule
+DAEMON_TICK_SECONDS = 30
+
+# path of an optional log file with one json object per record, None to disable it
+LOG_JSON_PATH = None
+
+# number of hot spots and allocation sites logged at the end of a profiled phase or task, profiling is enabled
+# with the "--profile" option or the SPEIBI_PROFILE=1 environment variable
+PROFILING_TOP_ENTRIES = 15
@@ -1,10 +1,55 @@
 import paramiko
+from paramiko.sftp import CMD_ATTRS, CMD_CLOSE, CMD_DATA, CMD_HANDLE, CMD_OPEN, CMD_READ, CMD_REMOVE, CMD_RMDIR, \
+    CMD_STAT, CMD_STATUS, CMD_WRITE, SFTP_FLAG_CREATE, SFTP_FLAG_READ, SFTP_FLAG_TRUNC, SFTP_FLAG_WRITE, SFTP_OK, int64
 import stat
 import os
 import logging
+from typing import Dict, Hashable, List, Optional, Tuple
 # from typing import Optional
 # import sys
 
+# Size in bytes of the read and write requests of the pipelined transfers
+REQUEST_SIZE = 32768
+
+# Files larger than this size in bytes are transferred one by one with the prefetch of paramiko
+MAX_PIPELINED_FILE_SIZE = 8 * 1024 * 1024
+
+# Maximum number of files transferred in one pipelined batch
+PIPELINE_BATCH_SIZE = 64
+
+# Maximum number of bytes read ahead by the pipelined downloads, the responses are kept in memory until the
+# files are written
+MAX_PIPELINED_BYTES = 16 * 1024 * 1024
+
+
+def split_by_size(files: List[Tuple[str, str]], sizes: List[int], max_bytes: int) -> List[List[Tuple[str, str]]]:
+    """Split files in groups whose total size doesn't exceed a maximum
+
+    Parameters
+    ----------
+    files : List[Tuple[str, str]]
+        Files to split
+    sizes : List[int]
+        Sizes of the files in bytes
+    max_bytes : int
+        Maximum total size of a group, a larger file is alone in its group
+
+    Returns
+    -------
+    List[List[Tuple[str, str]]]
+        Groups of files in the original order
+    """
+    groups = []
+    group_size = 0
+    for file, size in zip(files, sizes):
+        if len(groups) == 0 or (group_size + size > max_bytes and len(groups[-1]) > 0):
+            groups.append([])
+            group_size = 0
+        groups[-1].append(file)
+        group_size += size
+
+    return groups
+
 
 # class LogFile:
 #     def __init__(self, file_name: Optional[str] = "", task_name: Optional[str] = None):
@@ -38,6 +83,91 @@ import logging
 #         logging.shutdown()
 
 
+class PipelinedRequests:
+    """Requests sent to the SFTP server without waiting for the responses
+
+    All the requests are sent at once and the responses are collected afterwards, a batch costs about one
+    round-trip. The private request API of paramiko is used, as in the prefetch of the files. If it is not
+    available, see :meth:`is_supported`, the files are transferred one by one.
+
+    Attributes
+    ----------
+    client : paramiko.SFTPClient
+        SFTP client sending the requests
+    pending : dict
+        Keys are the numbers of the pending requests, values the keys of the requests
+    responses : dict
+        Keys are the keys of the requests, values the types and messages of the responses other than status
+    errors : dict
+        Keys are the keys of the failed requests, values the error messages
+    """
+    def __init__(self, client: paramiko.SFTPClient) -> None:
+        """Initialize an empty batch of requests
+
+        Parameters
+        ----------
+        client : paramiko.SFTPClient
+            SFTP client sending the requests
+        """
+        self.client = client
+        self.pending = {}
+        self.responses = {}
+        self.errors = {}
+
+    def send(self, key: Hashable, command: int, *args) -> None:
+        """Send a request
+
+        Parameters
+        ----------
+        key : Hashable
+            Key of the request in the responses and errors, for example the path
+        command : int
+            SFTP command, for example CMD_REMOVE
+        args : list
+            Arguments of the command
+        """
+        num = self.client._async_request(self, command, *args)
+        self.pending[num] = key
+
+    @staticmethod
+    def is_supported(client: paramiko.SFTPClient) -> bool:
+        """Check if the private request API used by the pipelined requests is available in paramiko
+
+        Parameters
+        ----------
+        client : paramiko.SFTPClient
+            SFTP client sending the requests
+
+        Returns
+        -------
+        bool
+            True if the requests can be pipelined
+        """
+        return hasattr(client, '_async_request') is True and hasattr(client, '_read_response') is True
+
+    def _async_response(self, t: int, msg: paramiko.Message, num: int) -> None:
+        """Handle the response of a request, called by paramiko"""
+        key = self.pending.pop(num)
+        if t == CMD_STATUS:
+            code = msg.get_int()
+            if code != SFTP_OK:
+                self.errors[key] = msg.get_text()
+            return
+        self.responses[key] = (t, msg)
+
+    def wait(self) -> Dict[Hashable, str]:
+        """Wait for the responses of all the requests
+
+        Returns
+        -------
+        Dict[Hashable, str]
+            Keys are the keys of the failed requests, values the error messages
+        """
+        while len(self.pending) > 0:
+            self.client._read_response()
+        return self.errors
+
+
 class SFTP:
     """Class to manage SFTP connections
 
@@ -45,6 +175,8 @@ class SFTP:
     ----------
     SFTP_Client : paramiko.SFTPClient
         SFTP client to manage the connection
+    pipelining : bool
+        True if the transfers of several files use pipelined requests, see :class:`PipelinedRequests`
     """
     def __init__(self, host, user, password):
         """Constructor of SFTP class
@@ -63,6 +195,10 @@ class SFTP:
                                username=user,
                                password=password)
             self.SFTP_Client = ssh_client.open_sftp()
+            self.pipelining = PipelinedRequests.is_supported(self.SFTP_Client)
+            if self.pipelining is False:
+                logging.warning(f'Request API of paramiko {paramiko.__version__} not supported => files are '
+                                f'transferred one by one')
 
         except Exception as e:
             logging.error(f"Error connecting to SFTP: {e}")
@@ -78,6 +214,41 @@ class SFTP:
         contents = self.SFTP_Client.listdir(path)
         return contents
 
+    def listdir_attr(self, path: str) -> List[paramiko.SFTPAttributes]:
+        """List the contents of a directory with their attributes
+
+        One request returns the names, modes and modification times of all the entries.
+
+        Parameters
+        ----------
+        path : str
+            Path of the directory to list
+
+        Returns
+        -------
+        List[paramiko.SFTPAttributes]
+            Attributes of the entries, names are in the "filename" attribute
+        """
+        return self.SFTP_Client.listdir_attr(path)
+
+    def get_mtime(self, path: str) -> Optional[int]:
+        """Get the modification time of a path
+
+        Parameters
+        ----------
+        path : str
+            Path to check
+
+        Returns
+        -------
+        Optional[int]
+            Modification time as timestamp, None if the path doesn't exist
+        """
+        try:
+            return self.SFTP_Client.stat(path).st_mtime
+        except FileNotFoundError:
+            return None
+
     def mkdir(self, path: str) -> None:
         """Create a directory in the remote server
 
@@ -158,27 +329,79 @@ class SFTP:
             except IOError:
                 logging.error(f"Error removing file {path}")
 
-    def rmtree(self, path: str) -> None:
+    def rmtree(self, path: str) -> Dict[str, str]:
         """Remove a directory and its contents in the remote server
 
+        Each directory is listed once with the modes of its entries. The files are then removed in one
+        pipelined batch and the directories in one batch per depth, the deepest first.
+
         Parameters
         ----------
         path : str
             Path of the directory to remove
+
+        Returns
+        -------
+        Dict[str, str]
+            Keys are the paths not removed, values the error messages
         """
-        if self.is_path(path) is False:
+        try:
+            mode = self.SFTP_Client.lstat(path).st_mode
+        except FileNotFoundError:
             logging.error(f"Directory {path} not found")
-            return
-        if self.is_dir(path) is False:
+            return {path: 'not found'}
+
+        if stat.S_ISDIR(mode) is False:
             self.remove(path)
-            return
-        for f in self.listdir(path):
-            f_path = path + '/' + f
-            if self.is_dir(f_path) is True:
-                self.rmtree(f_path)
-            else:
-                self.remove(f_path)
-        self.remove(path)
+            return {}
+
+        files = []
+        directories = [[path]]
+        errors = {}
+
+        # Walk the tree, one request per directory
+        while len(directories[-1]) > 0:
+            subdirectories = []
+            for directory in directories[-1]:
+                try:
+                    entries = self.SFTP_Client.listdir_attr(directory)
+                except IOError as e:
+                    errors[directory] = str(e)
+                    continue
+                for entry in entries:
+                    entry_path = f'{directory}/{entry.filename}'
+                    if stat.S_ISDIR(entry.st_mode) is True:
+                        subdirectories.append(entry_path)
+                    else:
+                        files.append(entry_path)
+            directories.append(subdirectories)
+
+        if self.pipelining is False:
+            for entry_path, remove in ([(file_path, self.SFTP_Client.remove) for file_path in files]
+                                       + [(directory, self.SFTP_Client.rmdir)
+                                          for level in reversed(directories) for directory in level]):
+                try:
+                    remove(entry_path)
+                except IOError as e:
+                    errors[entry_path] = str(e)
+
+        else:
+            requests = PipelinedRequests(self.SFTP_Client)
+            for file_path in files:
+                requests.send(file_path, CMD_REMOVE, file_path)
+            errors.update(requests.wait())
+
+            for level in reversed(directories):
+                requests = PipelinedRequests(self.SFTP_Client)
+                for directory in level:
+                    requests.send(directory, CMD_RMDIR, directory)
+                errors.update(requests.wait())
+
+        if len(errors) > 0:
+            examples = ', '.join(f'{p}: {e}' for p, e in list(errors.items())[:3])
+            logging.error(f"Error removing {len(errors)} entries of {path} ({examples})")
+
+        return errors
 
     def put(self, local_path: str, remote_path: str) -> None:
         """Copy a file from local to remote server
@@ -210,8 +433,163 @@ class SFTP:
         except IOError as e:
             logging.error(f"Error copying file {remote_path} to {local_path}: {e}")
 
+    def put_many(self, files: List[Tuple[str, str]]) -> Dict[str, str]:
+        """Copy several files from local to remote server with pipelined requests
+
+        The files are opened in one batch of requests, then written and closed in a second batch. The size of
+        the uploaded files is not checked with an additional stat request, errors of the writes are reported.
+
+        Parameters
+        ----------
+        files : List[Tuple[str, str]]
+            Local paths and remote paths of the files to copy
+
+        Returns
+        -------
+        Dict[str, str]
+            Keys are the remote paths not copied, values the error messages
+        """
+        errors = {}
+        small_files = []
+        for local_path, remote_path in files:
+            if self.pipelining is False or os.path.getsize(local_path) > MAX_PIPELINED_FILE_SIZE:
+                try:
+                    self.SFTP_Client.put(local_path, remote_path, confirm=False)
+                except IOError as e:
+                    errors[remote_path] = str(e)
+            else:
+                small_files.append((local_path, remote_path))
+
+        for i in range(0, len(small_files), PIPELINE_BATCH_SIZE):
+            batch = small_files[i:i + PIPELINE_BATCH_SIZE]
+
+            requests = PipelinedRequests(self.SFTP_Client)
+            for _, remote_path in batch:
+                requests.send(remote_path, CMD_OPEN, remote_path,
+                              SFTP_FLAG_WRITE | SFTP_FLAG_CREATE | SFTP_FLAG_TRUNC, paramiko.SFTPAttributes())
+            errors.update(requests.wait())
+            handles = {remote_path: msg.get_binary()
+                       for remote_path, (t, msg) in requests.responses.items() if t == CMD_HANDLE}
+
+            # The server handles the requests of a file in order, the file is closed after the writes
+            requests = PipelinedRequests(self.SFTP_Client)
+            for local_path, remote_path in batch:
+                if remote_path not in handles:
+                    continue
+                try:
+                    with open(local_path, 'rb') as f:
+                        data = f.read()
+                except OSError as e:
+                    errors[remote_path] = str(e)
+                    data = b''
+                for offset in range(0, len(data), REQUEST_SIZE):
+                    requests.send(remote_path, CMD_WRITE, handles[remote_path], int64(offset),
+                                  data[offset:offset + REQUEST_SIZE])
+                requests.send(remote_path, CMD_CLOSE, handles[remote_path])
+            errors.update(requests.wait())
+
+        if len(errors) > 0:
+            examples = ', '.join(f'{p}: {e}' for p, e in list(errors.items())[:3])
+            logging.error(f"Error copying {len(errors)} / {len(files)} files to remote server ({examples})")
+
+        return errors
+
+    def get_many(self, files: List[Tuple[str, str]]) -> Dict[str, str]:
+        """Copy several files from remote to local server with pipelined requests
+
+        The files are opened and their sizes requested in one batch of requests. Then their content is read
+        ahead and the files are closed by groups of at most MAX_PIPELINED_BYTES, the responses are kept in
+        memory until the files are written.
+
+        Parameters
+        ----------
+        files : List[Tuple[str, str]]
+            Remote paths and local paths of the files to copy
+
+        Returns
+        -------
+        Dict[str, str]
+            Keys are the remote paths not copied, values the error messages
+        """
+        errors = {}
+
+        # Large files are copied at the end with the prefetch of paramiko, like all files without pipelining
+        large_files = [] if self.pipelining is True else list(files)
+        pipelined_files = files if self.pipelining is True else []
+
+        for i in range(0, len(pipelined_files), PIPELINE_BATCH_SIZE):
+            batch = pipelined_files[i:i + PIPELINE_BATCH_SIZE]
+
+            requests = PipelinedRequests(self.SFTP_Client)
+            for remote_path, _ in batch:
+                requests.send(remote_path, CMD_OPEN, remote_path, SFTP_FLAG_READ, paramiko.SFTPAttributes())
+                requests.send(('size', remote_path), CMD_STAT, remote_path)
+            batch_errors = requests.wait()
+            errors.update({key: e for key, e in batch_errors.items() if isinstance(key, str)})
+            handles = {key: msg.get_binary() for key, (t, msg) in requests.responses.items() if t == CMD_HANDLE}
+            sizes = {key[1]: paramiko.SFTPAttributes._from_msg(msg).st_size
+                     for key, (t, msg) in requests.responses.items() if t == CMD_ATTRS}
+
+            small_files = []
+            requests = PipelinedRequests(self.SFTP_Client)
+            for remote_path, local_path in batch:
+                if remote_path not in handles:
+                    continue
+                size = sizes.get(remote_path)
+                if size is None or size > MAX_PIPELINED_FILE_SIZE:
+                    large_files.append((remote_path, local_path))
+                    requests.send(remote_path, CMD_CLOSE, handles[remote_path])
+                else:
+                    small_files.append((remote_path, local_path))
+            requests.wait()
+
+            for group in split_by_size(small_files, [sizes[remote_path] for remote_path, _ in small_files],
+                                       MAX_PIPELINED_BYTES):
+                requests = PipelinedRequests(self.SFTP_Client)
+                for remote_path, _ in group:
+                    for offset in range(0, sizes[remote_path], REQUEST_SIZE):
+                        requests.send((remote_path, offset), CMD_READ, handles[remote_path], int64(offset),
+                                      REQUEST_SIZE)
+                    requests.send(remote_path, CMD_CLOSE, handles[remote_path])
+                read_errors = {}
+                for key, e in requests.wait().items():
+                    read_errors.setdefault(key if isinstance(key, str) else key[0], e)
+
+                for remote_path, local_path in group:
+                    chunks = [requests.responses.get((remote_path, offset), (None, None))
+                              for offset in range(0, sizes[remote_path], REQUEST_SIZE)]
+                    if any(t != CMD_DATA for t, _ in chunks):
+                        errors[remote_path] = read_errors.get(remote_path, 'incomplete read')
+                        continue
+                    data = b''.join(msg.get_string() for _, msg in chunks)
+
+                    # Short reads are possible, the file is copied again without pipelining
+                    if len(data) != sizes[remote_path]:
+                        large_files.append((remote_path, local_path))
+                        continue
+
+                    try:
+                        with open(local_path, 'wb') as f:
+                            f.write(data)
+                    except OSError as e:
+                        errors[remote_path] = str(e)
+
+        for remote_path, local_path in large_files:
+            try:
+                self.SFTP_Client.get(remote_path, local_path)
+            except IOError as e:
+                errors[remote_path] = str(e)
+
+        if len(errors) > 0:
+            examples = ', '.join(f'{p}: {e}' for p, e in list(errors.items())[:3])
+            logging.error(f"Error copying {len(errors)} / {len(files)} files to local server ({examples})")
+
+        return errors
+
     def copy_to_remote(self, local_path: str, remote_path: str) -> None:
-        """Copy a file from local to remote server
+        """Copy a file or a directory from local to remote server
+
+        The files of a directory are copied with :meth:`put_many`.
 
         Parameters
         ----------
@@ -226,23 +604,21 @@ class SFTP:
 
         if os.path.isdir(local_path) is False:
             self.put(local_path, remote_path)
-        else:
-            self.mkdir(remote_path)
-
-            for local_entry in os.listdir(local_path):
-                local_entry_path = local_path + "/" + local_entry
-                remote_entry_path = remote_path + "/" + local_entry
-
-                if os.path.isdir(local_entry_path):
+            return
 
-                    self.mkdir(remote_entry_path)
+        files = []
+        for local_directory, _, file_names in os.walk(local_path):
+            remote_directory = remote_path + local_directory[len(local_path):].replace(os.sep, '/')
+            self.mkdir(remote_directory)
+            files += [(f'{local_directory}/{file_name}', f'{remote_directory}/{file_name}')
+                      for file_name in file_names]
 
-                    self.copy_to_remote(local_entry_path, remote_entry_path)
-                elif os.path.isfile(local_entry_path):
-                    self.put(local_entry_path, remote_entry_path)
+        self.put_many(files)
 
     def copy_to_local(self, remote_path: str, local_path: str) -> None:
-        """Copy a file from remote to local server
+        """Copy a file or a directory from remote to local server
+
+        Each remote directory is listed once, the files are copied with :meth:`get_many`.
 
         Parameters
         ----------
@@ -251,30 +627,32 @@ class SFTP:
         local_path : str
             Path of the file to copy
         """
-        if self.is_path(remote_path) is False:
+        try:
+            mode = self.SFTP_Client.lstat(remote_path).st_mode
+        except FileNotFoundError:
             logging.error(f"Directory or file {remote_path} not found")
             return
 
-        if self.is_dir(remote_path) is False:
+        if stat.S_ISDIR(mode) is False:
             self.get(remote_path, local_path)
-        else:
-            try:
-                os.mkdir(local_path)
-            except OSError:
-                pass
+            return
 
-            for remote_entry in self.listdir(remote_path):
-                remote_entry_path = remote_path + "/" + remote_entry
-                local_entry_path = local_path + "/" + remote_entry
+        files = []
+        directories = [(remote_path, local_path)]
+        while len(directories) > 0:
+            remote_directory, local_directory = directories.pop()
+            os.makedirs(local_directory, exist_ok=True)
 
-                if self.is_dir(remote_entry_path) is True:
-                    try:
-                        os.mkdir(local_entry_path)
-                    except OSError:
-                        pass
-                    self.copy_to_local(remote_entry_path, local_entry_path)
-                elif self.is_file(remote_entry_path) is True:
-                    self.get(remote_entry_path, local_entry_path)
+            for entry in self.SFTP_Client.listdir_attr(remote_directory):
+                remote_entry_path = remote_directory + "/" + entry.filename
+                local_entry_path = local_directory + "/" + entry.filename
+
+                if stat.S_ISDIR(entry.st_mode) is True:
+                    directories.append((remote_entry_path, local_entry_path))
+                elif stat.S_ISREG(entry.st_mode) is True:
+                    files.append((remote_entry_path, local_entry_path))
+
+        self.get_many(files)
 
     def rename(self, old_path: str, new_path: str) -> None:
         """Rename a file or directory in the remote server
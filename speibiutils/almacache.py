@@ -0,0 +1,336 @@
+import time
+import sqlite3
+import logging
+import threading
+from typing import Iterable, Optional
+from almapiwrapper.inventory import Holding, Item
+from almapiwrapper.record import XmlData
+from config import ALMA_CACHE_TTL_SECONDS, ALMA_CACHE_MAX_BYTES
+
+# Shared cache of the source records
+_cache = None
+_cache_lock = threading.Lock()
+
+
+class AlmaCache:
+    """Cache of the source records fetched from Alma
+
+    Responses are stored in a local sqlite database and are reused by the next runs, for example when a task is
+    resumed, when it is processed after a dry run or when it is reconciled. Entries are keyed by IZ, environment,
+    kind of record and identifier. They expire after the TTL and the least recently used entries are evicted
+    when the database is larger than the maximum size.
+
+    The pipeline must invalidate the entries of the records it updates, see :meth:`invalidate`.
+
+    Attributes
+    ----------
+    db_path : str
+        Path of the sqlite database
+    ttl : int
+        Number of seconds an entry is valid, the cache is disabled if 0
+    max_size : int
+        Maximum size of the cached data in bytes
+    size : int
+        Current size of the cached data in bytes
+    hits : int
+        Number of entries found in the cache
+    misses : int
+        Number of entries not found in the cache
+    connection : sqlite3.Connection
+        Connection to the database
+    """
+    def __init__(self,
+                 db_path: Optional[str] = 'data/alma_cache.db',
+                 ttl: Optional[int] = None,
+                 max_size: Optional[int] = None) -> None:
+        """Initialize the cache and remove the expired entries
+
+        Parameters
+        ----------
+        db_path : str
+            Path of the sqlite database, created if it doesn't exist
+        ttl : int
+            Number of seconds an entry is valid, default is ALMA_CACHE_TTL_SECONDS of the configuration
+        max_size : int
+            Maximum size of the cached data in bytes, default is ALMA_CACHE_MAX_BYTES of the configuration
+
+        Returns
+        -------
+        None
+        """
+        self.db_path = db_path
+        self.ttl = ALMA_CACHE_TTL_SECONDS if ttl is None else ttl
+        self.max_size = ALMA_CACHE_MAX_BYTES if max_size is None else max_size
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        # The cache is shared by the threads fetching the records, the lock serializes the queries
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS records ('
+                                    'zone TEXT NOT NULL, '
+                                    'env TEXT NOT NULL, '
+                                    'kind TEXT NOT NULL, '
+                                    'identifier TEXT NOT NULL, '
+                                    'data BLOB NOT NULL, '
+                                    'size INTEGER NOT NULL, '
+                                    'fetch_time REAL NOT NULL, '
+                                    'access_time REAL NOT NULL, '
+                                    'PRIMARY KEY (zone, env, kind, identifier))')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS records_access ON records (access_time)')
+            self.connection.execute('DELETE FROM records WHERE fetch_time < ?', (time.time() - self.ttl,))
+
+        self.size = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM records').fetchone()[0]
+
+    def get(self, zone: str, env: str, kind: str, identifier: str) -> Optional[bytes]:
+        """Get the data of a record
+
+        Parameters
+        ----------
+        zone : str
+            IZ of the record
+        env : str
+            Environment of the record, "P" or "S"
+        kind : str
+            Kind of record, for example "item" or "holding"
+        identifier : str
+            Identifier of the record, barcode for the items and holding id for the holdings
+
+        Returns
+        -------
+        Optional[bytes]
+            Data of the record, None if not in the cache or expired
+        """
+        if self.ttl <= 0:
+            return None
+
+        now = time.time()
+        key = (zone, env, kind, identifier)
+        with self._lock, self.connection:
+            row = self.connection.execute('SELECT data, size, fetch_time FROM records '
+                                          'WHERE zone = ? AND env = ? AND kind = ? AND identifier = ?',
+                                          key).fetchone()
+
+            if row is not None and row[2] < now - self.ttl:
+                self.connection.execute('DELETE FROM records '
+                                        'WHERE zone = ? AND env = ? AND kind = ? AND identifier = ?', key)
+                self.size -= row[1]
+                row = None
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.connection.execute('UPDATE records SET access_time = ? '
+                                    'WHERE zone = ? AND env = ? AND kind = ? AND identifier = ?', (now,) + key)
+            self.hits += 1
+
+        return row[0]
+
+    def put(self, zone: str, env: str, kind: str, identifier: str, data: bytes) -> None:
+        """Store the data of a record
+
+        The least recently used entries are evicted if the cache is larger than the maximum size.
+
+        Parameters
+        ----------
+        zone : str
+            IZ of the record
+        env : str
+            Environment of the record, "P" or "S"
+        kind : str
+            Kind of record, for example "item" or "holding"
+        identifier : str
+            Identifier of the record
+        data : bytes
+            Data of the record
+
+        Returns
+        -------
+        None
+        """
+        if self.ttl <= 0 or len(data) > self.max_size:
+            return
+
+        now = time.time()
+        key = (zone, env, kind, identifier)
+        with self._lock, self.connection:
+            row = self.connection.execute('SELECT size FROM records '
+                                          'WHERE zone = ? AND env = ? AND kind = ? AND identifier = ?',
+                                          key).fetchone()
+            self.connection.execute('INSERT OR REPLACE INTO records VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                    key + (data, len(data), now, now))
+            self.size += len(data) - (row[0] if row is not None else 0)
+
+            if self.size > self.max_size:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries until the cache is not larger than the maximum size
+
+        Must be called with the lock.
+
+        Returns
+        -------
+        None
+        """
+        rows = self.connection.execute('SELECT rowid, size FROM records ORDER BY access_time, rowid')
+        evicted = []
+        for rowid, size in rows:
+            if self.size <= self.max_size:
+                break
+            evicted.append((rowid,))
+            self.size -= size
+
+        self.connection.executemany('DELETE FROM records WHERE rowid = ?', evicted)
+        logging.info(f'Alma cache: {len(evicted)} least recently used records evicted')
+
+    def invalidate(self, zone: str, env: str, kind: str, identifiers: Iterable[str]) -> None:
+        """Remove records from the cache, used when the records are updated
+
+        Parameters
+        ----------
+        zone : str
+            IZ of the records
+        env : str
+            Environment of the records, "P" or "S"
+        kind : str
+            Kind of records, for example "item" or "holding"
+        identifiers : Iterable[str]
+            Identifiers of the records
+
+        Returns
+        -------
+        None
+        """
+        keys = [(zone, env, kind, identifier) for identifier in identifiers]
+        with self._lock, self.connection:
+            for key in keys:
+                row = self.connection.execute('SELECT size FROM records '
+                                              'WHERE zone = ? AND env = ? AND kind = ? AND identifier = ?',
+                                              key).fetchone()
+                if row is not None:
+                    self.connection.execute('DELETE FROM records '
+                                            'WHERE zone = ? AND env = ? AND kind = ? AND identifier = ?', key)
+                    self.size -= row[0]
+
+    def get_item(self, barcode: str, zone: str, env: str, refresh: Optional[bool] = False) -> Item:
+        """Get an item by barcode, the item is only fetched if not in the cache
+
+        The holding of an item built from the cache is also taken from the cache when available, see
+        :meth:`load_holding`. Items with errors are not cached.
+
+        Parameters
+        ----------
+        barcode : str
+            Barcode of the item
+        zone : str
+            IZ of the item
+        env : str
+            Environment of the item, "P" or "S"
+        refresh : bool
+            If True, the item is always fetched from Alma and the cache is updated, useful to check the
+            current data in Alma
+
+        Returns
+        -------
+        Item
+            Item fetched or built from the cache
+        """
+        data = None if refresh is True else self.get(zone, env, 'item', barcode)
+        if data is None:
+            item = Item(barcode=barcode, zone=zone, env=env)
+            if item.error is False:
+                self.put(zone, env, 'item', barcode, bytes(item))
+            elif refresh is True:
+                self.invalidate(zone, env, 'item', [barcode])
+            return item
+
+        item = Item(barcode=barcode, zone=zone, env=env, data=XmlData(data))
+        item.item_id = item.get_item_id()
+
+        holding_data = self.get(zone, env, 'holding', item.get_holding_id())
+        if holding_data is not None:
+            item.holding = Holding(item.get_mms_id(), item.get_holding_id(), zone, env, data=XmlData(holding_data))
+
+        return item
+
+    def load_holding(self, item: Item) -> Optional[Holding]:
+        """Load the data of the holding of an item and store it in the cache
+
+        Parameters
+        ----------
+        item : Item
+            Item got with :meth:`get_item`
+
+        Returns
+        -------
+        Optional[Holding]
+            Holding of the item, None in case of error
+        """
+        holding = item.holding
+        if holding is None or holding._data is not None:
+            return holding
+
+        # Fetch the data of the holding
+        _ = holding.data
+        if holding.error is False:
+            self.put(item.zone, item.env, 'holding', holding.holding_id, bytes(holding))
+
+        return holding
+
+    def update_item(self, item: Item, old_barcode: str) -> None:
+        """Update the cache after the barcode of an item has been changed in Alma
+
+        The entry of the old barcode is removed, the updated item is stored with its new barcode.
+
+        Parameters
+        ----------
+        item : Item
+            Updated item
+        old_barcode : str
+            Barcode of the item before the update
+
+        Returns
+        -------
+        None
+        """
+        self.invalidate(item.zone, item.env, 'item', [old_barcode, item.barcode])
+        if item.error is False:
+            self.put(item.zone, item.env, 'item', item.barcode, bytes(item))
+
+    def log_statistics(self) -> None:
+        """Log the number of hits and misses and the size of the cache
+
+        Returns
+        -------
+        None
+        """
+        logging.info(f'Alma cache: {self.hits} hits, {self.misses} misses, '
+                     f'{round(self.size / 1024 / 1024, 1)} MB cached')
+
+    def close(self) -> None:
+        """Close the connection to the database
+
+        Returns
+        -------
+        None
+        """
+        self.connection.close()
+
+
+def get_cache() -> AlmaCache:
+    """Get the shared cache, it is opened at the first call
+
+    Returns
+    -------
+    AlmaCache
+        Cache of the source records
+    """
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = AlmaCache()
+        return _cache
@@ -0,0 +1,107 @@
+from __future__ import annotations
+from typing import Iterable, Optional
+from speibiutils.lazyimport import lazy_import
+from config import BARCODE_PATTERNS
+
+# pandas is only loaded when barcodes are checked
+pd = lazy_import('pandas')
+
+# Numbers written by Excel in scientific notation, the digits of the barcode are lost
+SCIENTIFIC_NOTATION_PATTERN = r'^\d+(\.\d+)?[eE][+-]?\d+$'
+
+# Numbers written by Excel as floats, for example "12345.0"
+FLOAT_PATTERN = r'^(\d+)\.0+$'
+
+# Prefix added to the barcodes of the source items once copied
+COPIED_PREFIX = 'OLD_'
+
+# Label of the rows of the processing file with an invalid barcode
+INVALID_BARCODE_ERROR = 'invalid_barcode'
+
+
+def normalize_barcodes(barcodes: Iterable[str]) -> pd.Series:
+    """Remove the artifacts of the Excel forms from the barcodes
+
+    Surrounding whitespaces and apostrophes are removed and barcodes written as floats lose their decimals.
+    Empty barcodes are dropped.
+
+    Parameters
+    ----------
+    barcodes : Iterable[str]
+        Barcodes of the form
+
+    Returns
+    -------
+    pd.Series
+        Normalized barcodes
+    """
+    barcodes = pd.Series(list(barcodes), dtype='str').dropna()
+    barcodes = barcodes.str.strip().str.strip("'").str.strip()
+    barcodes = barcodes.str.replace(FLOAT_PATTERN, r'\1', regex=True)
+
+    return barcodes.loc[barcodes != ''].reset_index(drop=True)
+
+
+def get_barcode_pattern(source_iz: Optional[str]) -> str:
+    """Get the pattern of the barcodes of a source IZ
+
+    Parameters
+    ----------
+    source_iz : str
+        Code of the source IZ
+
+    Returns
+    -------
+    str
+        Regular expression matching the whole barcode, the "*DEFAULT*" pattern if the IZ has no pattern
+    """
+    return BARCODE_PATTERNS.get(source_iz, BARCODE_PATTERNS['*DEFAULT*'])
+
+
+def validate_barcodes(barcodes: pd.Series, source_iz: Optional[str]) -> pd.Series:
+    """Check the format of normalized barcodes
+
+    Parameters
+    ----------
+    barcodes : pd.Series
+        Normalized barcodes, see :func:`normalize_barcodes`
+    source_iz : str
+        Code of the source IZ, its pattern is taken from BARCODE_PATTERNS of the configuration
+
+    Returns
+    -------
+    pd.Series
+        Reason of the rejection of each barcode, missing value if the barcode is valid
+    """
+    pattern = get_barcode_pattern(source_iz)
+    reasons = pd.Series(None, index=barcodes.index, dtype='str')
+
+    reasons.loc[~barcodes.str.fullmatch(pattern)] = f'format not valid for IZ {source_iz}'
+    reasons.loc[barcodes.str.startswith(COPIED_PREFIX)] = f'prefix {COPIED_PREFIX} of an already copied item'
+    reasons.loc[barcodes.str.contains(r'\s', regex=True)] = 'embedded space'
+    reasons.loc[barcodes.str.fullmatch(SCIENTIFIC_NOTATION_PATTERN)] = 'scientific notation from Excel'
+
+    return reasons
+
+
+def get_invalid_barcodes(barcodes: Iterable[str], source_iz: Optional[str]) -> dict:
+    """Get the invalid barcodes of a list and the reasons
+
+    Parameters
+    ----------
+    barcodes : Iterable[str]
+        Normalized barcodes
+    source_iz : str
+        Code of the source IZ
+
+    Returns
+    -------
+    dict
+        Reason of the rejection by invalid barcode
+    """
+    barcodes = pd.Series(list(barcodes), dtype='str')
+    reasons = validate_barcodes(barcodes, source_iz)
+    invalid = reasons.notna()
+
+    return dict(zip(barcodes.loc[invalid], reasons.loc[invalid]))
+
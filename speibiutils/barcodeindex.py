@@ -0,0 +1,221 @@
+import os
+import sqlite3
+import logging
+from datetime import datetime, timedelta
+from typing import List, Dict, Optional, Iterable
+
+# Maximum number of variables in one sqlite query
+QUERY_CHUNK_SIZE = 500
+
+# States of the tasks whose barcodes are still reserved, DONE barcodes are already transferred
+ACTIVE_STATES = ['NEW', 'READY', 'PROCESSING']
+
+# Default path of the sqlite database
+BARCODE_INDEX_PATH = 'data/barcode_index.db'
+
+
+class BarcodeIndex:
+    """Barcode index class to find the task owning a barcode
+
+    The index is stored in a local sqlite database. It contains the barcodes of the tasks in NEW, READY and
+    PROCESSING state and the barcodes already transferred by DONE tasks, until they expire, see :meth:`expire`.
+
+    Attributes
+    ----------
+    db_path : str
+        Path of the sqlite database
+    created : bool
+        True if the database has been created with this object and is empty
+    connection : sqlite3.Connection
+        Connection to the database
+    """
+    def __init__(self, db_path: Optional[str] = BARCODE_INDEX_PATH) -> None:
+        """Initialize the barcode index
+
+        Parameters
+        ----------
+        db_path : str
+            Path of the sqlite database, created if it doesn't exist
+
+        Returns
+        -------
+        None
+        """
+        self.db_path = db_path
+        self.created = os.path.exists(db_path) is False
+        self.connection = sqlite3.connect(db_path)
+        with self.connection:
+            self.connection.execute('CREATE TABLE IF NOT EXISTS barcodes ('
+                                    'barcode TEXT PRIMARY KEY, '
+                                    'account TEXT NOT NULL, '
+                                    'task TEXT NOT NULL, '
+                                    'state TEXT NOT NULL, '
+                                    'update_time TEXT NOT NULL)')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS barcodes_task ON barcodes (account, task)')
+
+    def get_owners(self, barcodes: Iterable[str]) -> Dict[str, tuple]:
+        """Get the tasks owning barcodes
+
+        Parameters
+        ----------
+        barcodes : Iterable[str]
+            Barcodes to look up
+
+        Returns
+        -------
+        Dict[str, tuple]
+            Keys are the barcodes found in the index, values are tuples (account, task name, state)
+        """
+        barcodes = list(barcodes)
+        owners = {}
+        for i in range(0, len(barcodes), QUERY_CHUNK_SIZE):
+            chunk = barcodes[i:i + QUERY_CHUNK_SIZE]
+            rows = self.connection.execute(f'SELECT barcode, account, task, state FROM barcodes '
+                                           f'WHERE barcode IN ({",".join("?" * len(chunk))})', chunk)
+            for barcode, account, task, state in rows:
+                owners[barcode] = (account, task, state)
+
+        return owners
+
+    def get_conflicts(self, barcodes: Iterable[str], account: str, task: str) -> (set, set):
+        """Get the barcodes owned by other tasks
+
+        Parameters
+        ----------
+        barcodes : Iterable[str]
+            Barcodes of the checked task
+        account : str
+            Account of the checked task
+        task : str
+            Name of the checked task, without state
+
+        Returns
+        -------
+        set
+            Barcodes reserved by other tasks in NEW, READY or PROCESSING state
+        set
+            Barcodes already transferred by DONE tasks
+        """
+        reserved = set()
+        transferred = set()
+        for barcode, (owner_account, owner_task, state) in self.get_owners(barcodes).items():
+            if (owner_account, owner_task) == (account, task):
+                continue
+            if state == 'DONE':
+                transferred.add(barcode)
+            else:
+                reserved.add(barcode)
+
+        return reserved, transferred
+
+    def set_task_barcodes(self, account: str, task: str, barcodes: List[str], state: str) -> None:
+        """Set the barcodes of a task
+
+        Previous barcodes of the task not in the new list are released.
+
+        Parameters
+        ----------
+        account : str
+            Account of the task
+        task : str
+            Name of the task, without state
+        barcodes : List[str]
+            Barcodes of the task
+        state : str
+            State of the task
+
+        Returns
+        -------
+        None
+        """
+        update_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self.connection:
+            self.connection.execute('DELETE FROM barcodes WHERE account = ? AND task = ?', (account, task))
+            self.connection.executemany('INSERT OR REPLACE INTO barcodes VALUES (?, ?, ?, ?, ?)',
+                                        [(barcode, account, task, state, update_time) for barcode in barcodes])
+        logging.info(f'{task}: {len(barcodes)} barcodes registered in the barcode index')
+
+    def update_task_state(self, account: str, task: str, state: str) -> None:
+        """Update the state of the barcodes of a task
+
+        Parameters
+        ----------
+        account : str
+            Account of the task
+        task : str
+            Name of the task, without state
+        state : str
+            New state of the task
+
+        Returns
+        -------
+        None
+        """
+        with self.connection:
+            self.connection.execute('UPDATE barcodes SET state = ?, update_time = ? WHERE account = ? AND task = ?',
+                                    (state, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), account, task))
+
+    def release_task(self, account: str, task: str) -> None:
+        """Remove the barcodes of a task from the index
+
+        Parameters
+        ----------
+        account : str
+            Account of the task
+        task : str
+            Name of the task, without state
+
+        Returns
+        -------
+        None
+        """
+        with self.connection:
+            self.connection.execute('DELETE FROM barcodes WHERE account = ? AND task = ?', (account, task))
+
+    def prune(self, active_tasks: Iterable[tuple]) -> None:
+        """Release the barcodes of NEW, READY and PROCESSING tasks that don't exist anymore
+
+        Parameters
+        ----------
+        active_tasks : Iterable[tuple]
+            Tuples (account, task name) of the existing tasks in NEW, READY or PROCESSING state
+
+        Returns
+        -------
+        None
+        """
+        active_tasks = set(active_tasks)
+        rows = self.connection.execute(f'SELECT DISTINCT account, task FROM barcodes '
+                                       f'WHERE state IN ({",".join("?" * len(ACTIVE_STATES))})', ACTIVE_STATES)
+        for account, task in rows.fetchall():
+            if (account, task) not in active_tasks:
+                logging.warning(f'{task}: task not existing anymore => barcodes released from the barcode index')
+                self.release_task(account, task)
+
+    def expire(self, days: int) -> None:
+        """Release the barcodes of DONE tasks older than a number of days
+
+        Parameters
+        ----------
+        days : int
+            Number of days the barcodes of DONE tasks are kept
+
+        Returns
+        -------
+        None
+        """
+        limit = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S")
+        with self.connection:
+            deleted = self.connection.execute('DELETE FROM barcodes WHERE state = ? AND update_time < ?',
+                                              ('DONE', limit)).rowcount
+        if deleted > 0:
+            logging.info(f'{deleted} barcodes of DONE tasks older than {days} days released from the barcode index')
+
+    def close(self) -> None:
+        """Close the connection to the database
+
+        Returns
+        -------
+        None
+        """
+        self.connection.close()
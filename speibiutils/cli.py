@@ -0,0 +1,150 @@
+import sys
+import argparse
+from typing import List, Optional
+
+# Size of the tasks
+SIZE = ['SMALL', 'LARGE']
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the parser of the command line
+
+    Returns
+    -------
+    argparse.ArgumentParser
+        Parser with one subcommand per phase of the workflow
+    """
+    concurrency_option = argparse.ArgumentParser(add_help=False)
+    concurrency_option.add_argument('--concurrency', type=int, default=None,
+                                    help='number of forms or items handled in parallel, default from config.py')
+
+    budget_option = argparse.ArgumentParser(add_help=False)
+    budget_option.add_argument('--budget', type=float, default=None,
+                               help='maximum processing time of a task in seconds, the task can be resumed with '
+                                    'run-task')
+
+    # Each subcommand gets only the options its phase uses
+    options = argparse.ArgumentParser(add_help=False)
+    options.add_argument('--dry-run', action='store_true',
+                         help='only log what would be done')
+    options.add_argument('--profile', action='store_true',
+                         help='profile CPU time and memory of the phases and tasks, like SPEIBI_PROFILE=1')
+
+    parser = argparse.ArgumentParser(prog='start_process.py',
+                                     description='Automation of the transfer of items from IZ to IZ')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('discover', parents=[options],
+                          help='handle the new forms and update the task summary with the remote directories')
+    subparsers.add_parser('check', parents=[concurrency_option, options],
+                          help='check the forms of the NEW tasks')
+
+    run_next = subparsers.add_parser('run-next', parents=[concurrency_option, options, budget_option],
+                                     help='process the next READY task of the day')
+    run_next.add_argument('--size', choices=SIZE, required=True)
+
+    run_task = subparsers.add_parser('run-task', parents=[concurrency_option, options, budget_option],
+                                     help='process or resume one READY or PROCESSING task')
+    run_task.add_argument('name', help='name or directory of the task, for example task_2041-01-01_UBS_LARGE')
+
+    # Verification only reads Alma data, it has no dry run, budget or profiling
+    verify = subparsers.add_parser('verify', parents=[concurrency_option],
+                                   help='check a task against the source and destination IZ')
+    verify.add_argument('name', help='name or directory of the task, for example task_2041-01-01_UBS_LARGE')
+
+    subparsers.add_parser('bench', help='measure the import time of the entry points')
+    subparsers.add_parser('stats', help='print statistics of the task summary')
+
+    start = subparsers.add_parser('start', help='run the entire workflow, like "-size"')
+    start.add_argument('--size', choices=SIZE, required=True)
+    start.add_argument('--profile', action='store_true',
+                       help='profile CPU time and memory of the phases and tasks, like SPEIBI_PROFILE=1')
+
+    subparsers.add_parser('reconcile', help='reconcile the DONE tasks of the last days, like "-reconcile"')
+    subparsers.add_parser('daemon', help='run the workflow according to the schedule, like "-daemon"')
+
+    return parser
+
+
+def get_legacy_arguments(argv: List[str]) -> Optional[List[str]]:
+    """Convert the arguments of the previous command line to subcommands
+
+    Parameters
+    ----------
+    argv : List[str]
+        Arguments without the name of the script
+
+    Returns
+    -------
+    Optional[List[str]]
+        Converted arguments, None if the arguments don't use the previous syntax
+    """
+    if len(argv) >= 2 and argv[0] == '-size':
+        return ['start', '--size', argv[1]] + argv[2:]
+
+    if len(argv) >= 1 and argv[0] in ['-reconcile', '-daemon', '-bench']:
+        return [argv[0][1:]]
+
+    return None
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Run the command line
+
+    Modules are imported by the selected command only.
+
+    Parameters
+    ----------
+    argv : List[str]
+        Arguments without the name of the script, default is sys.argv[1:]
+
+    Returns
+    -------
+    None
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    args = build_parser().parse_args(get_legacy_arguments(argv) or argv)
+
+    if getattr(args, 'profile', False) is True:
+        from speibiutils import profiling
+        profiling.enable()
+
+    if args.command == 'bench':
+        from speibiutils.startupbench import benchmark_startup
+        print(benchmark_startup())
+        return
+
+    if args.command == 'daemon':
+        from speibiutils.daemon import run_daemon
+        run_daemon()
+        return
+
+    import speibiutils.speibiutils as speibi
+    from speibiutils import workflow
+
+    if args.command == 'start':
+        workflow.start(size=args.size)
+
+    elif args.command == 'reconcile':
+        workflow.reconcile()
+
+    elif args.command == 'stats':
+        print(workflow.stats())
+
+    else:
+        speibi.LogFile(file_name=args.command.replace('-', '_'))
+
+        if args.command == 'discover':
+            workflow.discover(dry_run=args.dry_run)
+        elif args.command == 'check':
+            workflow.check(concurrency=args.concurrency, dry_run=args.dry_run)
+        elif args.command == 'run-next':
+            workflow.run_next(args.size, concurrency=args.concurrency, budget=args.budget, dry_run=args.dry_run)
+        elif args.command == 'run-task':
+            workflow.run_task(args.name, concurrency=args.concurrency, budget=args.budget, dry_run=args.dry_run)
+        elif args.command == 'verify':
+            workflow.verify(args.name, concurrency=args.concurrency)
+
+        speibi.LogFile.close_log()
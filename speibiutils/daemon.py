@@ -0,0 +1,180 @@
+import os
+import signal
+import logging
+import threading
+import contextvars
+from datetime import datetime, date
+from typing import Optional
+import dotenv
+import config
+import speibiutils.speibiutils as speibi
+from speibiutils import excelpool, logqueue
+from speibiutils.workflow import start
+
+# Log file of the daemon, the runs of the workflow write in the main log file "data/log.txt"
+DAEMON_LOG_PATH = './data/log_daemon.txt'
+
+
+def get_due_size(now: datetime,
+                 last_small_run: Optional[datetime],
+                 last_large_run: Optional[date]) -> Optional[str]:
+    """Get the size of the tasks to run according to the schedule
+
+    LARGE tasks run once a day at "LARGE_TASK_HOUR" (modulo 24). SMALL tasks run every
+    "DAEMON_SMALL_INTERVAL_SECONDS" outside of this hour.
+
+    Parameters
+    ----------
+    now : datetime
+        Current time
+    last_small_run : datetime
+        Start time of the last run of SMALL tasks, None if not run yet
+    last_large_run : date
+        Date of the last run of LARGE tasks, None if not run yet
+
+    Returns
+    -------
+    Optional[str]
+        "SMALL" or "LARGE", None if nothing must run now
+    """
+    if now.hour == config.LARGE_TASK_HOUR % 24:
+        return 'LARGE' if last_large_run != now.date() else None
+
+    if last_small_run is None or (now - last_small_run).total_seconds() >= config.DAEMON_SMALL_INTERVAL_SECONDS:
+        return 'SMALL'
+
+    return None
+
+
+class Daemon:
+    """Resident process running the workflow according to the schedule
+
+    The process keeps the SFTP connection, the Excel process pool and the loaded task summary between the
+    runs. SIGTERM and SIGINT stop the daemon after the current run. SIGHUP reloads the .env file and opens a
+    new SFTP connection. Changes of config.py require a restart: the modules keep the values read at import.
+
+    Records of the daemon are written in its own log file. Each run of the workflow starts in a new logging
+    context, its records are written in the main log file opened by :func:`workflow.start`.
+
+    Attributes
+    ----------
+    stop_event : threading.Event
+        Set when the daemon must stop
+    reload_event : threading.Event
+        Set when the configuration must be reloaded
+    last_small_run : datetime
+        Start time of the last run of SMALL tasks
+    last_large_run : date
+        Date of the last run of LARGE tasks
+    """
+    def __init__(self) -> None:
+        """Initialize the daemon
+
+        Returns
+        -------
+        None
+        """
+        self.stop_event = threading.Event()
+        self.reload_event = threading.Event()
+        self.last_small_run = None
+        self.last_large_run = None
+
+    def handle_stop(self, signum: int, _) -> None:
+        """Signal handler to stop the daemon"""
+        logging.warning(f'Signal {signal.Signals(signum).name} received => daemon will stop after the current run')
+        self.stop_event.set()
+
+    def handle_reload(self, signum: int, _) -> None:
+        """Signal handler to reload the configuration"""
+        logging.warning(f'Signal {signal.Signals(signum).name} received => configuration will be reloaded')
+        self.reload_event.set()
+
+    def reload(self) -> None:
+        """Reload the .env file and open a new SFTP connection
+
+        Returns
+        -------
+        None
+        """
+        dotenv.load_dotenv(override=True)
+        speibi.keep_connection_open(False)
+        speibi.keep_connection_open()
+        self.reload_event.clear()
+        logging.info('Configuration reloaded')
+
+    def run_once(self, size: str) -> None:
+        """Run the workflow for one size of tasks
+
+        Errors are logged and don't stop the daemon. The workflow runs in a new logging context, its records
+        are not written in the log file of the daemon.
+
+        Parameters
+        ----------
+        size : str
+            Size of the tasks, "SMALL" or "LARGE"
+
+        Returns
+        -------
+        None
+        """
+        try:
+            contextvars.Context().run(start, size=size)
+        except (Exception, SystemExit) as e:
+            logging.error(f'Workflow {size} failed: {repr(e)}')
+            speibi.keep_connection_open(False)
+            speibi.keep_connection_open()
+
+    def run(self) -> None:
+        """Run the daemon until a stop signal is received
+
+        Returns
+        -------
+        None
+        """
+        signal.signal(signal.SIGTERM, self.handle_stop)
+        signal.signal(signal.SIGINT, self.handle_stop)
+        if hasattr(signal, 'SIGHUP') is True:
+            signal.signal(signal.SIGHUP, self.handle_reload)
+
+        speibi.keep_connection_open()
+        logging.info('Daemon started')
+
+        try:
+            while self.stop_event.is_set() is False:
+                if self.reload_event.is_set() is True:
+                    self.reload()
+
+                now = datetime.now()
+                size = get_due_size(now, self.last_small_run, self.last_large_run)
+
+                if size == 'LARGE':
+                    self.last_large_run = now.date()
+                    self.run_once(size)
+                elif size == 'SMALL':
+                    self.last_small_run = now
+                    self.run_once(size)
+
+                self.stop_event.wait(config.DAEMON_TICK_SECONDS)
+
+        finally:
+            speibi.keep_connection_open(False)
+            excelpool.shutdown()
+            logging.info('Daemon stopped')
+
+
+def run_daemon() -> None:
+    """Start the workflow in daemon mode
+
+    Returns
+    -------
+    None
+    """
+    os.makedirs(os.path.dirname(DAEMON_LOG_PATH), exist_ok=True)
+
+    # The daemon log is linked to the context of the daemon, the main log file changes at each run
+    token = logqueue.open_task_log('daemon', DAEMON_LOG_PATH)
+    try:
+        Daemon().run()
+    finally:
+        logqueue.close_task_log(token)
+        speibi.LogFile.close_log()
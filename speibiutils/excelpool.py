@@ -0,0 +1,215 @@
+from __future__ import annotations
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Union
+from speibiutils.lazyimport import lazy_import
+from config import EXCEL_PROCESSES
+
+# pandas is only loaded when a file is handled
+pd = lazy_import('pandas')
+
+# Shared pool of processes parsing and writing Excel files
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Optional[ProcessPoolExecutor]:
+    """Get the process pool, it is started at the first call
+
+    Processes are spawned and not forked, the parent process can have running threads.
+
+    Returns
+    -------
+    Optional[ProcessPoolExecutor]
+        Process pool, None if Excel files are handled in the calling process
+    """
+    global _pool
+
+    if EXCEL_PROCESSES < 1:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=EXCEL_PROCESSES,
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def shutdown() -> None:
+    """Stop the process pool
+
+    Returns
+    -------
+    None
+    """
+    global _pool
+
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def _submit(fn: Callable, *args) -> Future:
+    """Run a function in the process pool
+
+    If the pool is not available, the function is run in the calling process.
+
+    Parameters
+    ----------
+    fn : Callable
+        Module level function to run
+    args : list
+        Arguments of the function, they must be picklable
+
+    Returns
+    -------
+    Future
+        Future of the result of the function
+    """
+    pool = get_pool()
+    if pool is not None:
+        try:
+            return pool.submit(fn, *args)
+        except (BrokenProcessPool, OSError, RuntimeError) as e:
+            logging.warning(f'Excel process pool not available, file handled in the main process: {e}')
+            shutdown()
+
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def _read_sheets(path: str, sheet_names: List[Union[str, int]]) -> Dict[Union[str, int], tuple]:
+    """Parse sheets of an Excel file, run in the process pool
+
+    Parameters
+    ----------
+    path : str
+        Path of the Excel file
+    sheet_names : List[Union[str, int]]
+        Names or positions of the sheets
+
+    Returns
+    -------
+    Dict[Union[str, int], tuple]
+        Keys are the sheet names, values tuples with the list of the columns and the list of the rows
+    """
+    sheets = pd.read_excel(path, sheet_name=sheet_names, dtype=str)
+    return {sheet_name: (list(sheet.columns), list(sheet.itertuples(index=False, name=None)))
+            for sheet_name, sheet in sheets.items()}
+
+
+def _write_excel(path: str, columns: List[str], rows: List[tuple]) -> None:
+    """Write a table in an Excel file, run in the process pool
+
+    Parameters
+    ----------
+    path : str
+        Path of the Excel file
+    columns : List[str]
+        Columns of the table
+    rows : List[tuple]
+        Rows of the table
+
+    Returns
+    -------
+    None
+    """
+    pd.DataFrame(rows, columns=columns).to_excel(path, index=False)
+
+
+def read_sheets_async(path: str, sheet_names: List[Union[str, int]]) -> Future:
+    """Start parsing sheets of an Excel file in the process pool
+
+    The workbook is parsed only once for all the sheets. Use :func:`get_sheets` to get the tables.
+
+    Parameters
+    ----------
+    path : str
+        Path of the Excel file
+    sheet_names : List[Union[str, int]]
+        Names or positions of the sheets
+
+    Returns
+    -------
+    Future
+        Future of the parsed sheets
+    """
+    return _submit(_read_sheets, path, sheet_names)
+
+
+def get_sheets(future: Future) -> Dict[Union[str, int], pd.DataFrame]:
+    """Wait for parsed sheets and build the tables
+
+    Parameters
+    ----------
+    future : Future
+        Future returned by :func:`read_sheets_async`
+
+    Returns
+    -------
+    Dict[Union[str, int], pd.DataFrame]
+        Keys are the sheet names, values the tables with all values as strings
+    """
+    return {sheet_name: pd.DataFrame(rows, columns=columns, dtype=object)
+            for sheet_name, (columns, rows) in future.result().items()}
+
+
+def read_sheets(path: str, sheet_names: List[Union[str, int]]) -> Dict[Union[str, int], pd.DataFrame]:
+    """Parse sheets of an Excel file in the process pool
+
+    Parameters
+    ----------
+    path : str
+        Path of the Excel file
+    sheet_names : List[Union[str, int]]
+        Names or positions of the sheets
+
+    Returns
+    -------
+    Dict[Union[str, int], pd.DataFrame]
+        Keys are the sheet names, values the tables with all values as strings
+    """
+    return get_sheets(read_sheets_async(path, sheet_names))
+
+
+def write_excel_async(df: pd.DataFrame, path: str) -> Future:
+    """Start writing a table in an Excel file in the process pool
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Table to write, the index is not written
+    path : str
+        Path of the Excel file
+
+    Returns
+    -------
+    Future
+        Future completed when the file is written
+    """
+    return _submit(_write_excel, path, list(df.columns), list(df.itertuples(index=False, name=None)))
+
+
+def write_excel(df: pd.DataFrame, path: str) -> None:
+    """Write a table in an Excel file in the process pool
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Table to write, the index is not written
+    path : str
+        Path of the Excel file
+
+    Returns
+    -------
+    None
+    """
+    write_excel_async(df, path).result()
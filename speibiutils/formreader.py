@@ -0,0 +1,330 @@
+import re
+import zipfile
+import posixpath
+from xml.etree import ElementTree
+from typing import Dict, List, Optional
+
+# Namespaces of the xlsx files
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+RELATIONSHIP_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+PACKAGE_RELATIONSHIP_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Errors raised when a file is not a readable xlsx file
+READ_ERRORS = (OSError, KeyError, zipfile.BadZipFile, ElementTree.ParseError)
+
+
+class FormReader:
+    """Streaming reader of Excel forms
+
+    The xlsx file is read as a zip archive and only the required parts are parsed. It allows to check
+    the structure of a form and to count the barcodes without loading the entire workbook.
+
+    Attributes
+    ----------
+    path : str
+        Path of the Excel file
+    sheet_names : List[str]
+        Names of the sheets in the order of the workbook
+    """
+    def __init__(self, path: str) -> None:
+        """Open an Excel file and read the list of the sheets
+
+        Parameters
+        ----------
+        path : str
+            Path of the Excel file
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        OSError, KeyError, zipfile.BadZipFile, ElementTree.ParseError
+            If the file is not a readable xlsx file, see READ_ERRORS
+        """
+        self.path = path
+        self._archive = zipfile.ZipFile(path)
+        self._sheet_paths = self._read_sheet_paths()
+        self.sheet_names = list(self._sheet_paths.keys())
+
+    def __enter__(self) -> 'FormReader':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Close the Excel file
+
+        Returns
+        -------
+        None
+        """
+        self._archive.close()
+
+    def _read_sheet_paths(self) -> Dict[str, str]:
+        """Read the paths of the sheets in the archive
+
+        Returns
+        -------
+        Dict[str, str]
+            Keys are the sheet names, values the paths of the sheets in the archive
+        """
+        targets = {}
+        relationships = ElementTree.fromstring(self._archive.read('xl/_rels/workbook.xml.rels'))
+        for relationship in relationships.iter(f'{PACKAGE_RELATIONSHIP_NS}Relationship'):
+            target = relationship.get('Target')
+            targets[relationship.get('Id')] = target.lstrip('/') if target.startswith('/') \
+                else posixpath.normpath(f'xl/{target}')
+
+        workbook = ElementTree.fromstring(self._archive.read('xl/workbook.xml'))
+        return {sheet.get('name'): targets[sheet.get(f'{RELATIONSHIP_NS}id')]
+                for sheet in workbook.iter(f'{MAIN_NS}sheet')}
+
+    def _iter_rows(self, sheet_name: str):
+        """Stream the rows of a sheet
+
+        Parameters
+        ----------
+        sheet_name : str
+            Name of the sheet
+
+        Yields
+        ------
+        tuple
+            Row number and dict with column letters as keys and raw cells (type, value) as values
+        """
+        row_number = 0
+        with self._archive.open(self._sheet_paths[sheet_name]) as f:
+            for _, element in ElementTree.iterparse(f):
+                if element.tag != f'{MAIN_NS}row':
+                    continue
+
+                row_number = int(element.get('r', row_number + 1))
+                cells = {}
+                column_number = 0
+                for cell in element.iter(f'{MAIN_NS}c'):
+                    reference = cell.get('r')
+                    if reference is not None:
+                        column = re.match(r'[A-Z]+', reference).group(0)
+                        column_number = self._get_column_number(column)
+                    else:
+                        column_number += 1
+                        column = self._get_column_letter(column_number)
+
+                    if cell.get('t') == 'inlineStr':
+                        value = ''.join(t.text or '' for t in cell.iter(f'{MAIN_NS}t'))
+                    else:
+                        value = cell.findtext(f'{MAIN_NS}v')
+
+                    if value is not None:
+                        cells[column] = (cell.get('t'), value)
+
+                yield row_number, cells
+                element.clear()
+
+    def _resolve(self, raw_cells: List[tuple]) -> List[Optional[str]]:
+        """Convert raw cells to strings, shared strings are read in one pass
+
+        Parameters
+        ----------
+        raw_cells : List[tuple]
+            Raw cells (type, value), None for empty cells
+
+        Returns
+        -------
+        List[Optional[str]]
+            Values of the cells as strings, None for empty cells
+        """
+        indexes = {int(raw[1]) for raw in raw_cells if raw is not None and raw[0] == 's'}
+        shared_strings = self._read_shared_strings(indexes)
+
+        values = []
+        for raw in raw_cells:
+            if raw is None:
+                values.append(None)
+            elif raw[0] == 's':
+                values.append(shared_strings.get(int(raw[1])))
+            elif raw[0] == 'b':
+                values.append('True' if raw[1] == '1' else 'False')
+            elif raw[0] in [None, 'n']:
+                # Same conversion of numbers as openpyxl
+                values.append(str(float(raw[1])) if '.' in raw[1] or 'E' in raw[1] else str(int(raw[1])))
+            else:
+                values.append(raw[1])
+
+        return values
+
+    def _read_shared_strings(self, indexes: set) -> Dict[int, str]:
+        """Read the shared strings of the workbook
+
+        Parsing stops once all the required strings are found.
+
+        Parameters
+        ----------
+        indexes : set
+            Indexes of the required strings
+
+        Returns
+        -------
+        Dict[int, str]
+            Keys are the indexes, values the strings
+        """
+        shared_strings = {}
+        if len(indexes) == 0:
+            return shared_strings
+
+        max_index = max(indexes)
+        index = 0
+        with self._archive.open('xl/sharedStrings.xml') as f:
+            for _, element in ElementTree.iterparse(f):
+                if element.tag != f'{MAIN_NS}si':
+                    continue
+                if index in indexes:
+                    # Rich text strings are split in several runs, phonetic runs are ignored
+                    text = element.find(f'{MAIN_NS}t')
+                    if text is not None:
+                        shared_strings[index] = text.text or ''
+                    else:
+                        shared_strings[index] = ''.join(run.findtext(f'{MAIN_NS}t') or ''
+                                                        for run in element.findall(f'{MAIN_NS}r'))
+                element.clear()
+                if index == max_index:
+                    break
+                index += 1
+
+        return shared_strings
+
+    @staticmethod
+    def _get_column_number(column: str) -> int:
+        """Convert column letters to a column number, "A" is 1"""
+        number = 0
+        for letter in column:
+            number = number * 26 + ord(letter) - ord('A') + 1
+        return number
+
+    @staticmethod
+    def _get_column_letter(column_number: int) -> str:
+        """Convert a column number to column letters, 1 is "A\""""
+        column = ''
+        while column_number > 0:
+            column_number, remainder = divmod(column_number - 1, 26)
+            column = chr(ord('A') + remainder) + column
+        return column
+
+    def get_cells(self, sheet_name: str, references: List[str]) -> Dict[str, Optional[str]]:
+        """Get the values of some cells of a sheet
+
+        Parsing of the sheet stops after the last required row.
+
+        Parameters
+        ----------
+        sheet_name : str
+            Name of the sheet
+        references : List[str]
+            References of the cells, for example ["D2", "B4"]
+
+        Returns
+        -------
+        Dict[str, Optional[str]]
+            Keys are the references, values the content of the cells, None for empty cells
+        """
+        required = {}
+        for reference in references:
+            m = re.match(r'^([A-Z]+)(\d+)$', reference)
+            required[reference] = (m.group(1), int(m.group(2)))
+        max_row = max(row for _, row in required.values())
+
+        raw_cells = {reference: None for reference in references}
+        for row_number, cells in self._iter_rows(sheet_name):
+            for reference, (column, row) in required.items():
+                if row == row_number:
+                    raw_cells[reference] = cells.get(column)
+            if row_number >= max_row:
+                break
+
+        return dict(zip(raw_cells.keys(), self._resolve(list(raw_cells.values()))))
+
+    def read_column(self,
+                    sheet_name: str,
+                    header: str,
+                    max_values: Optional[int] = None) -> Optional[List[str]]:
+        """Read the values of a column identified by its header in the first row
+
+        Empty cells are skipped. If more values than "max_values" are found, the reading is aborted
+        before resolving the strings.
+
+        Parameters
+        ----------
+        sheet_name : str
+            Name of the sheet
+        header : str
+            Header of the column in the first row
+        max_values : int
+            Maximum number of values, no limit if None
+
+        Returns
+        -------
+        Optional[List[str]]
+            Values of the column, None if the column has more values than "max_values". An empty list is
+            returned if the header is not found.
+        """
+        rows = self._iter_rows(sheet_name)
+
+        column = None
+        for row_number, cells in rows:
+            header_cells = list(cells.items())
+            values = self._resolve([raw for _, raw in header_cells])
+            for (cell_column, _), value in zip(header_cells, values):
+                if value == header:
+                    column = cell_column
+            break
+
+        if column is None:
+            return []
+
+        raw_cells = []
+        for _, cells in rows:
+            if column in cells:
+                raw_cells.append(cells[column])
+                if max_values is not None and len(raw_cells) > max_values:
+                    return None
+
+        return [value for value in self._resolve(raw_cells) if value is not None]
+
+    def read_rows(self, sheet_name: str, headers: List[str]) -> List[Dict[str, Optional[str]]]:
+        """Read some columns of a table with the headers in the first row
+
+        Empty rows are skipped.
+
+        Parameters
+        ----------
+        sheet_name : str
+            Name of the sheet
+        headers : List[str]
+            Headers of the columns to read
+
+        Returns
+        -------
+        List[Dict[str, Optional[str]]]
+            One dict per row, keys are the headers, values the content of the cells, None for empty cells
+        """
+        rows = self._iter_rows(sheet_name)
+
+        columns = {}
+        for _, cells in rows:
+            header_cells = list(cells.items())
+            values = self._resolve([raw for _, raw in header_cells])
+            columns = {value: column for (column, _), value in zip(header_cells, values) if value in headers}
+            break
+
+        raw_rows = []
+        for _, cells in rows:
+            raw_row = [cells.get(columns[header]) if header in columns else None for header in headers]
+            if any(raw is not None for raw in raw_row):
+                raw_rows.append(raw_row)
+
+        values = self._resolve([raw for raw_row in raw_rows for raw in raw_row])
+
+        return [dict(zip(headers, values[i:i + len(headers)])) for i in range(0, len(values), len(headers))]
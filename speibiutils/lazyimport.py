@@ -0,0 +1,32 @@
+import sys
+import importlib.util
+from types import ModuleType
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Import a module only when one of its attributes is used for the first time
+
+    Useful for heavy libraries like pandas that are not required by all the phases of the workflow. Modules
+    using it should have `from __future__ import annotations` so that type hints don't load the module.
+
+    Parameters
+    ----------
+    name : str
+        Name of the module, for example "pandas"
+
+    Returns
+    -------
+    ModuleType
+        Module, loaded at the first attribute access
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    return module
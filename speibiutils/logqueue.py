@@ -0,0 +1,306 @@
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Callable, Optional
+from config import LOG_JSON_PATH
+
+# Format of the lines of the log files and of the standard output
+MESSAGE_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# Name of the task of the current context, records are written in the log file of this task
+current_task = contextvars.ContextVar('current_task', default=None)
+
+# Queue between the logging threads and the listener writing the records
+_queue = queue.SimpleQueue()
+_listener = None
+_queue_handler = None
+_lock = threading.Lock()
+
+
+class TaskFilter(logging.Filter):
+    """Tag the records with the task of the current context"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.task = current_task.get()
+        return True
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """Format the records as one json object per line"""
+    def format(self, record: logging.LogRecord) -> str:
+        data = {'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+                'level': record.levelname,
+                'task': getattr(record, 'task', None),
+                'thread': record.threadName,
+                'message': record.getMessage()}
+        if record.exc_info is not None:
+            data['exception'] = self.formatException(record.exc_info)
+        return json.dumps(data)
+
+
+class DispatchHandler(logging.Handler):
+    """Handler of the listener writing the records in the files of their task
+
+    Records of a task are written in the log file of the task, other records in the main log file. All
+    records are written in the standard output and in the optional json lines file.
+
+    Attributes
+    ----------
+    main_handler : logging.FileHandler
+        Handler of the main log file, None if no main log file
+    task_handlers : dict
+        Keys are task names, values the handlers of the log files of the tasks
+    shared_handlers : list
+        Handlers receiving all the records
+    """
+    def __init__(self) -> None:
+        """Initialize the handler with the standard output and the optional json lines file
+
+        Returns
+        -------
+        None
+        """
+        super().__init__()
+        self.main_handler = None
+        self.task_handlers = {}
+
+        stdout_handler = logging.StreamHandler(sys.stdout)
+        stdout_handler.setFormatter(logging.Formatter(MESSAGE_FORMAT))
+        self.shared_handlers = [stdout_handler]
+
+        if LOG_JSON_PATH is not None:
+            json_handler = logging.FileHandler(LOG_JSON_PATH)
+            json_handler.setFormatter(JsonLinesFormatter())
+            self.shared_handlers.append(json_handler)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        """Write a record or apply a change of the log files sent through the queue
+
+        Parameters
+        ----------
+        record : logging.LogRecord
+            Record to write
+
+        Returns
+        -------
+        None
+        """
+        # Changes of the log files are sent through the queue to keep the order with the records
+        command = getattr(record, 'command', None)
+        if command is not None:
+            command(self)
+            return
+
+        handler = self.task_handlers.get(getattr(record, 'task', None), self.main_handler)
+
+        for h in ([handler] if handler is not None else []) + self.shared_handlers:
+            h.handle(record)
+
+    def close(self) -> None:
+        """Close all the log files
+
+        Returns
+        -------
+        None
+        """
+        for handler in [self.main_handler] + list(self.task_handlers.values()) + self.shared_handlers:
+            if handler is not None:
+                handler.close()
+        super().close()
+
+
+def get_file_handler(path: str) -> logging.FileHandler:
+    """Build the handler of a log file
+
+    Parameters
+    ----------
+    path : str
+        Path of the log file
+
+    Returns
+    -------
+    logging.FileHandler
+        Handler with the format of the log files
+    """
+    handler = logging.FileHandler(path, delay=True)
+    handler.setFormatter(logging.Formatter(MESSAGE_FORMAT))
+    return handler
+
+
+def setup() -> None:
+    """Start the listener and add the queue handler to the root logger
+
+    Existing handlers of the root logger are kept. Calling this function again has no effect.
+
+    Returns
+    -------
+    None
+    """
+    global _listener, _queue_handler
+
+    with _lock:
+        if _listener is not None:
+            return
+
+        _queue_handler = QueueHandler(_queue)
+        _queue_handler.addFilter(TaskFilter())
+
+        root = logging.getLogger()
+        root.setLevel(logging.INFO)
+        root.addHandler(_queue_handler)
+
+        _listener = QueueListener(_queue, DispatchHandler())
+        _listener.start()
+
+
+def send_command(command: Callable[[DispatchHandler], None]) -> None:
+    """Send a change of the log files to the listener
+
+    Parameters
+    ----------
+    command : Callable[[DispatchHandler], None]
+        Function applied by the listener to the dispatch handler
+
+    Returns
+    -------
+    None
+    """
+    setup()
+    record = logging.makeLogRecord({'command': command})
+    _queue.put_nowait(record)
+
+
+def set_main_log(path: Optional[str]) -> None:
+    """Change the main log file, the records without task are written in it
+
+    Parameters
+    ----------
+    path : str
+        Path of the log file, None to stop writing the records without task in a file
+
+    Returns
+    -------
+    None
+    """
+    def command(dispatcher: DispatchHandler) -> None:
+        if dispatcher.main_handler is not None:
+            dispatcher.main_handler.close()
+        dispatcher.main_handler = get_file_handler(path) if path is not None else None
+
+    send_command(command)
+
+
+def open_task_log(task_name: str, path: str) -> contextvars.Token:
+    """Write the records of the current context in the log file of a task
+
+    Threads started in this context must use :func:`with_context` to be linked to the task.
+
+    Parameters
+    ----------
+    task_name : str
+        Name of the task
+    path : str
+        Path of the log file of the task
+
+    Returns
+    -------
+    contextvars.Token
+        Token to give to :func:`close_task_log`
+    """
+    def command(dispatcher: DispatchHandler) -> None:
+        if task_name not in dispatcher.task_handlers:
+            dispatcher.task_handlers[task_name] = get_file_handler(path)
+
+    send_command(command)
+    return current_task.set(task_name)
+
+
+def close_task_log(token: contextvars.Token) -> None:
+    """Close the log file of a task opened with :func:`open_task_log`
+
+    Records of the task still in the queue are written before the file is closed.
+
+    Parameters
+    ----------
+    token : contextvars.Token
+        Token returned by :func:`open_task_log`
+
+    Returns
+    -------
+    None
+    """
+    task_name = current_task.get()
+    current_task.reset(token)
+
+    def command(dispatcher: DispatchHandler) -> None:
+        handler = dispatcher.task_handlers.pop(task_name, None)
+        if handler is not None:
+            handler.close()
+
+    send_command(command)
+
+
+def with_context(fn: Callable) -> Callable:
+    """Run a function in the logging context of the caller, for example in a thread pool
+
+    Parameters
+    ----------
+    fn : Callable
+        Function to run
+
+    Returns
+    -------
+    Callable
+        Function running in a copy of the current context, it can be called by several threads
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def flush() -> None:
+    """Wait until all the queued records are written
+
+    Returns
+    -------
+    None
+    """
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener.start()
+            for handler in _listener.handlers:
+                handler.flush()
+
+
+def stop() -> None:
+    """Write the queued records, close the log files and remove the queue handler from the root logger
+
+    Returns
+    -------
+    None
+    """
+    global _listener, _queue_handler
+
+    with _lock:
+        if _listener is None:
+            return
+
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        _queue_handler = None
+
+
+# Queued records are written when the process ends
+atexit.register(stop)
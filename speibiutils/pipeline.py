@@ -0,0 +1,344 @@
+import time
+import zlib
+import queue
+import logging
+import threading
+from typing import Callable, Iterable, List, Optional, Tuple
+from speibiutils import logqueue
+from speibiutils.profiling import profile_thread
+from speibiutils.ratelimiter import RateLimiter
+from config import PIPELINE_QUEUE_SIZE, PIPELINE_LOG_SECONDS
+
+# Sent to the workers to stop them
+_STOP = object()
+
+
+class Stage:
+    """Stage of a pipeline handled by a pool of workers
+
+    Each worker of a keyed stage has its own queue, jobs with the same key are always handled by the same
+    worker and in the order they arrive. Other stages have one queue shared by all their workers.
+
+    Attributes
+    ----------
+    name : str
+        Name of the stage
+    fn : Callable[[dict], Tuple[Optional[str], dict]]
+        Function handling one job. It returns the name of the next stage, None if the job is finished, and
+        the values to give to the coordinator.
+    concurrency : int
+        Number of workers
+    key : Callable[[dict], str]
+        Function returning the routing key of a job, None if the jobs are not routed
+    rate_limiter : RateLimiter
+        Limit of the number of jobs started per second, None if no limit
+    queues : List[queue.Queue]
+        Bounded queues of the stage, one per worker for a keyed stage
+    handled : int
+        Number of jobs handled
+    busy_time : float
+        Total duration of the jobs in seconds
+    """
+    def __init__(self,
+                 name: str,
+                 fn: Callable[[dict], Tuple[Optional[str], dict]],
+                 concurrency: Optional[int] = 1,
+                 key: Optional[Callable[[dict], str]] = None,
+                 jobs_per_second: Optional[float] = None,
+                 queue_size: Optional[int] = None) -> None:
+        """Initialize the stage
+
+        Parameters
+        ----------
+        name : str
+            Name of the stage
+        fn : Callable[[dict], Tuple[Optional[str], dict]]
+            Function handling one job
+        concurrency : int
+            Number of workers
+        key : Callable[[dict], str]
+            Function returning the routing key of a job, None if the jobs are not routed
+        jobs_per_second : float
+            Maximum number of jobs started per second by all the workers, None if no limit
+        queue_size : int
+            Maximum number of jobs waiting in each queue, default is PIPELINE_QUEUE_SIZE of the configuration
+
+        Returns
+        -------
+        None
+        """
+        self.name = name
+        self.fn = fn
+        self.concurrency = max(concurrency, 1)
+        self.key = key
+        self.rate_limiter = RateLimiter(jobs_per_second) if jobs_per_second is not None else None
+        queue_size = queue_size or PIPELINE_QUEUE_SIZE
+        self.queues = [queue.Queue(maxsize=queue_size)
+                       for _ in range(self.concurrency if key is not None else 1)]
+        self.handled = 0
+        self.busy_time = 0.0
+        self._lock = threading.Lock()
+
+    def put(self, job: dict) -> None:
+        """Add a job in the queue of the stage, wait if the queue is full
+
+        Parameters
+        ----------
+        job : dict
+            Job to handle
+
+        Returns
+        -------
+        None
+        """
+        if self.key is None:
+            self.queues[0].put(job)
+        else:
+            self.queues[zlib.crc32(str(self.key(job)).encode()) % len(self.queues)].put(job)
+
+    def get_queue(self, worker: int) -> queue.Queue:
+        """Get the queue of a worker
+
+        Parameters
+        ----------
+        worker : int
+            Number of the worker
+
+        Returns
+        -------
+        queue.Queue
+            Queue read by the worker
+        """
+        return self.queues[worker % len(self.queues)]
+
+    def get_depth(self) -> int:
+        """Get the number of jobs waiting in the queues of the stage
+
+        Returns
+        -------
+        int
+            Number of waiting jobs
+        """
+        return sum(q.qsize() for q in self.queues)
+
+    def add_duration(self, duration: float) -> None:
+        """Count a handled job
+
+        Parameters
+        ----------
+        duration : float
+            Duration of the job in seconds
+
+        Returns
+        -------
+        None
+        """
+        with self._lock:
+            self.handled += 1
+            self.busy_time += duration
+
+
+class Pipeline:
+    """Pipeline of stages connected by bounded queues
+
+    Jobs are dicts going from stage to stage. The workers don't share any state with the caller: after each
+    stage, the values returned by the stage are sent to the coordinator running in the calling thread. The
+    coordinator is the only one updating the state of the caller, for example a DataFrame.
+
+    Attributes
+    ----------
+    name : str
+        Name of the pipeline, used in the logs
+    stages : Dict[str, Stage]
+        Stages of the pipeline by name
+    """
+    def __init__(self, name: str, stages: List[Stage]) -> None:
+        """Initialize the pipeline
+
+        Parameters
+        ----------
+        name : str
+            Name of the pipeline, used in the logs
+        stages : List[Stage]
+            Stages of the pipeline, the first one receives the jobs
+
+        Returns
+        -------
+        None
+        """
+        self.name = name
+        self.stages = {stage.name: stage for stage in stages}
+        self._first_stage = stages[0]
+        self._results = queue.Queue()
+        self._stopped = threading.Event()
+
+    def _work(self, stage: Stage, worker: int) -> None:
+        """Handle the jobs of a queue of a stage until the stop signal
+
+        Parameters
+        ----------
+        stage : Stage
+            Stage of the worker
+        worker : int
+            Number of the worker
+
+        Returns
+        -------
+        None
+        """
+        jobs = stage.get_queue(worker)
+        while True:
+            job = jobs.get()
+            if job is _STOP:
+                return
+
+            if stage.rate_limiter is not None:
+                stage.rate_limiter.acquire()
+
+            start_time = time.monotonic()
+            try:
+                next_stage, values = stage.fn(job)
+            except BaseException as e:
+                # SystemExit of almapiwrapper included: the job is posted as failed, the coordinator raises it again
+                logging.exception(f'{self.name}: error in stage "{stage.name}"')
+                self._results.put((job, {}, True, e))
+                continue
+            finally:
+                stage.add_duration(time.monotonic() - start_time)
+
+            self._results.put((job, values, next_stage is None, None))
+            if next_stage is not None:
+                self.stages[next_stage].put(job)
+
+    def _produce(self, jobs: Iterable[dict], stop: Optional[Callable[[], bool]]) -> None:
+        """Send the jobs to the first stage
+
+        Parameters
+        ----------
+        jobs : Iterable[dict]
+            Jobs to handle
+        stop : Callable[[], bool]
+            Function returning True when no new job must be started
+
+        Returns
+        -------
+        None
+        """
+        submitted = 0
+        interrupted = False
+        for job in jobs:
+            if self._stopped.is_set() is True or (stop is not None and stop() is True):
+                interrupted = True
+                break
+            self._first_stage.put(job)
+            submitted += 1
+
+        self._results.put((None, {'submitted': submitted, 'interrupted': interrupted}, True, None))
+
+    def log_queue_depths(self) -> None:
+        """Log the number of jobs waiting in front of each stage
+
+        Returns
+        -------
+        None
+        """
+        depths = ', '.join(f'{stage.name}: {stage.get_depth()}' for stage in self.stages.values())
+        logging.info(f'{self.name}: queue depths {depths}')
+
+    def log_statistics(self) -> None:
+        """Log the number of jobs and the mean duration of each stage
+
+        Returns
+        -------
+        None
+        """
+        for stage in self.stages.values():
+            if stage.handled > 0:
+                logging.info(f'{self.name}: stage "{stage.name}" handled {stage.handled} jobs with '
+                             f'{stage.concurrency} workers, mean duration {stage.busy_time / stage.handled:.3f}s')
+
+    def run(self,
+            jobs: Iterable[dict],
+            on_result: Callable[[dict, dict, bool], None],
+            stop: Optional[Callable[[], bool]] = None) -> bool:
+        """Run the jobs through the stages
+
+        The jobs are read by a producer thread, it waits when the queue of the first stage is full. When a
+        stage raises an exception, including SystemExit, no new job is started, the jobs in progress are finished
+        and the first exception is raised again.
+
+        Parameters
+        ----------
+        jobs : Iterable[dict]
+            Jobs to handle
+        on_result : Callable[[dict, dict, bool], None]
+            Coordinator called in the calling thread after each stage with the job, the values returned by
+            the stage and True if the job is finished
+        stop : Callable[[], bool]
+            Function returning True when no new job must be started, for example when a time budget is exceeded
+
+        Returns
+        -------
+        bool
+            True if all the jobs were handled, False if the producer was stopped
+        """
+        threads = [threading.Thread(target=logqueue.with_context(self._produce), args=(jobs, stop),
+                                    name=f'{self.name}-producer', daemon=True)]
+        for stage in self.stages.values():
+            threads += [threading.Thread(target=profile_thread(logqueue.with_context(self._work)), args=(stage, worker),
+                                         name=f'{self.name}-{stage.name}-{worker}', daemon=True)
+                        for worker in range(stage.concurrency)]
+        for thread in threads:
+            thread.start()
+
+        submitted = None
+        interrupted = False
+        finished = 0
+        error = None
+        last_log_time = time.monotonic()
+
+        drained = False
+        try:
+            while submitted is None or finished < submitted:
+                try:
+                    job, values, job_finished, job_error = self._results.get(timeout=PIPELINE_LOG_SECONDS)
+                except queue.Empty:
+                    job = None
+                else:
+                    if job is None:
+                        submitted, interrupted = values['submitted'], values['interrupted']
+                        continue
+
+                    if job_error is not None and error is None:
+                        error = job_error
+                        self._stopped.set()
+                    finished += 1 if job_finished is True else 0
+                    if job_error is None:
+                        on_result(job, values, job_finished)
+
+                if time.monotonic() - last_log_time >= PIPELINE_LOG_SECONDS:
+                    self.log_queue_depths()
+                    last_log_time = time.monotonic()
+            drained = True
+
+        finally:
+            # If the coordinator failed, the queues may be full, the workers are daemon threads
+            self._stopped.set()
+            for stage in self.stages.values():
+                for q in stage.queues:
+                    for _ in range(stage.concurrency if stage.key is None else 1):
+                        try:
+                            q.put(_STOP, block=drained)
+                        except queue.Full:
+                            break
+            self.log_statistics()
+
+        if drained is True:
+            # Workers are stopped, their profiles are complete
+            for thread in threads:
+                thread.join()
+
+        if error is not None:
+            raise error
+
+        return interrupted is False
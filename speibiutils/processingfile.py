@@ -0,0 +1,189 @@
+from __future__ import annotations
+import io
+from typing import Optional, Union
+from speibiutils.lazyimport import lazy_import
+from config import TRANSIENT_ERRORS
+
+# pandas is only loaded when a processing file is read or written
+pd = lazy_import('pandas')
+
+# Columns of the processing file of a task and their dtypes. Alma ids are kept as strings: they are compared
+# with the ids returned by almapiwrapper
+PROCESSING_FILE_SCHEMA = {'Barcode': 'str',
+                          'NZ_mms_id': 'str',
+                          'MMS_id_s': 'str',
+                          'Holding_id_s': 'str',
+                          'Item_id_s': 'str',
+                          'MMS_id_d': 'str',
+                          'Holding_id_d': 'str',
+                          'Item_id_d': 'str',
+                          'Process': 'str',
+                          'Copied': 'boolean',
+                          'Renamed': 'boolean',
+                          'Error': 'str',
+                          'Error_category': 'category'}
+
+# Category of each error label of the processing file
+ERROR_CATEGORIES = {'Error by fetching source item': 'source',
+                    'source_fetch_timeout': 'source',
+                    'Location not existing in location table': 'mapping',
+                    'Item policy not existing in policies table': 'mapping',
+                    'Unable to get a destination bib record': 'bib',
+                    'similar_holding_existing': 'holding',
+                    'unknown_holding_error': 'holding',
+                    'provenance_field': 'item',
+                    'temp_library': 'item',
+                    'pattern_type': 'item',
+                    'error_503_failed_to_create': 'item',
+                    'unknown_item_error': 'item',
+                    'source_barcode_not_updated': 'rename',
+                    'invalid_barcode': 'barcode',
+                    'already_exist': 'resolved',
+                    'error_503_success_to_create': 'resolved',
+                    'Item in the destination IZ and barcode of source record already updated': 'resolved'}
+
+# Category of the error labels missing in ERROR_CATEGORIES
+OTHER_ERROR_CATEGORY = 'other'
+
+
+def get_error_category(error_label: Optional[str]) -> Optional[str]:
+    """Get the category of an error label
+
+    Parameters
+    ----------
+    error_label : str
+        Label of the "Error" column
+
+    Returns
+    -------
+    Optional[str]
+        Category of the error, None if there is no error
+    """
+    if error_label is None or pd.isna(error_label):
+        return None
+
+    return ERROR_CATEGORIES.get(error_label, OTHER_ERROR_CATEGORY)
+
+
+def get_dtypes() -> dict:
+    """Get the dtypes of the columns of the processing file
+
+    Returns
+    -------
+    dict
+        Dtypes by column name
+    """
+    categories = list(dict.fromkeys(ERROR_CATEGORIES.values())) + [OTHER_ERROR_CATEGORY]
+    return {column: pd.CategoricalDtype(categories) if dtype == 'category' else dtype
+            for column, dtype in PROCESSING_FILE_SCHEMA.items()}
+
+
+def new_processing_file(barcodes: list) -> pd.DataFrame:
+    """Create the processing data of a task
+
+    Parameters
+    ----------
+    barcodes : list
+        Barcodes of the task
+
+    Returns
+    -------
+    pd.DataFrame
+        Processing data with one row per barcode, nothing copied
+    """
+    df = pd.DataFrame({'Barcode': list(barcodes)})
+    for column in PROCESSING_FILE_SCHEMA:
+        if column not in df.columns:
+            df[column] = None
+
+    df['Copied'] = False
+    df['Renamed'] = False
+
+    return df.astype(get_dtypes())
+
+
+def read_processing_file(path_or_buffer: Union[str, io.BytesIO]) -> pd.DataFrame:
+    """Read a processing file with the dtypes of the schema
+
+    Files written before a column was added are completed: "Renamed" is copied from "Copied" and
+    "Error_category" is computed from "Error".
+
+    Parameters
+    ----------
+    path_or_buffer : Union[str, io.BytesIO]
+        Path of the processing file or its content
+
+    Returns
+    -------
+    pd.DataFrame
+        Processing data
+    """
+    dtypes = get_dtypes()
+    df = pd.read_csv(path_or_buffer, dtype=dtypes)
+
+    # Processing files created before the two-phase rename have no "Renamed" column
+    if 'Renamed' not in df.columns:
+        df['Renamed'] = df['Copied']
+
+    if 'Error_category' not in df.columns:
+        df['Error_category'] = df['Error'].map(get_error_category)
+
+    df[['Copied', 'Renamed']] = df[['Copied', 'Renamed']].fillna(False)
+
+    return df[list(PROCESSING_FILE_SCHEMA)].astype(dtypes)
+
+
+def write_processing_file(df: pd.DataFrame, path: str) -> None:
+    """Write processing data in the CSV format read by :func:`read_processing_file`
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Processing data
+    path : str
+        Path of the processing file
+
+    Returns
+    -------
+    None
+    """
+    df.to_csv(path, index=False)
+
+
+def set_error(df: pd.DataFrame, mask: pd.Series, error_label: Optional[str]) -> None:
+    """Set the error label and its category on rows of the processing data
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Processing data
+    mask : pd.Series
+        Rows to update
+    error_label : str
+        Label of the error, None to remove the error
+
+    Returns
+    -------
+    None
+    """
+    df.loc[mask, 'Error'] = error_label
+    df.loc[mask, 'Error_category'] = get_error_category(error_label)
+
+
+def get_transient_rows(df: pd.DataFrame) -> pd.Series:
+    """Get the rows not copied because of a transient error
+
+    Transient errors are temporary failures of Alma, see TRANSIENT_ERRORS of the configuration. Other errors
+    are permanent: the barcode fails again until the form or Alma data are corrected.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        Processing data
+
+    Returns
+    -------
+    pd.Series
+        Mask of the rows to retry
+    """
+    return (~df['Copied']) & df['Error'].isin(TRANSIENT_ERRORS)
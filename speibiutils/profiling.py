@@ -0,0 +1,285 @@
+import os
+import pstats
+import functools
+import logging
+import cProfile
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
+from config import PROFILING_TOP_ENTRIES
+
+# Profiling is enabled with this environment variable or with the "--profile" option of the command line
+PROFILE_ENV_VAR = 'SPEIBI_PROFILE'
+
+# Number of allocation sites written in the memory report
+MEMORY_REPORT_ENTRIES = 50
+
+_enabled = None
+
+# Profiling session in progress, only one session at a time
+_session = None
+_session_lock = threading.Lock()
+
+
+class Session:
+    """Profiling session of one phase or task
+
+    The calling thread and the threads started with :func:`profile_thread` are profiled, their statistics are
+    merged at the end of the session.
+
+    Attributes
+    ----------
+    name : str
+        Name of the session, used in the names of the artifacts
+    directory : str
+        Directory of the artifacts
+    profiles : List[cProfile.Profile]
+        Profiles of the threads
+    """
+    def __init__(self, name: str, directory: str) -> None:
+        """Initialize the session
+
+        Parameters
+        ----------
+        name : str
+            Name of the session
+        directory : str
+            Directory of the artifacts
+
+        Returns
+        -------
+        None
+        """
+        self.name = name
+        self.directory = directory
+        self.profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def new_profile(self) -> cProfile.Profile:
+        """Create the profile of a thread
+
+        Returns
+        -------
+        cProfile.Profile
+            Profile to enable in the thread
+        """
+        profile = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(profile)
+        return profile
+
+    def get_stats(self) -> Optional[pstats.Stats]:
+        """Merge the profiles of the threads
+
+        Returns
+        -------
+        Optional[pstats.Stats]
+            Statistics of all the threads, None if nothing was profiled
+        """
+        stats = None
+        with self._lock:
+            for profile in self.profiles:
+                profile.create_stats()
+                if len(profile.stats) == 0:
+                    continue
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+        return stats
+
+
+def is_enabled() -> bool:
+    """Check if profiling is enabled
+
+    Returns
+    -------
+    bool
+        True if enabled with :func:`enable` or with the PROFILE_ENV_VAR environment variable
+    """
+    if _enabled is not None:
+        return _enabled
+
+    return os.getenv(PROFILE_ENV_VAR, '').lower() in ['1', 'true', 'yes']
+
+
+def enable(enabled: Optional[bool] = True) -> None:
+    """Enable or disable profiling, the environment variable is then ignored
+
+    Parameters
+    ----------
+    enabled : bool
+        True to enable profiling
+
+    Returns
+    -------
+    None
+    """
+    global _enabled
+    _enabled = enabled
+
+
+def log_hotspots(name: str, stats: pstats.Stats, top: int) -> None:
+    """Log the functions with the largest own time
+
+    Parameters
+    ----------
+    name : str
+        Name of the session
+    stats : pstats.Stats
+        Statistics of the session
+    top : int
+        Number of functions to log
+
+    Returns
+    -------
+    None
+    """
+    logging.info(f'Profile {name}: {stats.total_calls} calls in {stats.total_tt:.2f}s, top {top} hot spots')
+    entries = sorted(stats.stats.items(), key=lambda entry: entry[1][2], reverse=True)[:top]
+    for (file_name, line, function), (_, calls, own_time, cumulative_time, _) in entries:
+        logging.info(f'    {own_time:.3f}s own, {cumulative_time:.3f}s cumulative, {calls} calls: '
+                     f'{function} ({os.path.basename(file_name)}:{line})')
+
+
+def log_memory(name: str, snapshot: tracemalloc.Snapshot, peak: int, path: str, top: int) -> None:
+    """Write the allocation sites in a report and log the largest ones
+
+    Parameters
+    ----------
+    name : str
+        Name of the session
+    snapshot : tracemalloc.Snapshot
+        Snapshot taken at the end of the session
+    peak : int
+        Peak of the traced memory in bytes
+    path : str
+        Path of the memory report
+    top : int
+        Number of allocation sites to log
+
+    Returns
+    -------
+    None
+    """
+    statistics = snapshot.statistics('lineno')
+    with open(path, 'w') as f:
+        f.write(f'Peak of traced memory: {peak / 1024 / 1024:.1f} MB\n')
+        f.write('\n'.join(str(statistic) for statistic in statistics[:MEMORY_REPORT_ENTRIES]))
+
+    logging.info(f'Profile {name}: peak of traced memory {peak / 1024 / 1024:.1f} MB, top {top} allocation sites')
+    for statistic in statistics[:top]:
+        frame = statistic.traceback[0]
+        logging.info(f'    {statistic.size / 1024:.0f} KB in {statistic.count} blocks: '
+                     f'{os.path.basename(frame.filename)}:{frame.lineno}')
+
+
+@contextmanager
+def profile(name: str, directory: Optional[str] = './data') -> Iterator[None]:
+    """Profile the CPU time and the memory of a block if profiling is enabled
+
+    The CPU profile is saved in "profile_<name>.prof" (readable with pstats or snakeviz) and the allocation
+    sites in "memory_<name>.txt". The top PROFILING_TOP_ENTRIES hot spots and allocation sites are logged.
+    Sessions are not nested, a block started during another session is profiled with it.
+
+    Parameters
+    ----------
+    name : str
+        Name of the session, for example the name of the phase or of the task
+    directory : str
+        Directory of the artifacts, for example the local directory of the task
+
+    Returns
+    -------
+    Iterator[None]
+        Context manager
+    """
+    global _session
+
+    with _session_lock:
+        start_session = is_enabled() is True and _session is None
+        if start_session is True:
+            _session = Session(name, directory)
+
+    if start_session is False:
+        yield
+        return
+
+    tracing = tracemalloc.is_tracing()
+    if tracing is False:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+
+    profile_main = _session.new_profile()
+    profile_main.enable()
+    try:
+        yield
+    finally:
+        profile_main.disable()
+        session = _session
+        snapshot = tracemalloc.take_snapshot()
+        peak = tracemalloc.get_traced_memory()[1]
+        if tracing is False:
+            tracemalloc.stop()
+
+        with _session_lock:
+            _session = None
+
+        os.makedirs(directory, exist_ok=True)
+        stats = session.get_stats()
+        if stats is not None:
+            stats.dump_stats(os.path.join(directory, f'profile_{name}.prof'))
+            log_hotspots(name, stats, PROFILING_TOP_ENTRIES)
+        log_memory(name, snapshot, peak, os.path.join(directory, f'memory_{name}.txt'), PROFILING_TOP_ENTRIES)
+
+
+def profile_thread(fn: Callable) -> Callable:
+    """Profile a function run in another thread with the session in progress
+
+    Parameters
+    ----------
+    fn : Callable
+        Function run by the thread
+
+    Returns
+    -------
+    Callable
+        Function profiled if a session is in progress when the thread starts
+    """
+    def run(*args, **kwargs):
+        session = _session
+        if session is None:
+            return fn(*args, **kwargs)
+
+        thread_profile = session.new_profile()
+        thread_profile.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            thread_profile.disable()
+
+    return run
+
+
+def profiled(name: str) -> Callable:
+    """Decorator profiling each call of a function in the data directory, see :func:`profile`
+
+    Parameters
+    ----------
+    name : str
+        Name of the session
+
+    Returns
+    -------
+    Callable
+        Decorator
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with profile(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
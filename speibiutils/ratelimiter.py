@@ -0,0 +1,206 @@
+import time
+import logging
+import threading
+from typing import Optional
+from almapiwrapper.record import Record
+from config import ALMA_API_CALLS_PER_SECOND
+
+# Rate limiter shared by all the threads calling the Alma API
+_limiter = None
+
+# Statistics of the Alma API calls of the process
+_statistics = None
+
+
+class RateLimiter:
+    """Rate limiter class to space out calls shared by several threads
+
+    Attributes
+    ----------
+    calls_per_second : float
+        Maximum number of calls per second
+    """
+    def __init__(self, calls_per_second: float) -> None:
+        """Initialize the rate limiter
+
+        Parameters
+        ----------
+        calls_per_second : float
+            Maximum number of calls per second
+
+        Returns
+        -------
+        None
+        """
+        self.calls_per_second = calls_per_second
+        self._next_call_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Wait until a new call is allowed
+
+        Returns
+        -------
+        None
+        """
+        with self._lock:
+            now = time.monotonic()
+            call_time = max(now, self._next_call_time)
+            self._next_call_time = call_time + 1 / self.calls_per_second
+
+        if call_time > now:
+            time.sleep(call_time - now)
+
+
+class ApiCallStatistics:
+    """Statistics of the Alma API calls shared by several threads
+
+    Attributes
+    ----------
+    calls : dict
+        Number of calls by method, for example {"get": 10, "put": 2}
+    durations : dict
+        Total duration of the calls in seconds by method
+    remaining : int
+        Number of remaining calls of the daily quota according to the last response, None if unknown
+    """
+    def __init__(self) -> None:
+        """Initialize empty statistics
+
+        Returns
+        -------
+        None
+        """
+        self.calls = {}
+        self.durations = {}
+        self.remaining = None
+        self._lock = threading.Lock()
+
+    def add(self, method: str, duration: float, remaining: Optional[int] = None) -> None:
+        """Add a call to the statistics
+
+        Parameters
+        ----------
+        method : str
+            Method of the call: "get", "put", "post" or "delete"
+        duration : float
+            Duration of the call in seconds
+        remaining : int
+            Number of remaining calls of the daily quota, None if unknown
+
+        Returns
+        -------
+        None
+        """
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            self.durations[method] = self.durations.get(method, 0) + duration
+            if remaining is not None:
+                self.remaining = remaining
+
+    def get_total_calls(self) -> int:
+        """Get the total number of calls
+
+        Returns
+        -------
+        int
+            Number of calls of all methods
+        """
+        return sum(self.calls.values())
+
+    def get_mean_duration(self, method: Optional[str] = None) -> Optional[float]:
+        """Get the mean duration of the calls
+
+        Parameters
+        ----------
+        method : str
+            Method of the calls, all the methods if None
+
+        Returns
+        -------
+        Optional[float]
+            Mean duration in seconds, None if no call was made
+        """
+        with self._lock:
+            methods = list(self.calls.keys()) if method is None else [method]
+            nb_calls = sum(self.calls.get(m, 0) for m in methods)
+            if nb_calls == 0:
+                return None
+            return sum(self.durations.get(m, 0) for m in methods) / nb_calls
+
+    def reset(self) -> None:
+        """Reset the statistics, the remaining quota is kept
+
+        Returns
+        -------
+        None
+        """
+        with self._lock:
+            self.calls = {}
+            self.durations = {}
+
+
+def get_api_call_statistics() -> ApiCallStatistics:
+    """Get the statistics of the Alma API calls
+
+    Statistics are only collected once :func:`limit_api_calls` has been called.
+
+    Returns
+    -------
+    ApiCallStatistics
+        Shared statistics
+    """
+    global _statistics
+
+    if _statistics is None:
+        _statistics = ApiCallStatistics()
+
+    return _statistics
+
+
+def limit_api_calls(calls_per_second: Optional[float] = None) -> RateLimiter:
+    """Limit the rate of the Alma API calls made with almapiwrapper
+
+    All the records of almapiwrapper use the "api_call" static method of the "Record" class. This method is
+    wrapped once to wait for the shared rate limiter before each call. The wrapper also collects the
+    statistics of the calls, see :func:`get_api_call_statistics`.
+
+    Parameters
+    ----------
+    calls_per_second : float
+        Maximum number of calls per second, default is ALMA_API_CALLS_PER_SECOND of the configuration
+
+    Returns
+    -------
+    RateLimiter
+        Shared rate limiter
+    """
+    global _limiter
+
+    if calls_per_second is None:
+        calls_per_second = ALMA_API_CALLS_PER_SECOND
+
+    if _limiter is not None:
+        _limiter.calls_per_second = calls_per_second
+        return _limiter
+
+    _limiter = RateLimiter(calls_per_second)
+    statistics = get_api_call_statistics()
+    api_call = Record.api_call
+
+    def limited_api_call(method, *args, **kwargs):
+        _limiter.acquire()
+        start_time = time.monotonic()
+        r = api_call(method, *args, **kwargs)
+
+        remaining = None
+        if r is not None and r.headers.get('X-Exl-Api-Remaining', '').isdigit():
+            remaining = int(r.headers['X-Exl-Api-Remaining'])
+        statistics.add(method, time.monotonic() - start_time, remaining)
+
+        return r
+
+    Record.api_call = staticmethod(limited_api_call)
+    logging.info(f'Alma API calls limited to {calls_per_second} per second')
+
+    return _limiter
@@ -0,0 +1,189 @@
+############################
+# Reconciliation of tasks  #
+############################
+
+# Check that the items of DONE tasks are in the destination IZ as described
+# in the processing file and in the mapping tables of the form.
+
+import speibiutils.speibiutils as speibi
+import speibiutils.transferprocess as tp
+import sftp.sftp as sftpmodule
+from speibiutils import almacache, logqueue
+from speibiutils.ratelimiter import limit_api_calls
+from almapiwrapper.inventory import Item
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from typing import Optional, List
+import pandas as pd
+import logging
+from config import RECONCILIATION_CONCURRENCY, MAX_DAYS_RETENTION
+
+# Columns of the reconciliation report
+REPORT_COLUMNS = ['Barcode', 'Field', 'Expected', 'Found']
+
+
+def get_reconciliation_file_path(task: speibi.Task, local: Optional[bool] = False) -> Optional[str]:
+    """Get the path of the reconciliation report of a task
+
+    Parameters
+    ----------
+    task : speibi.Task
+        Task object
+    local : bool
+        If True, return the local path, otherwise the remote path
+
+    Returns
+    -------
+    str
+        Path of the reconciliation report
+    """
+    if task.is_valid() is False:
+        return None
+
+    return task.get_processing_file_path(local).replace('_processing.csv', '_reconciliation.csv')
+
+
+def compare_item(row: dict,
+                 parameters: dict,
+                 locations_table: pd.DataFrame,
+                 item_policies_table: pd.DataFrame) -> List[dict]:
+    """Compare the destination and source items of a barcode with the expected values
+
+    Parameters
+    ----------
+    row : dict
+        Row of the processing file
+    parameters : dict
+        Parameters of the transfer, see :func:`speibiutils.transferprocess.get_form_parameters`
+    locations_table : pd.DataFrame
+        Locations mapping table
+    item_policies_table : pd.DataFrame
+        Item policies mapping table
+
+    Returns
+    -------
+    List[dict]
+        Differences found, keys are: Barcode, Field, Expected, Found
+    """
+    barcode = row['Barcode']
+    differences = []
+
+    item_d = Item(barcode=barcode, zone=parameters['iz_d'], env=parameters['env'])
+    # The source item is read again from Alma, the cached copy would hide the changes made since the transfer
+    item_s = almacache.get_cache().get_item('OLD_' + barcode, parameters['iz_s'], parameters['env'], refresh=True)
+
+    if item_s.error is True:
+        differences.append({'Barcode': barcode, 'Field': 'source_barcode',
+                            'Expected': 'OLD_' + barcode, 'Found': None})
+
+    if item_d.error is True:
+        differences.append({'Barcode': barcode, 'Field': 'destination_item',
+                            'Expected': row['Item_id_d'], 'Found': None})
+        return differences
+
+    # Holding linkage
+    for field, expected, found in [('item_id', row['Item_id_d'], item_d.get_item_id()),
+                                   ('holding_id', row['Holding_id_d'], item_d.get_holding_id()),
+                                   ('mms_id', row['MMS_id_d'], item_d.get_mms_id())]:
+        if expected != found:
+            differences.append({'Barcode': barcode, 'Field': field, 'Expected': expected, 'Found': found})
+
+    # Library, location and item policy can only be checked with the source item
+    if item_s.error is True:
+        return differences
+
+    location_mapping = tp.get_destination_location(locations_table, item_s.library, item_s.location)
+    policy_d = tp.get_destination_policy(item_policies_table, item_s.data.find('.//policy').text)
+
+    expected_values = [('library', None if location_mapping is None else location_mapping[0], item_d.library),
+                       ('location', None if location_mapping is None else location_mapping[1], item_d.location),
+                       ('policy', policy_d, item_d.data.find('.//policy').text)]
+
+    for field, expected, found in expected_values:
+        if expected != found:
+            differences.append({'Barcode': barcode, 'Field': field, 'Expected': expected, 'Found': found})
+
+    return differences
+
+
+@speibi.sftp_connect
+def reconcile_task(task: speibi.Task,
+                   sftp: sftpmodule.SFTP,
+                   concurrency: Optional[int] = None) -> pd.DataFrame:
+    """Reconcile the destination IZ with the processing file of a DONE task
+
+    Destination items are fetched by barcode and source items by "OLD_" barcode. The differences are
+    saved in the "_items_reconciliation.csv" file of the task, locally and on the remote server.
+
+    Parameters
+    ----------
+    task : speibi.Task
+        Task to reconcile
+    sftp : sftpmodule.SFTP
+        SFTP connection
+    concurrency : int
+        Number of items checked in parallel, default is RECONCILIATION_CONCURRENCY of the configuration
+
+    Returns
+    -------
+    pd.DataFrame
+        Differences found, columns are: Barcode, Field, Expected, Found
+    """
+    if concurrency is None:
+        concurrency = RECONCILIATION_CONCURRENCY
+
+    limit_api_calls()
+
+    task.copy_to_local(sftp=sftp)
+
+    df = tp.load_processing_file(task)
+    if df is None:
+        logging.error(f'{task.get_name()}: no processing file, impossible to reconcile the task')
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+
+    parameters = tp.get_form_parameters(task)
+    locations_table, item_policies_table = tp.load_mapping_tables(task)
+
+    rows = df.loc[df['Copied']].to_dict('records')
+    logging.info(f'{task.get_name()}: reconciliation of {len(rows)} items')
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        compare = logqueue.with_context(
+            lambda row: compare_item(row, parameters, locations_table, item_policies_table))
+        results = executor.map(compare, rows)
+        report = pd.DataFrame([difference for differences in results for difference in differences],
+                              columns=REPORT_COLUMNS)
+
+    almacache.get_cache().log_statistics()
+    report.to_csv(get_reconciliation_file_path(task, local=True), index=False)
+    task.upload_files([get_reconciliation_file_path(task, local=True)], sftp=sftp)
+
+    if len(report) == 0:
+        logging.info(f'{task.get_name()}: destination IZ matches the processing file')
+    else:
+        logging.warning(f'{task.get_name()}: {len(report)} differences found for '
+                        f'{report["Barcode"].nunique()} barcodes')
+
+    return report
+
+
+def reconcile_recent_tasks(concurrency: Optional[int] = None) -> None:
+    """Reconcile all the DONE tasks of the last MAX_DAYS_RETENTION days
+
+    Parameters
+    ----------
+    concurrency : int
+        Number of items checked in parallel, default is RECONCILIATION_CONCURRENCY of the configuration
+
+    Returns
+    -------
+    None
+    """
+    task_summary = speibi.TaskSummary()
+    done_tasks = task_summary.tasks.loc[task_summary.tasks['State'] == 'DONE', ['Account', 'Directory']].values
+
+    for account, directory in done_tasks:
+        task = speibi.Task(directory=directory, account=account)
+        if task.is_valid() is False or (date.today() - task.get_scheduled_date()).days > MAX_DAYS_RETENTION:
+            continue
+        reconcile_task(task, concurrency=concurrency)
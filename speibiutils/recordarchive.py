@@ -0,0 +1,332 @@
+import os
+import csv
+import queue
+import logging
+import zipfile
+import threading
+from datetime import datetime
+from typing import Optional, List, Union
+from almapiwrapper.inventory import Holding, Item
+from config import RECORDS_ARCHIVE_BATCH_SIZE, RECORDS_ARCHIVE_FLUSH_SECONDS
+
+# Columns of the index file of a records archive
+INDEX_COLUMNS = ['Barcode', 'Record_type', 'Zone', 'MMS_id', 'Holding_id', 'Item_id', 'Entry', 'Saved_time']
+
+
+class RecordArchive:
+    """Records archive class to store snapshots of Alma records of a task
+
+    Snapshots are written by a background thread in one compressed zip file per task. Entries use the same
+    layout as the "records" folder of almapiwrapper, for example "UBS_9926054130105504/item_22188447070005504_
+    23188447060005504_01.xml". A csv index next to the archive allows to find the snapshots by barcode or id.
+
+    Attributes
+    ----------
+    archive_path : str
+        Path of the zip archive
+    index_path : str
+        Path of the csv index of the archive
+    lost : int
+        Number of snapshots that could not be written, set when the archive is closed
+    """
+    def __init__(self, archive_path: str) -> None:
+        """Initialize the archive and start the writer thread
+
+        Parameters
+        ----------
+        archive_path : str
+            Path of the zip archive, the archive is extended if it already exists
+
+        Returns
+        -------
+        None
+        """
+        self.archive_path = archive_path
+        self.index_path = self.get_index_path(archive_path)
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+
+        # Snapshots of the batches that could not be written, retried at the next flush
+        self._failed = []
+        self.lost = 0
+
+        # Versions of the entries already in the archive, useful when a task is restarted
+        self._versions = {}
+        for entry in self._reconcile_index():
+            base_entry, version = entry.rsplit('_', 1)
+            self._versions[base_entry] = max(self._versions.get(base_entry, 0), int(version.split('.')[0]))
+
+        self._thread = threading.Thread(target=self._write_snapshots, name='RecordArchive', daemon=True)
+        self._thread.start()
+
+    def _reconcile_index(self) -> List[str]:
+        """Add in the index the entries of the archive missing in it
+
+        The zip archive is written before the index. If writing the index failed and the process stopped, the
+        archive contains entries without rows in the index. The rows are rebuilt from the names of the entries,
+        barcode and saved time are unknown.
+
+        Returns
+        -------
+        List[str]
+            Names of the entries in the archive
+        """
+        if os.path.exists(self.archive_path) is False:
+            return []
+
+        with zipfile.ZipFile(self.archive_path) as archive:
+            entries = archive.namelist()
+
+        indexed_entries = {row['Entry'] for row in self.read_index(self.archive_path)}
+        rows = []
+        for entry in entries:
+            if entry in indexed_entries:
+                continue
+            folder, name = entry.split('/')
+            zone, mms_id = folder.rsplit('_', 1)
+            parts = name.split('_')
+            rows.append({'Barcode': '',
+                         'Record_type': 'item' if parts[0] == 'item' else 'holding',
+                         'Zone': zone,
+                         'MMS_id': mms_id,
+                         'Holding_id': parts[1],
+                         'Item_id': parts[2] if parts[0] == 'item' else '',
+                         'Entry': entry,
+                         'Saved_time': ''})
+
+        if len(rows) > 0:
+            logging.warning(f'{len(rows)} entries of {self.archive_path} missing in the index => rows rebuilt')
+            self._write_index(rows)
+
+        return entries
+
+    def _write_index(self, rows: List[dict]) -> None:
+        """Append rows to the index of the archive
+
+        Parameters
+        ----------
+        rows : List[dict]
+            Rows to add in the index
+
+        Returns
+        -------
+        None
+        """
+        write_header = os.path.exists(self.index_path) is False
+        with open(self.index_path, 'a', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=INDEX_COLUMNS)
+            if write_header is True:
+                writer.writeheader()
+            writer.writerows(rows)
+
+    @staticmethod
+    def get_index_path(archive_path: str) -> str:
+        """Get the path of the csv index of an archive
+
+        Parameters
+        ----------
+        archive_path : str
+            Path of the zip archive
+
+        Returns
+        -------
+        str
+            Path of the csv index
+        """
+        return f'{os.path.splitext(archive_path)[0]}_index.csv'
+
+    def add(self, record: Union[Item, Holding], barcode: str) -> None:
+        """Add a snapshot of a record to the archive
+
+        The record is serialized immediately, writing in the archive is done in background. Records with
+        errors are skipped like with the "save" method of almapiwrapper.
+
+        Parameters
+        ----------
+        record : Item or Holding
+            Record to archive
+        barcode : str
+            Barcode of the handled item, used in the index
+
+        Returns
+        -------
+        None
+        """
+        if record.error is True:
+            return
+
+        if isinstance(record, Item):
+            record_type = 'item'
+            holding_id = record.holding.holding_id
+            item_id = record.get_item_id()
+            base_entry = f'{record.zone}_{record.bib.mms_id}/item_{holding_id}_{item_id}'
+        else:
+            record_type = 'holding'
+            holding_id = record.holding_id
+            item_id = ''
+            base_entry = f'{record.zone}_{record.bib.mms_id}/hol_{holding_id}'
+
+        content = str(record)
+
+        with self._lock:
+            version = self._versions.get(base_entry, 0) + 1
+            self._versions[base_entry] = version
+
+        entry = f'{base_entry}_{str(version).zfill(2)}.xml'
+        self._queue.put((content, {'Barcode': barcode,
+                                   'Record_type': record_type,
+                                   'Zone': record.zone,
+                                   'MMS_id': record.bib.mms_id,
+                                   'Holding_id': holding_id,
+                                   'Item_id': item_id,
+                                   'Entry': entry,
+                                   'Saved_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")}))
+
+    def close(self) -> bool:
+        """Write the pending snapshots and stop the writer thread
+
+        Snapshots of the batches that failed are retried one last time. Snapshots still not written are
+        counted in the "lost" attribute.
+
+        Returns
+        -------
+        bool
+            True if all the snapshots were written
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+        self.lost = len(self._failed)
+        if self.lost > 0:
+            logging.error(f'{self.lost} records snapshots lost, not written in {self.archive_path}')
+
+        return self.lost == 0
+
+    def _write_snapshots(self) -> None:
+        """Loop of the writer thread
+
+        Snapshots are written by batches when the batch is full, when the oldest pending snapshot waited too long
+        or when the archive is closed.
+
+        Returns
+        -------
+        None
+        """
+        batch = []
+        last_flush = datetime.now()
+        while True:
+            try:
+                snapshot = self._queue.get(timeout=RECORDS_ARCHIVE_FLUSH_SECONDS)
+            except queue.Empty:
+                snapshot = False
+
+            if snapshot:
+                batch.append(snapshot)
+
+            if (snapshot is None or len(batch) >= RECORDS_ARCHIVE_BATCH_SIZE
+                    or (datetime.now() - last_flush).total_seconds() >= RECORDS_ARCHIVE_FLUSH_SECONDS):
+                self._flush(batch)
+                batch = []
+                last_flush = datetime.now()
+
+            if snapshot is None:
+                return
+
+    def _flush(self, batch: List[tuple]) -> bool:
+        """Write a batch of snapshots in the archive and in the index
+
+        Snapshots of the previous failed batches are written first. When writing fails, the snapshots are kept
+        and retried at the next flush. Entries already in the archive are not written again, only their index
+        rows, so a batch failing after the zip was extended doesn't create duplicate entries.
+
+        Parameters
+        ----------
+        batch : List[tuple]
+            List of tuples with the xml content and the index row
+
+        Returns
+        -------
+        bool
+            True if all the snapshots were written
+        """
+        batch = self._failed + batch
+        self._failed = []
+        if len(batch) == 0:
+            return True
+
+        written = []
+        try:
+            with zipfile.ZipFile(self.archive_path, 'a', compression=zipfile.ZIP_DEFLATED) as archive:
+                entries = set(archive.namelist())
+                for content, row in batch:
+                    if row['Entry'] not in entries:
+                        try:
+                            archive.writestr(row['Entry'], content)
+                        except Exception as e:
+                            # One invalid snapshot must not block the others
+                            logging.error(f'Error writing {row["Entry"]} in {self.archive_path}: {repr(e)}')
+                            self._failed.append((content, row))
+                            continue
+                    written.append(row)
+
+            self._write_index(written)
+
+        except Exception as e:
+            # The writer thread must survive, the batch is retried with the next one
+            logging.error(f'Error writing {len(batch)} records in {self.archive_path}: {repr(e)}')
+            self._failed = batch
+            return False
+
+        logging.info(f'{len(written)} records saved in {self.archive_path}')
+        return len(self._failed) == 0
+
+    @staticmethod
+    def read_index(archive_path: str) -> List[dict]:
+        """Read the index of an archive
+
+        Parameters
+        ----------
+        archive_path : str
+            Path of the zip archive
+
+        Returns
+        -------
+        List[dict]
+            Rows of the index, empty list if no index exists
+        """
+        index_path = RecordArchive.get_index_path(archive_path)
+        if os.path.exists(index_path) is False:
+            return []
+
+        with open(index_path, newline='') as f:
+            return list(csv.DictReader(f))
+
+    @staticmethod
+    def get_records(archive_path: str,
+                    barcode: Optional[str] = None,
+                    record_id: Optional[str] = None) -> List[str]:
+        """Get the snapshots of records from an archive
+
+        Parameters
+        ----------
+        archive_path : str
+            Path of the zip archive
+        barcode : str
+            Barcode of the item, all the snapshots made while handling this barcode are returned
+        record_id : str
+            MMS ID, holding ID or item ID of a record
+
+        Returns
+        -------
+        List[str]
+            XML content of the snapshots, in the order they were saved
+        """
+        entries = [row['Entry'] for row in RecordArchive.read_index(archive_path)
+                   if (barcode is not None and row['Barcode'] == barcode)
+                   or (record_id is not None and record_id in [row['MMS_id'], row['Holding_id'], row['Item_id']])]
+
+        if len(entries) == 0:
+            return []
+
+        with zipfile.ZipFile(archive_path) as archive:
+            return [archive.read(entry).decode() for entry in entries]
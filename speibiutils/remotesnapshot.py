@@ -0,0 +1,149 @@
+from __future__ import annotations
+import os
+import json
+import stat
+import time
+import logging
+from typing import List, Optional
+from speibiutils.lazyimport import lazy_import
+
+# SFTP module is only loaded when a connection is used
+sftpmodule = lazy_import('sftp.sftp')
+
+# Resolution of the modification times on the SFTP server, in seconds
+MTIME_RESOLUTION = 1
+
+
+class RemoteSnapshot:
+    """Cached listing of the remote directories
+
+    The content of each listed directory is stored with the modification time of the directory. A directory is
+    listed again only when its modification time changed, an unchanged directory costs one stat call. The
+    snapshot is kept in a json file between the runs.
+
+    A listing made in the same second as the last modification of the directory is not trusted, the
+    directory could have been modified again without changing its modification time. The clocks of the local
+    and remote servers are expected to be synchronized.
+
+    Changes stay pending in the saved snapshot until the workflow handled them, see :meth:`mark_handled`. A run
+    stopped before the end doesn't hide the changes from the next run.
+
+    Attributes
+    ----------
+    path : str
+        Path of the json file of the snapshot
+    directories : dict
+        Keys are the remote paths, values dict with "mtime", "listed_time" and "names"
+    changed_directories : set
+        Remote paths whose content changed since the previous snapshot
+    pending : bool
+        True if the saved snapshot has changes not handled yet
+    """
+    def __init__(self, path: str = 'data/remote_snapshot.json') -> None:
+        """Load the snapshot
+
+        Parameters
+        ----------
+        path : str
+            Path of the json file of the snapshot
+
+        Returns
+        -------
+        None
+        """
+        self.path = path
+        self.directories = {}
+        self.changed_directories = set()
+        self.pending = False
+
+        if os.path.exists(path) is True:
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+                self.directories = data.get('directories', {})
+                self.pending = data.get('pending', True)
+            except (OSError, ValueError) as e:
+                logging.warning(f'Remote snapshot {path} not readable, all directories will be listed: {e}')
+
+    def listdir(self,
+                sftp: sftpmodule.SFTP,
+                path: str,
+                directories_only: bool = False,
+                file_suffix: Optional[str] = None) -> List[str]:
+        """List a remote directory, the cached listing is used if the directory didn't change
+
+        Missing directories are created.
+
+        Parameters
+        ----------
+        sftp : sftpmodule.SFTP
+            SFTP connection
+        path : str
+            Remote path of the directory
+        directories_only : bool
+            If True, only the subdirectories are returned
+        file_suffix : str
+            With "directories_only", files with this suffix are also returned
+
+        Returns
+        -------
+        List[str]
+            Sorted names of the entries
+        """
+        mtime = sftp.get_mtime(path)
+        if mtime is None:
+            logging.warning(f'Creating directory {path}')
+            sftp.mkdir(path)
+            mtime = sftp.get_mtime(path)
+
+        key = f'{path}|{"dirs" if directories_only is True else "all"}{file_suffix or ""}'
+        cached = self.directories.get(key)
+        if (cached is not None and cached['mtime'] == mtime
+                and cached['listed_time'] - cached['mtime'] > MTIME_RESOLUTION):
+            return cached['names']
+
+        names = sorted(entry.filename for entry in sftp.listdir_attr(path)
+                       if directories_only is False or stat.S_ISDIR(entry.st_mode)
+                       or (file_suffix is not None and entry.filename.endswith(file_suffix)))
+
+        if cached is None or cached['names'] != names:
+            self.changed_directories.add(path)
+
+        self.directories[key] = {'mtime': mtime, 'listed_time': int(time.time()), 'names': names}
+
+        return names
+
+    def has_changed(self) -> bool:
+        """Check if the content of a listed directory changed since the changes were last handled
+
+        Returns
+        -------
+        bool
+            True if at least one listed directory changed or if changes of the saved snapshot are pending
+        """
+        return len(self.changed_directories) > 0 or self.pending is True
+
+    def save(self) -> None:
+        """Save the snapshot in the json file, the changes stay pending
+
+        Returns
+        -------
+        None
+        """
+        self.pending = self.has_changed()
+        try:
+            with open(self.path, 'w') as f:
+                json.dump({'pending': self.pending, 'directories': self.directories}, f)
+        except OSError as e:
+            logging.error(f'Error saving remote snapshot {self.path}: {e}')
+
+    def mark_handled(self) -> None:
+        """Save the snapshot without pending changes, once the workflow handled them
+
+        Returns
+        -------
+        None
+        """
+        self.changed_directories.clear()
+        self.pending = False
+        self.save()
@@ -1,15 +1,26 @@
+from __future__ import annotations
 import os
-import sftp.sftp as sftpmodule
-import pandas as pd
+import io
 import logging
-import openpyxl
 import dotenv
 from typing import List, Optional, Callable
-import sys
 import re
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
 import shutil
-from config import MAX_BARCODES_LARGE, MAX_BARCODES_SMALL, MAX_DAYS_RETENTION, LARGE_TASK_HOUR, SBK_DIR
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from speibiutils import barcodecheck, excelpool, logqueue, processingfile, taskbundle
+from speibiutils.lazyimport import lazy_import
+from speibiutils.barcodeindex import BarcodeIndex, BARCODE_INDEX_PATH
+from speibiutils.formreader import FormReader, READ_ERRORS
+from speibiutils.remotesnapshot import RemoteSnapshot
+from config import MAX_BARCODES_LARGE, MAX_BARCODES_SMALL, MAX_DAYS_RETENTION, SBK_DIR, \
+    CHECK_FORMS_CONCURRENCY, ARCHIVE_AFTER_DAYS, PROCESSING_WINDOW_HOURS, DEFAULT_ITEMS_PER_HOUR, \
+    THROUGHPUT_HISTORY_TASKS, INVALID_BARCODES_ACTION, BARCODE_INDEX_DONE_DAYS
+
+# Heavy libraries are only loaded when used
+pd = lazy_import('pandas')
+sftpmodule = lazy_import('sftp.sftp')
 
 # Possible states of a task
 STATES = ['NEW', 'READY', 'ERROR', 'PROCESSING', 'DONE']
@@ -17,6 +28,154 @@ STATES = ['NEW', 'READY', 'ERROR', 'PROCESSING', 'DONE']
 # Possible sizes of a task
 SIZE = ['SMALL', 'LARGE']
 
+# Remote path of a task: account, directory, name, scheduled date, size, state and suffix of archived tasks
+TASK_PATH_PATTERN = re.compile(r'^(sbk\w+)/download/storage_tasks/'
+                               r'((task_(\d{4}-\d{2}-\d{2})_.*_([A-Z]+))_([A-Z]+))(\.zip)?$')
+
+# Directory of a task: size and state
+TASK_DIRECTORY_PATTERN = re.compile(r'^task_\d{4}-\d{2}-\d{2}_.*_([A-Z]+)_([A-Z]+)$')
+
+# Columns of the task summary
+TASK_SUMMARY_COLUMNS = ['Account', 'Directory', 'Check_time', 'Start_time', 'End_time', 'Scheduled_date', 'Size',
+                        'State', 'Message', 'Barcodes', 'Source_IZ']
+
+# Number of days searched for a date with enough time for a continuation task
+CONTINUATION_SEARCH_DAYS = 7
+
+# Maximum number of successive continuation tasks of a task, the file in the task directory counts them
+MAX_CONTINUATIONS = 3
+CONTINUATION_FILE_NAME = 'continuations.txt'
+
+# Expected sheets of the Excel forms
+FORM_SHEET_NAMES = ['General', 'Items', 'Locations_mapping', 'Item_policies_mapping', 'data_validation']
+
+# If True, the main thread keeps one SFTP connection open between the calls
+_keep_connection_open = False
+
+# Persistent connection of the main thread
+_persistent_sftp = None
+
+# Last loaded task summary: path, modification time and size of the file, task list
+_task_summary_cache = None
+
+
+def get_remaining_window_hours(size: str, now: Optional[datetime] = None) -> float:
+    """Get the number of hours remaining today in the processing window of a size of tasks
+
+    Parameters
+    ----------
+    size : str
+        Size of the tasks, see PROCESSING_WINDOW_HOURS of the configuration
+    now : datetime
+        Current time, default is now
+
+    Returns
+    -------
+    float
+        Number of hours, the whole window if it has not started yet today and 0 if it is over
+    """
+    if now is None:
+        now = datetime.now()
+
+    start_hour, end_hour = PROCESSING_WINDOW_HOURS[size]
+    window_hours = (end_hour - start_hour) % 24 or 24
+    hour = now.hour + now.minute / 60
+
+    if hour < start_hour:
+        return window_hours
+
+    return max(window_hours - (hour - start_hour), 0)
+
+
+def is_in_processing_window(size: str, now: Optional[datetime] = None) -> bool:
+    """Check if the processing window of a size of tasks is open
+
+    Parameters
+    ----------
+    size : str
+        Size of the tasks, see PROCESSING_WINDOW_HOURS of the configuration
+    now : datetime
+        Current time, default is now
+
+    Returns
+    -------
+    bool
+        True if tasks of this size can be processed now
+    """
+    if now is None:
+        now = datetime.now()
+
+    start_hour, end_hour = PROCESSING_WINDOW_HOURS[size]
+    window_hours = (end_hour - start_hour) % 24 or 24
+
+    return (now.hour + now.minute / 60 - start_hour) % 24 < window_hours
+
+
+def open_connection() -> sftpmodule.SFTP:
+    """Open a connection to the SFTP server
+
+    Returns
+    -------
+    sftpmodule.SFTP
+        SFTP connection
+    """
+    dotenv.load_dotenv()
+    host = os.getenv('SFTP_HOST')
+    user = os.getenv('SFTP_USER')
+    password = os.getenv('SFTP_PASSWORD')
+    environment = os.getenv('SFTP_ENVIRONMENT')
+    sftp = sftpmodule.SFTP(host, user, password)
+
+    # We need to work in a particular directory for the test environment
+    if environment == 'test':
+        sftp.SFTP_Client.chdir(path=f'automation_storage_tasks')
+
+    return sftp
+
+
+def keep_connection_open(keep_open: Optional[bool] = True) -> None:
+    """Keep one SFTP connection open for the main thread between the calls
+
+    Used by long-running processes to avoid reconnecting for each call. Worker threads still open
+    their own connections.
+
+    Parameters
+    ----------
+    keep_open : bool
+        If False, the persistent connection is closed and each call opens its own connection again
+
+    Returns
+    -------
+    None
+    """
+    global _keep_connection_open, _persistent_sftp
+
+    _keep_connection_open = keep_open
+    if keep_open is False and _persistent_sftp is not None:
+        _persistent_sftp.close()
+        _persistent_sftp = None
+
+
+def get_persistent_connection() -> Optional[sftpmodule.SFTP]:
+    """Get the persistent connection, it is opened again if the previous one was lost
+
+    Returns
+    -------
+    Optional[sftpmodule.SFTP]
+        Persistent connection, None if not enabled or if the current thread is not the main thread
+    """
+    global _persistent_sftp
+
+    if _keep_connection_open is False or threading.current_thread() is not threading.main_thread():
+        return None
+
+    if (_persistent_sftp is None
+            or _persistent_sftp.SFTP_Client.get_channel().get_transport().is_active() is False):
+        logging.info('Opening persistent SFTP connection')
+        _persistent_sftp = open_connection()
+
+    return _persistent_sftp
+
 
 def sftp_connect(fn: Callable) -> Callable:
     """Decorator to connect to the SFTP server
@@ -49,16 +208,17 @@ def sftp_connect(fn: Callable) -> Callable:
             Result of the function
 
         """
-        dotenv.load_dotenv()
-        host = os.getenv('SFTP_HOST')
-        user = os.getenv('SFTP_USER')
-        password = os.getenv('SFTP_PASSWORD')
-        environment = os.getenv('SFTP_ENVIRONMENT')
-        sftp = sftpmodule.SFTP(host, user, password)
+        # Reuse the connection provided by the caller
+        if kwargs.get('sftp') is not None:
+            return fn(*args, **kwargs)
 
-        # We need to work in a particular directory for the test environment
-        if environment == 'test':
-            sftp.SFTP_Client.chdir(path=f'automation_storage_tasks')
+        # Reuse the persistent connection of the main thread, see keep_connection_open
+        persistent_sftp = get_persistent_connection()
+        if persistent_sftp is not None:
+            kwargs['sftp'] = persistent_sftp
+            return fn(*args, **kwargs)
+
+        sftp = open_connection()
 
         # Transmit sftp connection to the function
         kwargs['sftp'] = sftp
@@ -77,13 +237,37 @@ def sftp_connect(fn: Callable) -> Callable:
 class Task:
     """Task class to handle tasks
 
-    This class is mainly used to handle various paths to files and directories.
+    This class is mainly used to handle various paths to files and directories. The remote path is parsed
+    once at creation, tasks are immutable and can be used as keys of dictionaries and sets. Fields parsed
+    from the path are None if the task is not valid.
+
+    Archived tasks are packed in one bundle, see :mod:`speibiutils.taskbundle`. Their remote path ends with
+    the suffix of the bundle, the directory and the paths of the files are the same as before archiving.
 
     Attributes
     ----------
     remote_path : str
         Remote path of the task
+    account : str
+        Account of the task, for example "sbkubs"
+    directory : str
+        Directory of the task with size and state
+    name : str
+        Name of the task with size and without state
+    scheduled_date : date
+        Scheduled date of the task
+    size : str
+        Size of the task, see SIZE
+    state : str
+        State of the task, see STATES
+    valid : bool
+        True if the remote path is a valid task path
+    archived : bool
+        True if the remote path is the path of the bundle of the task
     """
+    __slots__ = ('remote_path', 'account', 'directory', 'name', 'scheduled_date', 'size', 'state', 'valid',
+                 'archived')
+
     def __init__(self, remote_path: Optional[str] = None,
                  directory: Optional[str] = None,
                  account: Optional[str] = None) -> None:
@@ -106,10 +290,50 @@ class Task:
         -------
         None
         """
-        if remote_path is not None:
-            self.remote_path = remote_path
-        elif directory is not None and account is not None:
-            self.remote_path = f'{account}/download/storage_tasks/{directory}'
+        if remote_path is None and directory is not None and account is not None:
+            remote_path = f'{account}/download/storage_tasks/{directory}'
+
+        m = TASK_PATH_PATTERN.match(remote_path) if remote_path is not None else None
+        fields = dict.fromkeys(self.__slots__)
+        fields['remote_path'] = remote_path
+        fields['valid'] = False
+
+        if m is not None and m.group(1) in SBK_DIR and m.group(5) in SIZE and m.group(6) in STATES:
+            try:
+                scheduled_date = datetime.strptime(m.group(4), '%Y-%m-%d').date()
+            except ValueError:
+                scheduled_date = None
+
+            if scheduled_date is not None:
+                fields.update({'account': m.group(1),
+                               'directory': m.group(2),
+                               'name': m.group(3),
+                               'scheduled_date': scheduled_date,
+                               'size': m.group(5),
+                               'state': m.group(6),
+                               'valid': True,
+                               'archived': m.group(7) is not None})
+
+        for field, value in fields.items():
+            object.__setattr__(self, field, value)
+
+    def __setattr__(self, key, value) -> None:
+        raise AttributeError(f'Task objects are immutable, "{key}" cannot be set')
+
+    def __delattr__(self, key) -> None:
+        raise AttributeError(f'Task objects are immutable, "{key}" cannot be deleted')
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Task) and self.remote_path == other.remote_path
+
+    def __hash__(self) -> int:
+        return hash(self.remote_path)
+
+    def __repr__(self) -> str:
+        return f'Task({self.remote_path!r})'
+
+    def __reduce__(self) -> tuple:
+        return Task, (self.remote_path,)
 
     @staticmethod
     def get_name_from_dir(directory: str) -> Optional[str]:
@@ -146,8 +370,7 @@ class Task:
         bool
             True if the directory is valid, False otherwise
         """
-        m = re.match(r'^task_\d{4}-\d{2}-\d{2}_.*_([A-Z]+)_([A-Z]+)$',
-                     directory)
+        m = TASK_DIRECTORY_PATTERN.match(directory)
         if m is None:
             return False
 
@@ -166,16 +389,7 @@ class Task:
         bool
             True if the task is valid, False otherwise
         """
-
-        m = re.match(r'^(sbk\w+)/download/storage_tasks/task_\d{4}-\d{2}-\d{2}_.*_([A-Z]+)_([A-Z]+)$',
-                     self.remote_path)
-        if m is None:
-            return False
-
-        if m.group(1) not in SBK_DIR or m.group(2) not in SIZE or m.group(3) not in STATES:
-            return False
-
-        return True
+        return self.valid
 
     def get_name(self) -> Optional[str]:
         """Get the name of a task
@@ -185,13 +399,7 @@ class Task:
         str
             Name of the task without the state and size
         """
-        if self.is_valid() is False:
-            return None
-
-        m = re.match(r'^sbk\w+/download/storage_tasks/(task_\d{4}-\d{2}-\d{2}_.*_[A-Z]+)_[A-Z]+$',
-                     self.remote_path)
-
-        return m.group(1)
+        return self.name
 
     def get_directory(self) -> Optional[str]:
         """Get the directory of a task
@@ -201,13 +409,7 @@ class Task:
         str
             Directory of the task
         """
-        if self.is_valid() is False:
-            return None
-
-        m = re.match(r'^sbk\w+/download/storage_tasks/(task_\d{4}-\d{2}-\d{2}_.*_[A-Z]+_[A-Z]+)$',
-                     self.remote_path)
-
-        return m.group(1)
+        return self.directory
 
     def get_directory_path(self, local: Optional[bool] = False) -> Optional[str]:
         """Get the directory path of a task
@@ -222,12 +424,29 @@ class Task:
         str
             Directory path of the task (with state and size)
         """
-        if self.is_valid() is False:
+        if self.valid is False:
             return None
 
-        m = re.match(r'^sbk\w+/download/storage_tasks/task_\d{4}-\d{2}-\d{2}_.*_[A-Z]+_[A-Z]+$',
-                     self.remote_path)
-        return f'data/{m.group(0)}' if local is True else m.group(0)
+        directory_path = f'{self.account}/download/storage_tasks/{self.directory}'
+        return f'data/{directory_path}' if local is True else directory_path
+
+    def get_bundle_path(self, local: Optional[bool] = False) -> Optional[str]:
+        """Get the path of the bundle of a task, see :meth:`archive`
+
+        Parameters
+        ----------
+        local : bool
+            If True, return the local path, otherwise the remote path
+
+        Returns
+        -------
+        str
+            Path of the bundle of the task
+        """
+        if self.valid is False:
+            return None
+
+        return f'{self.get_directory_path(local)}{taskbundle.BUNDLE_SUFFIX}'
 
     def get_form_path(self, local: Optional[bool] = False) -> Optional[str]:
         """Get the form path of a task
@@ -262,6 +481,21 @@ class Task:
 
         return f'{self.get_name()}.xlsx'
 
+    def get_source_iz(self) -> Optional[str]:
+        """Get the source IZ of a task from the local Excel form
+
+        Returns
+        -------
+        Optional[str]
+            Source IZ, None if the form cannot be read
+        """
+        try:
+            with FormReader(self.get_form_path(local=True)) as form:
+                return form.get_cells('General', ['B3'])['B3']
+        except READ_ERRORS as e:
+            logging.error(f'Error reading file {self.get_form_name()}: {e}')
+            return None
+
     def get_processing_file_path(self, local: Optional[bool] = False) -> Optional[str]:
         """Get the processing file path of a task
 
@@ -282,7 +516,118 @@ class Task:
         task_name = self.get_name()
         return f'{directory_path}/{task_name}_items_processing.csv'
 
-    def get_scheduled_date(self) -> date:
+    def get_records_archive_path(self, local: Optional[bool] = False) -> Optional[str]:
+        """Get the path of the archive with the snapshots of the records of a task
+
+        Parameters
+        ----------
+        local : bool
+            If True, return the local path, otherwise the remote path
+
+        Returns
+        -------
+        str
+            Path of the records archive
+        """
+        if self.is_valid() is False:
+            return None
+
+        directory_path = self.get_directory_path(local)
+        task_name = self.get_name()
+        return f'{directory_path}/{task_name}_records.zip'
+
+    @sftp_connect
+    def copy_to_local(self, sftp: sftpmodule.SFTP) -> None:
+        """Copy the remote directory of the task to the local server if not available locally
+
+        Archived tasks are unpacked from the local bundle, or from the remote bundle if the local bundle is
+        not available.
+
+        Parameters
+        ----------
+        sftp : sftpmodule.SFTP
+            SFTP connection
+
+        Returns
+        -------
+        None
+        """
+        if os.path.exists(self.get_directory_path(local=True)) is True:
+            return
+
+        if os.path.isfile(self.get_bundle_path(local=True)) is False:
+            if sftp.is_dir(self.get_directory_path()) is True:
+                sftp.copy_to_local(self.get_directory_path(), self.get_directory_path(local=True))
+                logging.info(f'{self.get_directory()} copied to local server')
+                return
+
+            sftp.get(self.get_bundle_path(), self.get_bundle_path(local=True))
+
+        taskbundle.unpack(self.get_bundle_path(local=True), self.get_directory_path(local=True))
+        logging.info(f'{self.get_directory()} unpacked from bundle')
+
+    @sftp_connect
+    def upload_files(self, local_paths: List[str], sftp: sftpmodule.SFTP) -> None:
+        """Upload files of the local directory to the remote task
+
+        If the remote task is archived, the bundle is packed again with the local directory and uploaded.
+
+        Parameters
+        ----------
+        local_paths : List[str]
+            Local paths of the files, in the local directory of the task
+        sftp : sftpmodule.SFTP
+            SFTP connection
+
+        Returns
+        -------
+        None
+        """
+        if sftp.is_dir(self.get_directory_path()) is True:
+            local_directory = self.get_directory_path(local=True)
+            sftp.put_many([(local_path, self.get_directory_path() + local_path[len(local_directory):])
+                           for local_path in local_paths])
+            return
+
+        taskbundle.pack(self.get_directory_path(local=True), self.get_bundle_path(local=True))
+        sftp.put(self.get_bundle_path(local=True), self.get_bundle_path())
+        logging.info(f'{self.get_directory()}: bundle updated on remote server')
+
+    @sftp_connect
+    def archive(self, sftp: sftpmodule.SFTP) -> Task:
+        """Pack the task in one bundle, locally and remotely
+
+        The local bundle is packed from the local directory, the remote directory is copied first if no local
+        version exists. The bundle is uploaded and the remote and local directories are then removed.
+
+        Parameters
+        ----------
+        sftp : sftpmodule.SFTP
+            SFTP connection
+
+        Returns
+        -------
+        Task
+            Archived task
+        """
+        if (os.path.exists(self.get_directory_path(local=True)) is False
+                and os.path.isfile(self.get_bundle_path(local=True)) is False):
+            self.copy_to_local(sftp=sftp)
+
+        if os.path.exists(self.get_directory_path(local=True)) is True:
+            taskbundle.pack(self.get_directory_path(local=True), self.get_bundle_path(local=True))
+
+        sftp.put(self.get_bundle_path(local=True), self.get_bundle_path())
+        sftp.rmtree(self.get_directory_path())
+
+        if os.path.exists(self.get_directory_path(local=True)) is True:
+            shutil.rmtree(self.get_directory_path(local=True))
+
+        logging.info(f'{self.get_directory()} archived in {self.get_bundle_path()}')
+
+        return Task(self.get_bundle_path())
+
+    def get_scheduled_date(self) -> Optional[date]:
         """Return the scheduled date in date format
 
         Returns
@@ -290,7 +635,7 @@ class Task:
         date
             Scheduled date of the task
         """
-        return datetime.strptime(self.get_parameters()['Scheduled_date'], '%Y-%m-%d').date()
+        return self.scheduled_date
 
     def get_parameters(self) -> Optional[dict]:
         """Get the parameters of a task
@@ -300,30 +645,72 @@ class Task:
         dict
             Parameters of the task, keys are: Account, Directory, Scheduled_date, Size, State
         """
-        if self.is_valid() is False:
+        if self.valid is False:
             return None
 
-        m = re.match(r'^(sbk\w+)/download/storage_tasks/task_(\d{4}-\d{2}-\d{2})_.*_([A-Z]+)_([A-Z]+)$',
-                     self.remote_path)
-
-        if m is None:
-            return
-
         return {
-            'Account': m.group(1),
-            'Directory': self.get_directory(),
-            'Scheduled_date': m.group(2),
-            'Size': m.group(3),
-            'State': m.group(4)
+            'Account': self.account,
+            'Directory': self.directory,
+            'Scheduled_date': self.scheduled_date.isoformat(),
+            'Size': self.size,
+            'State': self.state
         }
 
-    def check_form_file(self, barcodes_from_other_tasks: Optional[list[str]] = None) -> (bool, List[str], List[str]):
+    def get_barcodes(self, copied: Optional[bool] = False, max_barcodes: Optional[int] = None) -> Optional[List[str]]:
+        """Get the barcodes of a task from the local files
+
+        Barcodes are loaded from the processing file if it exists, otherwise from the Excel form.
+
+        Parameters
+        ----------
+        copied : bool
+            If True, return the barcodes already copied according to the processing file, otherwise the barcodes
+            remaining to copy
+        max_barcodes : int
+            Maximum number of barcodes read in the Excel form, the reading is aborted if the form contains more
+
+        Returns
+        -------
+        List[str]
+            List of barcodes, None if the Excel form contains more barcodes than "max_barcodes"
+        """
+        processing_file = self.get_processing_file_path(local=True)
+
+        # Processing file of an archived task is read from the local bundle
+        if os.path.exists(processing_file) is False and os.path.isfile(self.get_bundle_path(local=True)) is True:
+            content = taskbundle.read_file(self.get_bundle_path(local=True), processing_file.split('/')[-1])
+            if content is not None:
+                processing_file = io.BytesIO(content)
+
+        if isinstance(processing_file, io.BytesIO) or os.path.exists(processing_file):
+            # Process file already exists
+            df = processingfile.read_processing_file(processing_file)
+            return df.loc[df['Copied'] == copied, 'Barcode'].tolist()
+
+        if copied is True:
+            return []
+
+        # Load from Excel file
+        with FormReader(self.get_form_path(local=True)) as form:
+            barcodes = form.read_column('Items', 'Barcode', max_values=max_barcodes)
+
+        if barcodes is None:
+            return None
+
+        return barcodecheck.normalize_barcodes(barcodes).tolist()
+
+    def check_form_file(self,
+                        barcodes_from_other_tasks: Optional[list[str]] = None,
+                        barcode_index: Optional[BarcodeIndex] = None) -> (bool, List[str], List[str]):
         """Check if an Excel file is conform to the expected format
 
         Parameters
         ----------
         barcodes_from_other_tasks : list[str]
             List of barcodes from other tasks
+        barcode_index : BarcodeIndex
+            Index of the barcodes of the other tasks, used to reject barcodes reserved by other tasks or already
+            transferred
 
         Returns
         -------
@@ -338,24 +725,26 @@ class Task:
             barcodes_from_other_tasks = []
         messages = ['*** Checking Excel form conformity ***']
 
+        # Tier 1: structure of the form, only the list of sheets and a few cells are read
         try:
-            wb = openpyxl.load_workbook(self.get_form_path(local=True))
-        except Exception as e:
+            with FormReader(self.get_form_path(local=True)) as form:
+                sheet_names = form.sheet_names
+                if sheet_names == FORM_SHEET_NAMES:
+                    version = form.get_cells('data_validation', ['D2'])['D2']
+                    general = form.get_cells('General', ['B3', 'B4', 'B5'])
+        except READ_ERRORS as e:
             error_message = f'Error reading file {self.get_form_name()}: {e}'
             logging.error(error_message)
             messages.append(error_message)
             return False, [], messages
 
-        if wb.sheetnames != ['General', 'Items', 'Locations_mapping', 'Item_policies_mapping', 'data_validation']:
+        if sheet_names != FORM_SHEET_NAMES:
             error_message = (f"Bad or missing sheet names, must be ['General', 'Items', 'Locations_mapping', "
                              f"'Item_policies_mapping', 'data_validation']")
             logging.error(error_message)
             messages.append(error_message)
             return False, [], messages
 
-        ws = wb['data_validation']
-
-        version = ws.cell(row=2, column=4).value
         if version != os.getenv('SFTP_EXCEL_FORM_VERSION'):
             error_message = f'Version {version} not supported. Must be {os.getenv("SFTP_EXCEL_FORM_VERSION")}.'
             logging.error(error_message)
@@ -364,12 +753,9 @@ class Task:
         messages.append(f'Excel file found: {self.get_form_name().split("/")[-1]}')
         messages.append(f'Version of Excel form supported: {version}')
 
-        ws = wb['General']
-
-        # iz_s = ws.cell(row=3, column=2).value
-        iz_d = ws.cell(row=4, column=2).value
+        iz_d = general['B4']
         env = {'Production': 'P',
-               'Sandbox': 'S'}.get(ws.cell(row=5, column=2).value, 'P')
+               'Sandbox': 'S'}.get(general['B5'], 'P')
 
         size = self.get_parameters()['Size']
 
@@ -379,18 +765,37 @@ class Task:
             messages.append(error_message)
             return False, [], messages
 
-        # Load barcodes
-        if os.path.exists(self.get_processing_file_path(local=True)):
-            # Process file already exists
-            df = pd.read_csv(self.get_processing_file_path(local=True), dtype=str)
-            df = df.replace('False', False)
-            df = df.replace('True', True)
-            df = df.replace('NaN', None)
-            barcodes = df.loc[~df['Copied']]['Barcode'].tolist()
+        # Tier 2: barcodes are streamed, reading is aborted if there are too many barcodes
+        max_barcodes = MAX_BARCODES_LARGE if size == 'LARGE' else MAX_BARCODES_SMALL
+        barcodes = self.get_barcodes(max_barcodes=max_barcodes)
+        if barcodes is None:
+            error_message = f'Too many barcodes (more than {max_barcodes}), maximum is {max_barcodes}.'
+            logging.error(error_message)
+            messages.append(error_message)
+            return False, [], messages
+
+        # Malformed barcodes are found before any API call
+        invalid_barcodes = barcodecheck.get_invalid_barcodes(barcodes, general['B3'])
+        if len(invalid_barcodes) > 0:
+            messages += [f'Invalid barcode "{barcode}": {reason}' for barcode, reason in invalid_barcodes.items()]
+
+            if INVALID_BARCODES_ACTION == 'reject':
+                error_message = f'{len(invalid_barcodes)} invalid barcodes in the file'
+                logging.error(error_message)
+                messages.append(error_message)
+                return False, [], messages
+
+            logging.warning(f'{len(invalid_barcodes)} invalid barcodes in the file, they will not be processed')
+            messages.append(f'{len(invalid_barcodes)} invalid barcodes flagged, they will not be processed')
+            barcodes = [barcode for barcode in barcodes if barcode not in invalid_barcodes]
+
+        if barcode_index is not None:
+            reserved_barcodes, transferred_barcodes = barcode_index.get_conflicts(barcodes,
+                                                                                  self.get_parameters()['Account'],
+                                                                                  self.get_name())
         else:
-            # Load from Excel file
-            barcodes = (pd.read_excel(self.get_form_path(local=True), sheet_name='Items', dtype=str)['Barcode']
-                        .dropna().str.strip().str.strip("'").tolist())
+            reserved_barcodes, transferred_barcodes = set(), set()
+
         if size == 'LARGE' and len(barcodes) > MAX_BARCODES_LARGE:
             error_message = f'Too many barcodes ({len(barcodes)}), maximum is {MAX_BARCODES_LARGE}.'
             logging.error(error_message)
@@ -413,6 +818,18 @@ class Task:
             messages.append(error_message)
             return False, [], messages
 
+        elif len(reserved_barcodes) > 0:
+            error_message = f'Barcodes {reserved_barcodes} already in other tasks'
+            logging.error(error_message)
+            messages.append(error_message)
+            return False, [], messages
+
+        elif len(transferred_barcodes) > 0:
+            error_message = f'Barcodes {transferred_barcodes} already transferred'
+            logging.error(error_message)
+            messages.append(error_message)
+            return False, [], messages
+
         elif len(barcodes) != len(set(barcodes)):
             seen = set()
             duplicates = set()
@@ -430,8 +847,11 @@ class Task:
 
         messages.append(f'{len(barcodes)} barcodes loaded from file.')
 
+        # Tier 3: full parsing of the mapping tables, both sheets are parsed at once in the Excel process pool
+        sheets = excelpool.read_sheets(self.get_form_path(local=True), ['Locations_mapping', 'Item_policies_mapping'])
+
         # Load locations
-        locations_table = pd.read_excel(self.get_form_path(local=True), sheet_name='Locations_mapping', dtype=str)
+        locations_table = sheets['Locations_mapping']
         if (len(locations_table) < 1 and
                 locations_table.columns != ['Source library code', 'Source location code',
                                             'Destination library code', 'Destination location code']):
@@ -441,9 +861,7 @@ class Task:
             return False, [], messages
 
         # Load item policies
-        item_policies_table = pd.read_excel(self.get_form_path(local=True),
-                                            sheet_name='Item_policies_mapping',
-                                            dtype=str)
+        item_policies_table = sheets['Item_policies_mapping']
         if (len(item_policies_table) < 1 and
                 item_policies_table.columns != ['Source item  code', 'Destination item policy code']):
             error_message = f'Error with item policies table'
@@ -461,6 +879,10 @@ class LogFile:
 
     Logs can be linked to a task if a task name is provided.
 
+    Records are written by a background listener, see :mod:`speibiutils.logqueue`. Without task, the log file
+    becomes the main log file of the process. With a task, the records of the current context are written in
+    the log file of the task until :meth:`close` is called, other contexts are not affected.
+
     Attributes
     ----------
     file_name : str
@@ -477,10 +899,11 @@ class LogFile:
 
         self.file_name = file_name
         self.task = task
+        self._token = None
         self.logger = self.config_log()
 
     def config_log(self) -> logging.Logger:
-        """Set the log configuration for the entire process
+        """Set the log configuration
 
         Returns
         -------
@@ -496,28 +919,30 @@ class LogFile:
         if os.path.isdir(log_path) is False:
             os.mkdir(log_path)
 
-        message_format = "%(asctime)s - %(levelname)s - %(message)s"
-        log_file = logging.FileHandler(f'{log_path}/log{"" if len(self.file_name) == 0 else "_"}{self.file_name}.txt')
-
-        # log_file.setFormatter(logging.Formatter(message_format))
-        #
-        # logger = logging.getLogger()  # root logger
-        # logger.setLevel(logging.INFO)
-        # for hdlr in logger.handlers[:]:  # remove all old handlers
-        #     logger.removeHandler(hdlr)
-        logging.basicConfig(format=message_format,
-                            level=logging.INFO,
-                            handlers=[log_file,
-                                      logging.StreamHandler(sys.stdout)],
-                            force=True)
-        # logger.addHandler(log_file)
-        # logger.addHandler(logging.StreamHandler(sys.stdout))
+        log_file = f'{log_path}/log{"" if len(self.file_name) == 0 else "_"}{self.file_name}.txt'
+
+        if self.task is not None:
+            self._token = logqueue.open_task_log(self.task.get_name(), log_file)
+        else:
+            logqueue.set_main_log(log_file)
+
         return logging.getLogger()
 
+    def close(self) -> None:
+        """Stop writing the records of the current context in the log file of the task
+
+        Returns
+        -------
+        None
+        """
+        if self._token is not None:
+            logqueue.close_task_log(self._token)
+            self._token = None
+
     @staticmethod
     def close_log() -> None:
-        """Close the log file"""
-        logging.shutdown()
+        """Write the pending records in the log files"""
+        logqueue.flush()
 
 
 class TaskSummary:
@@ -542,18 +967,47 @@ class TaskSummary:
         """
         if os.path.exists('data/task_summary.xlsx') is False:
             logging.error('No task summary found')
-            columns = ['Account', 'Directory', 'Check_time', 'Start_time', 'End_time',
-                       'Scheduled_date', 'Size', 'State', 'Message']
-            self.tasks = pd.DataFrame(columns=columns)
+            self.tasks = pd.DataFrame(columns=TASK_SUMMARY_COLUMNS)
         else:
-            self.tasks = pd.read_excel('data/task_summary.xlsx', dtype=str).fillna('')
+            self.tasks = self.load_tasks('data/task_summary.xlsx')
+
+            # Task summaries created before the admission control have no "Barcodes" and "Source_IZ" columns
+            for column in TASK_SUMMARY_COLUMNS:
+                if column not in self.tasks.columns:
+                    self.tasks[column] = ''
+
+    @staticmethod
+    def load_tasks(path: str) -> pd.DataFrame:
+        """Load the task list from the Excel file
+
+        The file is parsed again only if it was modified since the last loading.
+
+        Parameters
+        ----------
+        path : str
+            Path of the task summary
+
+        Returns
+        -------
+        pd.DataFrame
+            Task list
+        """
+        global _task_summary_cache
+
+        file_stat = os.stat(path)
+        key = (path, file_stat.st_mtime_ns, file_stat.st_size)
+        if _task_summary_cache is None or _task_summary_cache[0] != key:
+            _task_summary_cache = (key, excelpool.read_sheets(path, [0])[0].fillna(''))
+
+        return _task_summary_cache[1].copy()
 
     @sftp_connect
     def update_task_state(self,
                           task: Task,
                           new_state: str,
                           sftp: sftpmodule.SFTP,
-                          parameters: Optional[dict] = None) -> Optional[Task]:
+                          parameters: Optional[dict] = None,
+                          save: Optional[bool] = True) -> Optional[Task]:
         """Update the state of a task
 
         This method will update the state of a task and copy the task to the new state directory. It will also
@@ -569,6 +1023,8 @@ class TaskSummary:
             SFTP connection
         parameters : dict
             Parameters to update, keys are: Account, Directory, Scheduled_date, Size, State
+        save : bool
+            If False, the task summary is not saved, useful to update several tasks at once
 
         Returns
         -------
@@ -626,10 +1082,109 @@ class TaskSummary:
             self.tasks.loc[self.tasks['Directory'] == task.get_directory(), 'Directory'] = new_task.get_directory()
             logging.info(f'{task.get_directory()} updated in the task summary')
 
+        self.update_barcode_index(new_task)
+
         logging.info(f'Task {task.get_directory()} updated to state {new_state}')
-        self.save()
+        if save is True:
+            self.save(sftp=sftp)
         return new_task
 
+    @sftp_connect
+    def update_tasks_state(self, transitions: List[tuple], sftp: sftpmodule.SFTP) -> List[Optional[Task]]:
+        """Update the state of several tasks with one connection and one save of the task summary
+
+        Parameters
+        ----------
+        transitions : List[tuple]
+            Tuples (task, new state, parameters), see :meth:`update_task_state`
+        sftp : sftpmodule.SFTP
+            SFTP connection
+
+        Returns
+        -------
+        List[Optional[Task]]
+            Updated tasks
+        """
+        new_tasks = [self.update_task_state(task, new_state, sftp=sftp, parameters=parameters, save=False)
+                     for task, new_state, parameters in transitions]
+
+        if len(transitions) > 0:
+            self.save(sftp=sftp)
+
+        return new_tasks
+
+    def update_barcode_index(self, task: Task) -> None:
+        """Update the barcode index with the state of a task
+
+        Barcodes of tasks in ERROR state are released. Only the copied barcodes of DONE tasks are kept.
+
+        Parameters
+        ----------
+        task : Task
+            Task with the new state
+
+        Returns
+        -------
+        None
+        """
+        task_parameters = task.get_parameters()
+        barcode_index = self.get_barcode_index()
+
+        if task_parameters['State'] == 'ERROR':
+            barcode_index.release_task(task_parameters['Account'], task.get_name())
+        elif task_parameters['State'] == 'DONE':
+            barcode_index.set_task_barcodes(task_parameters['Account'], task.get_name(),
+                                            task.get_barcodes(copied=True), 'DONE')
+        else:
+            barcode_index.update_task_state(task_parameters['Account'], task.get_name(), task_parameters['State'])
+
+        barcode_index.close()
+
+    def get_barcode_index(self, db_path: Optional[str] = BARCODE_INDEX_PATH) -> BarcodeIndex:
+        """Open the barcode index, it is built from the task summary when the database is created
+
+        Parameters
+        ----------
+        db_path : str
+            Path of the sqlite database
+
+        Returns
+        -------
+        BarcodeIndex
+            Barcode index to close after use
+        """
+        barcode_index = BarcodeIndex(db_path)
+        if barcode_index.created is True:
+            logging.info(f'Barcode index {db_path} created => filled with the tasks of the task summary')
+            self.build_barcode_index(barcode_index)
+
+        return barcode_index
+
+    def build_barcode_index(self, barcode_index: BarcodeIndex) -> None:
+        """Fill the barcode index with the tasks of the task summary
+
+        Useful when the index is created while tasks already exist. Only tasks with local files are added.
+
+        Parameters
+        ----------
+        barcode_index : BarcodeIndex
+            Barcode index to fill
+
+        Returns
+        -------
+        None
+        """
+        entries = self.tasks.loc[self.tasks['State'].isin(['READY', 'PROCESSING', 'DONE']),
+                                 ['Account', 'Directory', 'State']].values
+
+        for account, directory, state in entries:
+            task = Task(directory=directory, account=account)
+            if task.is_valid() is False or (os.path.isfile(task.get_form_path(local=True)) is False
+                                            and os.path.isfile(task.get_bundle_path(local=True)) is False):
+                continue
+            barcode_index.set_task_barcodes(account, task.get_name(),
+                                            task.get_barcodes(copied=state == 'DONE'), state)
+
     @staticmethod
     def update_task_name_state(task_directory: str, new_state: str) -> Optional[str]:
         """Update the state of a task name
@@ -661,13 +1216,109 @@ class TaskSummary:
 
         return self.tasks['Directory'].tolist()
 
-    def is_task_date_available(self, task: Task) -> (bool, str):
-        """Check if a task date is available
+    def get_items_per_hour(self, source_iz: Optional[str] = None) -> float:
+        """Get the number of items processed per hour, measured with the last DONE tasks
+
+        The last THROUGHPUT_HISTORY_TASKS DONE tasks of the source IZ are used. Without DONE task of the source
+        IZ, the DONE tasks of all the IZ are used.
+
+        Parameters
+        ----------
+        source_iz : str
+            Source IZ of the tasks
+
+        Returns
+        -------
+        float
+            Number of items per hour, DEFAULT_ITEMS_PER_HOUR of the configuration if no DONE task is available
+        """
+        done_tasks = self.tasks.loc[self.tasks['State'] == 'DONE', ['End_time', 'Source_IZ']]
+        done_tasks = done_tasks.assign(
+            Hours=(pd.to_datetime(self.tasks['End_time'], errors='coerce') -
+                   pd.to_datetime(self.tasks['Start_time'], errors='coerce')).dt.total_seconds() / 3600,
+            Barcodes=pd.to_numeric(self.tasks['Barcodes'], errors='coerce'))
+
+        # Tasks without start time, end time or number of barcodes are ignored
+        done_tasks = done_tasks.loc[(done_tasks['Hours'] > 0) & (done_tasks['Barcodes'] > 0)]
+        if source_iz is not None and (done_tasks['Source_IZ'] == source_iz).any():
+            done_tasks = done_tasks.loc[done_tasks['Source_IZ'] == source_iz]
+
+        if len(done_tasks) == 0:
+            return DEFAULT_ITEMS_PER_HOUR
+
+        done_tasks = done_tasks.sort_values('End_time').tail(THROUGHPUT_HISTORY_TASKS)
+
+        return done_tasks['Barcodes'].sum() / done_tasks['Hours'].sum()
+
+    def get_predicted_hours(self, nb_barcodes: int, source_iz: Optional[str] = None) -> float:
+        """Predict the duration of a task
+
+        Parameters
+        ----------
+        nb_barcodes : int
+            Number of barcodes of the task
+        source_iz : str
+            Source IZ of the task
+
+        Returns
+        -------
+        float
+            Predicted duration in hours, see :meth:`get_items_per_hour`
+        """
+        return nb_barcodes / self.get_items_per_hour(source_iz)
+
+    def get_scheduled_hours(self, scheduled_date: str, size: str) -> float:
+        """Get the predicted duration of the READY and PROCESSING tasks of a date and size
+
+        Parameters
+        ----------
+        scheduled_date : str
+            Scheduled date of the tasks in ISO format
+        size : str
+            Size of the tasks
+
+        Returns
+        -------
+        float
+            Sum of the predicted durations in hours, tasks without number of barcodes are ignored
+        """
+        tasks = self.tasks.loc[(self.tasks['Scheduled_date'] == scheduled_date) &
+                               (self.tasks['Size'] == size) &
+                               (self.tasks['State'].isin(['READY', 'PROCESSING'])),
+                               ['Barcodes', 'Source_IZ']]
+
+        return sum(self.get_predicted_hours(nb_barcodes, source_iz)
+                   for nb_barcodes, source_iz in zip(pd.to_numeric(tasks['Barcodes'], errors='coerce'),
+                                                     tasks['Source_IZ'])
+                   if pd.isnull(nb_barcodes) is False)
+
+    def is_task_date_available(self,
+                               task: Task,
+                               nb_barcodes: Optional[int] = None,
+                               source_iz: Optional[str] = None,
+                               scheduled_hours: Optional[float] = None,
+                               now: Optional[datetime] = None) -> (bool, str):
+        """Check if a task fits in the processing window of its date
+
+        The durations of the tasks are predicted with their number of barcodes and the items processed per hour
+        from their source IZ, see :meth:`get_items_per_hour`. The tasks of one date and size must fit in the
+        processing window of the size, see PROCESSING_WINDOW_HOURS of the configuration. Tasks of today only get
+        the remaining part of the window, they are rejected once it is over. Without the number of barcodes, only
+        the end of the window of today is checked.
 
         Parameters
         ----------
         task : Task
             Task object
+        nb_barcodes : int
+            Number of barcodes of the task, None if the form has not been checked yet
+        source_iz : str
+            Source IZ of the task
+        scheduled_hours : float
+            Predicted duration of the tasks already scheduled on the same date with the same size, including the
+            tasks admitted before in the same check, computed from the READY and PROCESSING tasks if None
+        now : datetime
+            Current time, default is now
 
         Returns
         -------
@@ -676,23 +1327,30 @@ class TaskSummary:
         str
             Error message if the task date is not available
         """
+        if now is None:
+            now = datetime.now()
+
         task_parameters = task.get_parameters()
-        existing_tasks = self.tasks.loc[((self.tasks['Scheduled_date'] == task_parameters['Scheduled_date'])
-                                         & (self.tasks["Size"] == task_parameters['Size']) &
-                                         (self.tasks['State'].isin(['NEW', 'READY', 'PROCESSING'])))]
-
-        if task_parameters['Size'] == 'LARGE':
-            if len(existing_tasks) >= 1:
-                return False, 'A large task is already scheduled for this date'
-            if date.today().isoformat() == task_parameters['Scheduled_date'] and datetime.now().hour > LARGE_TASK_HOUR:
-                return False, 'Large tasks must be scheduled before 18:00 if the date is today'
-
-        elif task_parameters['Size'] == 'SMALL':
-            if len(existing_tasks) > 3:
-                return False, 'Too many small tasks are already scheduled for this date'
-            if (date.today().isoformat() == task_parameters['Scheduled_date']
-                    and datetime.now().hour + len(existing_tasks) > LARGE_TASK_HOUR-1):
-                return False, 'Too many small tasks are already scheduled for this date'
+        size = task_parameters['Size']
+        start_hour, end_hour = PROCESSING_WINDOW_HOURS[size]
+
+        window_hours = (end_hour - start_hour) % 24 or 24
+        if now.date().isoformat() == task_parameters['Scheduled_date']:
+            window_hours = get_remaining_window_hours(size, now)
+            if window_hours == 0:
+                return False, f'Processing window of {size.lower()} tasks of today is over ({end_hour}:00)'
+
+        if nb_barcodes is None:
+            return True, None
+
+        if scheduled_hours is None:
+            scheduled_hours = self.get_scheduled_hours(task_parameters['Scheduled_date'], size)
+
+        predicted_hours = self.get_predicted_hours(nb_barcodes, source_iz)
+        if scheduled_hours + predicted_hours > window_hours:
+            return False, (f'Not enough time for {nb_barcodes} barcodes on {task_parameters["Scheduled_date"]}: '
+                           f'{predicted_hours:.1f} h predicted, {max(window_hours - scheduled_hours, 0):.1f} h '
+                           f'available in the processing window of {size.lower()} tasks')
 
         return True, None
 
@@ -710,16 +1368,16 @@ class TaskSummary:
         Returns
         -------
         None"""
-        self.tasks.to_excel('./data/task_summary.xlsx', index=False)
-        for directory in SBK_DIR:
-            sftp.put('./data/task_summary.xlsx',
-                     f'./{directory}/download/storage_tasks/task_summary.xlsx')
+        excelpool.write_excel(self.tasks, './data/task_summary.xlsx')
+        sftp.put_many([('./data/task_summary.xlsx', f'./{directory}/download/storage_tasks/task_summary.xlsx')
+                       for directory in SBK_DIR])
 
     @staticmethod
     def clean_local_directories() -> None:
         """Clean the local directories
 
-        Remove outdated directories
+        Remove outdated directories and bundles. DONE task directories older than ARCHIVE_AFTER_DAYS are packed
+        in bundles, directories unpacked from bundles are packed again to keep their new files.
 
         Returns
         -------
@@ -740,96 +1398,217 @@ class TaskSummary:
 
             for directory in os.listdir(f'./data/{account}/download/storage_tasks'):
                 temp_task = Task(directory=directory, account=account)
-                if (date.today() - temp_task.get_scheduled_date()).days > MAX_DAYS_RETENTION:
-                    shutil.rmtree(temp_task.get_directory_path(local=True))
+                if temp_task.is_valid() is False:
+                    continue
+
+                age = (date.today() - temp_task.get_scheduled_date()).days
+                if age > MAX_DAYS_RETENTION:
+                    if temp_task.archived is True:
+                        os.remove(temp_task.get_bundle_path(local=True))
+                    else:
+                        shutil.rmtree(temp_task.get_directory_path(local=True))
                     logging.warning(f'Local directory {temp_task.get_directory_path(local=True)}'
                                     f'{directory} too old => removing it')
 
-    @sftp_connect
-    def clean_remote_directories(self, sftp: sftpmodule.SFTP) -> None:
-        """Clean the directories
+                elif temp_task.archived is False and temp_task.state == 'DONE' and age > ARCHIVE_AFTER_DAYS:
+                    taskbundle.pack(temp_task.get_directory_path(local=True))
+                    shutil.rmtree(temp_task.get_directory_path(local=True))
+                    logging.info(f'Local directory {temp_task.get_directory_path(local=True)} archived')
+
+    def get_reconciliation_actions(self, remote_paths: List[str]) -> List[tuple]:
+        """Compare the remote directories with the task summary
+
+        The task summary is indexed once by directory and by task name, remote directories are then checked
+        in one pass. Tasks in ERROR state can be overwritten and do not reserve their name.
 
         Parameters
         ----------
-        sftp : sftpmodule.SFTP
-            SFTP connection
+        remote_paths : List[str]
+            Remote paths of the tasks, see :class:`RemoteLocation`
 
         Returns
         -------
-        None
+        List[tuple]
+            Actions in the order they must be applied:
+            - ("remove", remote path, message): remote directory to delete
+            - ("expire", remote path, message): outdated remote directory to delete
+            - ("drop", directory, None): task no more available remotely to remove from the task summary
+            - ("error", task, message): task to move to ERROR state
+            - ("add", task, None): new task to add to the task summary
         """
-        remote = RemoteLocation()
-        self.tasks = self.tasks.loc[self.tasks['Directory'].isin(remote.directories)]
+        actions = []
+        known_directories = set(self.tasks['Directory'].values)
+
+        # Bundles of archived tasks have the directory of the task
+        remote_directories = {remote_path.split('/')[-1].removesuffix(taskbundle.BUNDLE_SUFFIX)
+                              for remote_path in remote_paths}
+
+        # Tasks no more available remotely are removed from the summary
+        for directory in known_directories - remote_directories:
+            actions.append(('drop', directory, None))
+
+        # Index of the summary: owner directory of each task name
+        name_owners = {}
+        for directory, state in self.tasks.loc[self.tasks['Directory'].isin(remote_directories),
+                                               ['Directory', 'State']].values:
+            if state == 'ERROR':
+                continue
+            name_owners['_'.join(directory.split('_')[:-1])] = directory
 
-        # 1st run to clean outdated tasks, bad naming, duplicate
-        for entry_path in remote.paths:
+        for remote_path in remote_paths:
 
-            task = Task(entry_path)
+            task = Task(remote_path)
 
             # Delete tasks with bad name
             if task.is_valid() is False:
-                logging.error(f'{task.get_directory()} is not a valid task name => removing it')
-                sftp.rmtree(entry_path)
+                actions.append(('remove', remote_path, f'{remote_path} is not a valid task name => removing it'))
                 continue
 
             # Remove old remote entries
             if (date.today() - task.get_scheduled_date()).days > MAX_DAYS_RETENTION:
-                logging.warning(f'{task.get_directory()} is too old => removing it')
-                sftp.rmtree(entry_path)
+                actions.append(('expire', remote_path, f'{task.get_directory()} is too old => removing it'))
                 continue
 
+            task_parameters = task.get_parameters()
+
             # No same task name is allowed, task in ERROR state can be overwritten and are ignored
-            if (task.get_name() in
-                    self.tasks.loc[self.tasks['State'] != 'ERROR']['Directory'].apply(task.get_name_from_dir).values):
-                logging.error(f'{task.get_directory()}: workflow broken, same task name already exists')
-                sftp.rmtree(entry_path)
+            # ERROR tasks are only removed for names owned in the summary, the result doesn't depend on the order
+            owner = name_owners.get(task.get_name())
+            if task_parameters['State'] == 'ERROR' and owner not in known_directories:
+                owner = None
+
+            if owner is not None and owner != task.get_directory():
+                actions.append(('remove', remote_path,
+                                f'{task.get_directory()}: workflow broken, same task name already exists'))
                 continue
 
-        self.save()
+            # No need to check the task if it is already in the task summary
+            if task.get_directory() in known_directories:
+                continue
 
-        # 2nd run to update the task summary
+            # Tasks in ERROR state are only registered
+            if task_parameters['State'] == 'ERROR':
+                actions.append(('add', task, None))
+                continue
+
+            # Only new tasks can be added to the task summary
+            if task_parameters['State'] != 'NEW':
+                actions.append(('error', task, f'{task.get_directory()}: workflow broken, new tasks must have '
+                                               f'"NEW" state and not "{task_parameters["State"]}"'))
+                continue
+
+            # Check if the task date is available, the duration of the task is checked with its form
+            date_validity, error_message = self.is_task_date_available(task)
+            if date_validity is False:
+                actions.append(('error', task, error_message))
+                continue
+
+            name_owners[task.get_name()] = task.get_directory()
+            actions.append(('add', task, None))
+
+        return actions
+
+    @sftp_connect
+    def clean_remote_directories(self, sftp: sftpmodule.SFTP) -> None:
+        """Clean the directories
+
+        The remote directories are listed once and compared with the task summary, see
+        :meth:`get_reconciliation_actions`. Then only the required changes are applied.
+
+        Parameters
+        ----------
+        sftp : sftpmodule.SFTP
+            SFTP connection
+
+        Returns
+        -------
+        None
+        """
         remote = RemoteLocation()
+        actions = self.get_reconciliation_actions(remote.paths)
+
+        dropped_directories = []
+        new_rows = []
+        transitions = []
+        for action, target, message in actions:
+            if action in ['remove', 'expire']:
+                if action == 'remove':
+                    logging.error(message)
+                else:
+                    logging.warning(message)
+                sftp.rmtree(target)
+                dropped_directories.append(target.split('/')[-1].removesuffix(taskbundle.BUNDLE_SUFFIX))
 
-        self.tasks = self.tasks.loc[self.tasks['Directory'].isin(remote.directories)]
+            elif action == 'drop':
+                dropped_directories.append(target)
 
-        for entry_path in remote.paths:
+            elif action == 'error':
+                logging.error(message)
+                transitions.append((target, 'ERROR', {'Message': message}))
 
-            task = Task(entry_path)
+            elif action == 'add':
+                new_rows.append(target.get_parameters())
+                logging.info(f'{target.get_directory()}: New task found and added to the task summary')
 
-            # No need to check the task if it is already in the task summary
-            if task.get_directory() in self.get_directories():
-                continue
+        self.tasks = self.tasks.loc[~self.tasks['Directory'].isin(dropped_directories)].reset_index(drop=True)
+        if len(new_rows) > 0:
+            self.tasks = pd.concat([self.tasks, pd.DataFrame(new_rows, columns=self.tasks.columns).fillna('')],
+                                   ignore_index=True)
 
-            task_parameters = task.get_parameters()
+        if len(transitions) > 0:
+            self.update_tasks_state(transitions, sftp=sftp)
+        elif len(actions) > 0:
+            self.save(sftp=sftp)
 
-            # Only new tasks can be added to the task summary
-            if task_parameters['State'] not in ['NEW', 'ERROR']:
-                error_message = (f'{task.get_directory()}: workflow broken, new tasks must have '
-                                 f'"NEW" state and not "{task_parameters["State"]}"')
-                logging.error(error_message)
-                self.update_task_state(task, new_state='ERROR', parameters={'Message': error_message})
+    @sftp_connect
+    def archive_done_tasks(self, sftp: sftpmodule.SFTP, dry_run: Optional[bool] = False) -> List[Task]:
+        """Pack the DONE tasks older than ARCHIVE_AFTER_DAYS in bundles, see :meth:`Task.archive`
+
+        Remote directories, retention cleanup and restarts then handle one file per archived task.
+
+        Parameters
+        ----------
+        sftp : sftpmodule.SFTP
+            SFTP connection
+        dry_run : bool
+            If True, the tasks to archive are only logged
+
+        Returns
+        -------
+        List[Task]
+            Archived tasks
+        """
+        archived_tasks = []
+        for remote_path in RemoteLocation().paths:
+            task = Task(remote_path)
+            if task.is_valid() is False or task.archived is True or task.state != 'DONE':
                 continue
 
-            # Check if the task date is available
-            date_validity, error_message = self.is_task_date_available(task)
-            if date_validity is False:
-                logging.error(error_message)
-                self.update_task_state(task, new_state='ERROR', parameters={'Message': error_message})
+            age = (date.today() - task.get_scheduled_date()).days
+            if age <= ARCHIVE_AFTER_DAYS or age > MAX_DAYS_RETENTION:
+                continue
+
+            if dry_run is True:
+                logging.info(f'Dry run: {task.get_directory()} would be archived')
                 continue
 
-            self.tasks.loc[task.get_directory()] = task_parameters
-            logging.info(f'{task.get_directory()}: New task found and added to the task summary')
+            archived_tasks.append(task.archive(sftp=sftp))
 
-        self.save()
+        return archived_tasks
 
     @sftp_connect
-    def check_forms_conformity(self, sftp: sftpmodule.SFTP) -> None:
+    def check_forms_conformity(self, sftp: sftpmodule.SFTP, concurrency: Optional[int] = None) -> None:
         """Check if the forms are conform
 
+        A form whose check fails, for example after a connection error, stays in "NEW" state and is checked
+        again next time, the other forms are still handled.
+
         Parameters
         ----------
         sftp : sftpmodule.SFTP
             SFTP connection
+        concurrency : int
+            Number of forms downloaded and checked in parallel, default is CHECK_FORMS_CONCURRENCY
 
         Returns
         -------
@@ -842,36 +1621,227 @@ class TaskSummary:
             logging.warning('No task found with state "NEW" existing in the task summary')
             return
 
-        barcodes_from_other_tasks = []
-        for account, directory in entries:
-            task = Task(directory=directory, account=account)
-
-            if sftp.is_file(task.get_form_path()) is False:
-                error_message = f'Missing file {task.get_form_name()}'
-                logging.error(error_message)
-                self.update_task_state(task, new_state='ERROR',
-                                       parameters={'Message': error_message})
+        barcode_index = self.get_barcode_index()
+
+        # Barcodes of removed tasks are not reserved anymore, barcodes of old DONE tasks can be transferred again
+        active_entries = self.tasks.loc[self.tasks['State'].isin(['NEW', 'READY', 'PROCESSING']),
+                                        ['Account', 'Directory']].values
+        barcode_index.prune([(account, Task(directory=directory, account=account).get_name())
+                             for account, directory in active_entries])
+        barcode_index.expire(BARCODE_INDEX_DONE_DAYS)
+
+        def check_form(task: Task) -> Optional[tuple]:
+            """Check a form, None if the check failed"""
+            try:
+                return self.check_remote_form(task)
+            except Exception as e:
+                logging.error(f'{task.get_directory()}: form not checked, it stays "NEW" until the next check: '
+                              f'{repr(e)}')
+                return None
+
+        # Forms are downloaded and checked in parallel, an error in one form doesn't stop the others
+        tasks = [Task(directory=directory, account=account) for account, directory in entries]
+        with ThreadPoolExecutor(max_workers=concurrency or CHECK_FORMS_CONCURRENCY) as executor:
+            results = list(executor.map(check_form, tasks))
+
+        # Barcodes of other tasks and processing windows are checked in the order of the task summary
+        transitions = []
+        barcodes_from_other_tasks = {}
+        scheduled_hours = {}
+        check_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for task, result in zip(tasks, results):
+            if result is None:
                 continue
 
-            sftp.copy_to_local(task.get_directory_path(), task.get_directory_path(local=True))
-            logging.info(f'{directory} copied to local server')
+            is_available, is_conform, barcodes, messages = result
+            if is_available is False:
+                transitions.append((task, 'ERROR', {'Message': messages[-1]}))
+                continue
 
-            is_conform, barcodes, messages = task.check_form_file(barcodes_from_other_tasks)
+            account = task.get_parameters()['Account']
+
+            if is_conform is True:
+                reserved_barcodes, transferred_barcodes = barcode_index.get_conflicts(barcodes, account,
+                                                                                      task.get_name())
+                reserved_barcodes |= {barcode for barcode in barcodes if barcode in barcodes_from_other_tasks}
+
+                if len(reserved_barcodes) > 0:
+                    messages.append(f'Barcodes {reserved_barcodes} already in other tasks')
+                    is_conform = False
+                elif len(transferred_barcodes) > 0:
+                    messages.append(f'Barcodes {transferred_barcodes} already transferred')
+                    is_conform = False
+
+                if is_conform is False:
+                    logging.error(messages[-1])
+
+            # Tasks must fit in the processing window of their date
+            if is_conform is True:
+                source_iz = task.get_source_iz()
+                key = (task.get_parameters()['Scheduled_date'], task.get_parameters()['Size'])
+                if key not in scheduled_hours:
+                    scheduled_hours[key] = self.get_scheduled_hours(*key)
+
+                date_validity, error_message = self.is_task_date_available(task, len(barcodes), source_iz,
+                                                                           scheduled_hours[key])
+                if date_validity is False:
+                    logging.error(f'{task.get_directory()}: {error_message}')
+                    messages.append(error_message)
+                    is_conform = False
+                else:
+                    # Tasks admitted in this check are not READY yet, they are counted for the next forms
+                    scheduled_hours[key] += self.get_predicted_hours(len(barcodes), source_iz)
 
-            barcodes_from_other_tasks += barcodes
             with open(f'{task.get_directory_path(local=True)}/form_check_result.txt', 'w') as f:
                 f.write('\n'.join(messages))
 
             if is_conform is False:
-                self.update_task_state(task,
-                                       new_state='ERROR',
-                                       parameters={'Message': f'{directory}: invalid form',
-                                                   'Check_time': f'{datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'})
+                transitions.append((task, 'ERROR', {'Message': f'{task.get_directory()}: invalid form',
+                                                    'Check_time': check_time}))
 
             else:
-                self.update_task_state(task,
-                                       new_state='READY',
-                                       parameters={'Check_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+                for barcode in barcodes:
+                    barcodes_from_other_tasks[barcode] = task.get_name()
+                barcode_index.set_task_barcodes(account, task.get_name(), barcodes, 'READY')
+                transitions.append((task, 'READY', {'Check_time': check_time,
+                                                    'Barcodes': len(barcodes),
+                                                    'Source_IZ': source_iz}))
+
+        barcode_index.close()
+
+        # State transitions are applied in one batch
+        self.update_tasks_state(transitions, sftp=sftp)
+
+    @staticmethod
+    @sftp_connect
+    def check_remote_form(task: Task, sftp: sftpmodule.SFTP) -> (bool, bool, List[str], List[str]):
+        """Download a task and check its form
+
+        Barcodes of other tasks are not checked, see :meth:`check_forms_conformity`.
+
+        Parameters
+        ----------
+        task : Task
+            Task to check
+        sftp : sftpmodule.SFTP
+            SFTP connection
+
+        Returns
+        -------
+        bool
+            False if the form is missing on the remote server
+        bool
+            True if the form is conform
+        List[str]
+            Barcodes of the form if conform
+        List[str]
+            List of messages
+        """
+        if sftp.is_file(task.get_form_path()) is False:
+            error_message = f'Missing file {task.get_form_name()}'
+            logging.error(error_message)
+            return False, False, [], [error_message]
+
+        sftp.copy_to_local(task.get_directory_path(), task.get_directory_path(local=True))
+        logging.info(f'{task.get_directory()} copied to local server')
+
+        is_conform, barcodes, messages = task.check_form_file()
+
+        return True, is_conform, barcodes, messages
+
+    @sftp_connect
+    def schedule_continuation(self, task: Task, sftp: sftpmodule.SFTP) -> Optional[str]:
+        """Schedule a SMALL task for the barcodes of a DONE task with transient errors
+
+        A RESTART form is uploaded like the forms of the libraries, the next :func:`workflow.discover` turns
+        the DONE task into a new SMALL task, see :meth:`NewTask.restart_task`. The first date from today with
+        enough time in the processing window of the small tasks is used. A task has at most MAX_CONTINUATIONS
+        successive continuations.
+
+        Parameters
+        ----------
+        task : Task
+            DONE task
+        sftp : sftpmodule.SFTP
+            SFTP connection
+
+        Returns
+        -------
+        Optional[str]
+            Remote path of the RESTART form, None if no continuation is scheduled
+        """
+        if os.path.isfile(task.get_processing_file_path(local=True)) is False:
+            return None
+
+        df = processingfile.read_processing_file(task.get_processing_file_path(local=True))
+        nb_transient = processingfile.get_transient_rows(df).sum()
+        if nb_transient == 0:
+            return None
+
+        # All the barcodes not copied are handled again by the continuation
+        nb_barcodes = (~df['Copied']).sum()
+        if nb_barcodes > MAX_BARCODES_SMALL:
+            logging.warning(f'{task.get_name()}: {nb_transient} barcodes with transient errors, but {nb_barcodes} '
+                            f'barcodes not copied, more than a small task => RESTART form required')
+            return None
+
+        continuation_file = f'{task.get_directory_path(local=True)}/{CONTINUATION_FILE_NAME}'
+        nb_continuations = 0
+        if os.path.isfile(continuation_file) is True:
+            with open(continuation_file) as f:
+                nb_continuations = int(f.read().strip() or 0)
+
+        if nb_continuations >= MAX_CONTINUATIONS:
+            logging.warning(f'{task.get_name()}: {nb_transient} barcodes with transient errors after '
+                            f'{nb_continuations} continuations => RESTART form required')
+            return None
+
+        source_iz = task.get_source_iz()
+        task_label = task.get_name()[len(f'task_{task.scheduled_date.isoformat()}'):-len(f'_{task.size}')]
+        for days in range(CONTINUATION_SEARCH_DAYS):
+            new_date = (date.today() + timedelta(days=days)).isoformat()
+            continuation = Task(directory=f'task_{new_date}{task_label}_SMALL_NEW', account=task.account)
+            if self.get_task(continuation.get_name()) is not None:
+                continue
+
+            if self.is_task_date_available(continuation, nb_barcodes, source_iz)[0] is True:
+                form_path = (f'{task.account}/upload/storage_tasks/task_{task.scheduled_date.isoformat()}_'
+                             f'{new_date}{task_label}_{task.size}_RESTART.xlsx')
+                # The counter is moved with the files of the task to the continuation
+                with open(continuation_file, 'w') as f:
+                    f.write(str(nb_continuations + 1))
+                sftp.put(continuation_file, f'{task.get_directory_path()}/{CONTINUATION_FILE_NAME}')
+
+                sftp.put(task.get_form_path(local=True), form_path)
+                logging.info(f'{task.get_name()}: {nb_transient} barcodes with transient errors => continuation '
+                             f'{continuation.get_name()} scheduled')
+                return form_path
+
+        logging.warning(f'{task.get_name()}: no date available for a continuation in the next '
+                        f'{CONTINUATION_SEARCH_DAYS} days => RESTART form required')
+        return None
+
+    def get_task(self, name: str) -> Optional[Task]:
+        """Get a task of the task summary by name or by directory
+
+        Tasks in ERROR state are only returned if no other task has this name.
+
+        Parameters
+        ----------
+        name : str
+            Name of the task, for example "task_2041-01-01_UBS_LARGE", or directory with state
+
+        Returns
+        -------
+        Optional[Task]
+            Task, None if not in the task summary
+        """
+        tasks = [Task(directory=directory, account=account)
+                 for account, directory in self.tasks[['Account', 'Directory']].values]
+        tasks = sorted([task for task in tasks if name in [task.get_name(), task.get_directory()]],
+                       key=lambda task: task.state == 'ERROR')
+
+        return tasks[0] if len(tasks) > 0 else None
 
     def get_processing_task(self) -> Optional[Task]:
         """Check if a processing task exists
@@ -888,6 +1858,51 @@ class TaskSummary:
 
         return Task(account=processing_task["Account"], directory=processing_task["Directory"])
 
+    @staticmethod
+    def read_rows(columns: List[str], path: Optional[str] = 'data/task_summary.xlsx') -> List[dict]:
+        """Read some columns of the task summary file without pandas
+
+        Parameters
+        ----------
+        columns : List[str]
+            Columns to read
+        path : str
+            Path of the task summary
+
+        Returns
+        -------
+        List[dict]
+            One dict per task, keys are the columns, values None for empty cells
+        """
+        if os.path.exists(path) is False:
+            return []
+
+        with FormReader(path) as summary:
+            return summary.read_rows(summary.sheet_names[0], columns)
+
+    @staticmethod
+    def has_pending_tasks(size: str, path: Optional[str] = 'data/task_summary.xlsx') -> bool:
+        """Check if the task summary has tasks to check or to process
+
+        The file is read with a streaming reader, pandas is not required.
+
+        Parameters
+        ----------
+        size : str
+            Size of the tasks to process
+        path : str
+            Path of the task summary
+
+        Returns
+        -------
+        bool
+            True if a task is new, processing or ready to be processed today
+        """
+        return any(row['State'] in ['NEW', 'PROCESSING']
+                   or (row['State'] == 'READY' and row['Size'] == size
+                       and row['Scheduled_date'] == date.today().isoformat())
+                   for row in TaskSummary.read_rows(['Scheduled_date', 'Size', 'State'], path))
+
     @sftp_connect
     def get_next_task(self, size: str, sftp: sftpmodule.SFTP) -> Optional[Task]:
         """Get the next task to process
@@ -1027,12 +2042,20 @@ class NewTask:
             if directory in [self.get_task_name(state='NEW'), self.get_task_name(state='READY')]:
                 sftp.rmtree(f'{self.get_directory()}/download/storage_tasks/{directory}')
                 sftp.remove(self.form_path)
+
+                # Without database, the index is built later from the task summary without this task
+                if os.path.isfile(BARCODE_INDEX_PATH) is True:
+                    barcode_index = BarcodeIndex()
+                    barcode_index.release_task(self.get_directory(), self.get_task_name())
+                    barcode_index.close()
                 logging.info(f'{self.get_task_name()} deleted')
                 return
 
     @sftp_connect
     def restart_task(self, sftp: sftpmodule.SFTP) -> None:
         """Restart a task
+
+        The DONE task, directory or bundle of an archived task, becomes a new SMALL task with the new date.
         """
         m = re.match(r'^sbk\w+/upload/storage_tasks/task_(\d{4}-\d{2}-\d{2})_(\d{4}-\d{2}-\d{2})(.*)_(SMALL|LARGE)_RESTART\.xlsx$',
                      self.form_path)
@@ -1042,23 +2065,41 @@ class NewTask:
         current_task_dir = f'{self.get_directory()}/download/storage_tasks/task_{m.group(1)}{m.group(3)}_{m.group(4)}_DONE'
         new_task_dir = f'{self.get_directory()}/download/storage_tasks/task_{m.group(2)}{m.group(3)}_SMALL_NEW'
 
+        # Files of the task get the new date and the SMALL size, SMALL tasks as well as LARGE tasks
+        current_prefix = f'task_{m.group(1)}{m.group(3)}_{m.group(4)}'
+        new_prefix = f'task_{m.group(2)}{m.group(3)}_SMALL'
+
+        def get_new_file_name(f: str) -> str:
+            if f.startswith(current_prefix):
+                return new_prefix + f[len(current_prefix):]
+            return f
+
+        current_task = Task(current_task_dir)
         if sftp.is_dir(current_task_dir) is True:
             sftp.rename(current_task_dir, new_task_dir)
             for f in sftp.listdir(new_task_dir):
-                if f.endswith('_LARGE.xlsx'):
-                    sftp.rename(f'{new_task_dir}/{f}',
-                                f'{new_task_dir}/task_{m.group(2)}{m.group(3)}_SMALL.xlsx')
-                elif f.endswith('_LARGE_items_processing.csv'):
-                    sftp.rename(f'{new_task_dir}/{f}',
-                                f'{new_task_dir}/task_{m.group(2)}{m.group(3)}_SMALL_items_processing.csv')
-                elif f.endswith('LARGE_items_not_copied.csv'):
-                    sftp.rename(f'{new_task_dir}/{f}',
-                                f'{new_task_dir}/task_{m.group(2)}{m.group(3)}_SMALL_items_not_copied.csv')
-            sftp.remove(self.form_path)
-            logging.info(f'{self.get_task_name(state="NEW")} restarted')
+                if get_new_file_name(f) != f:
+                    sftp.rename(f'{new_task_dir}/{f}', f'{new_task_dir}/{get_new_file_name(f)}')
+
+        elif current_task.is_valid() is True and sftp.is_file(current_task.get_bundle_path()) is True:
+            # Archived task: the bundle is unpacked locally and the new task is uploaded
+            current_task.copy_to_local(sftp=sftp)
+            new_task_local_dir = f'data/{new_task_dir}'
+            if os.path.exists(new_task_local_dir) is True:
+                shutil.rmtree(new_task_local_dir)
+            os.rename(current_task.get_directory_path(local=True), new_task_local_dir)
+            for f in os.listdir(new_task_local_dir):
+                if get_new_file_name(f) != f:
+                    os.rename(f'{new_task_local_dir}/{f}', f'{new_task_local_dir}/{get_new_file_name(f)}')
+            sftp.copy_to_remote(new_task_local_dir, new_task_dir)
+            sftp.remove(current_task.get_bundle_path())
 
         else:
             logging.error(f'{self.form_path}: Task not found')
+            return
+
+        sftp.remove(self.form_path)
+        logging.info(f'{self.get_task_name(state="NEW")} restarted')
 
     @sftp_connect
     def create_new_task(self, sftp: sftpmodule.SFTP) -> None:
@@ -1085,10 +2126,14 @@ class NewTask:
 class RemoteLocation:
     """Remote location class to list the remote directories
 
+    Listings are cached in a snapshot, only the directories modified since the last run are listed again.
+
     Attributes
     ----------
+    snapshot : RemoteSnapshot
+        Cached listing of the remote directories
     paths : List[str]
-        List of remote paths
+        List of remote paths, bundles of archived tasks included
     directories : List[str]
         List of directories"""
 
@@ -1099,6 +2144,7 @@ class RemoteLocation:
         -------
         None
         """
+        self.snapshot = RemoteSnapshot()
         self.paths = self.get_remote_directories()
         self.directories = [p.split('/')[-1] for p in self.paths]
 
@@ -1118,13 +2164,11 @@ class RemoteLocation:
         """
         remote_directories = []
         for account_directory in SBK_DIR:
-            if sftp.is_dir(f'./{account_directory}/download/storage_tasks') is False:
-                logging.warning(f'Creating directory {account_directory}/download/storage_tasks')
-                sftp.mkdir(f'./{account_directory}/download/storage_tasks')
+            for entry in self.snapshot.listdir(sftp, f'./{account_directory}/download/storage_tasks',
+                                               directories_only=True, file_suffix=taskbundle.BUNDLE_SUFFIX):
+                remote_directories += [f'{account_directory}/download/storage_tasks/{entry}']
 
-            for entry in sftp.listdir(f'./{account_directory}/download/storage_tasks'):
-                if sftp.is_dir(f'./{account_directory}/download/storage_tasks/{entry}') is True:
-                    remote_directories += [f'{account_directory}/download/storage_tasks/{entry}']
+        self.snapshot.save()
 
         return remote_directories
 
@@ -1139,17 +2183,37 @@ class RemoteLocation:
         """
         new_tasks = []
         for account_directory in SBK_DIR:
-            if sftp.is_dir(f'./{account_directory}/upload/storage_tasks') is False:
-                sftp.mkdir(f'./{account_directory}/upload/storage_tasks')
-            for entry in sftp.listdir(f'./{account_directory}/upload/storage_tasks'):
+            for entry in self.snapshot.listdir(sftp, f'./{account_directory}/upload/storage_tasks'):
                 if NewTask.is_valid_form_path(f'{account_directory}/upload/storage_tasks/{entry}'):
                     new_tasks.append(f'{account_directory}/upload/storage_tasks/{entry}')
 
+        self.snapshot.save()
+
         new_tasks = sorted(new_tasks,
                            key=lambda f_name: 0 if f_name.endswith('_DELETE.xlsx') else 1)
 
         return new_tasks
 
+    def is_idle(self) -> bool:
+        """Check if nothing changed on the remote server since the last run
+
+        Remote directories are unchanged and no task is outdated.
+
+        Returns
+        -------
+        bool
+            True if the remote directories didn't change and no task must be removed
+        """
+        if self.snapshot.has_changed() is True:
+            return False
+
+        for path in self.paths:
+            task = Task(path)
+            if task.is_valid() is False or (date.today() - task.get_scheduled_date()).days > MAX_DAYS_RETENTION:
+                return False
+
+        return True
+
 
 if __name__ == '__main__':
     pass
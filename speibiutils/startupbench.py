@@ -0,0 +1,62 @@
+import re
+import sys
+import subprocess
+from typing import List, Tuple
+
+# Modules imported by the entry points of the workflow
+STARTUP_MODULES = ['speibiutils.workflow', 'speibiutils.speibiutils', 'speibiutils.transferprocess']
+
+
+def measure_import_time(module: str) -> List[Tuple[str, int]]:
+    """Measure the import time of a module in a new interpreter with "-X importtime"
+
+    Parameters
+    ----------
+    module : str
+        Name of the module to import
+
+    Returns
+    -------
+    List[Tuple[str, int]]
+        Imported modules with their cumulative import time in microseconds, sorted by decreasing time.
+        The first entry is the measured module.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            capture_output=True, text=True, check=True)
+
+    timings = []
+    for line in result.stderr.splitlines():
+        m = re.match(r'^import time:\s+\d+\s+\|\s+(\d+)\s+\|\s+(.+)$', line)
+        if m is not None:
+            timings.append((m.group(2).strip(), int(m.group(1))))
+
+    return sorted(timings, key=lambda timing: timing[1], reverse=True)
+
+
+def benchmark_startup(modules: List[str] = None, top: int = 10) -> str:
+    """Build a report of the import times of the entry points
+
+    Parameters
+    ----------
+    modules : List[str]
+        Modules to measure, STARTUP_MODULES if None
+    top : int
+        Number of slowest imported modules listed for each measured module
+
+    Returns
+    -------
+    str
+        Report with one section per measured module
+    """
+    if modules is None:
+        modules = STARTUP_MODULES
+
+    report = []
+    for module in modules:
+        timings = measure_import_time(module)
+        total = dict(timings).get(module, 0)
+        report.append(f'{module}: {total / 1000:.0f} ms')
+        for imported_module, cumulative_time in timings[1:top + 1]:
+            report.append(f'    {imported_module}: {cumulative_time / 1000:.0f} ms')
+
+    return '\n'.join(report)
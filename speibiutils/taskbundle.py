@@ -0,0 +1,123 @@
+import os
+import json
+import shutil
+import zipfile
+from datetime import datetime
+from typing import Optional
+
+# Suffix of the bundles of the archived tasks, the bundle of "<directory>" is "<directory>.zip"
+BUNDLE_SUFFIX = '.zip'
+
+# Name of the index of the files in the bundles
+INDEX_NAME = 'index.json'
+
+# Files already compressed are stored without compression
+STORED_EXTENSIONS = ('.zip', '.xlsx')
+
+
+def pack(directory_path: str, bundle_path: Optional[str] = None) -> str:
+    """Pack a task directory in one compressed bundle
+
+    The bundle contains the files of the directory and an index with the name, size and modification time of
+    each file. The bundle is written in a temporary file first, an interrupted packing leaves no bundle.
+
+    Parameters
+    ----------
+    directory_path : str
+        Path of the directory to pack
+    bundle_path : str
+        Path of the bundle, default is the path of the directory with BUNDLE_SUFFIX
+
+    Returns
+    -------
+    str
+        Path of the bundle
+    """
+    if bundle_path is None:
+        bundle_path = f'{directory_path}{BUNDLE_SUFFIX}'
+
+    files = []
+    with zipfile.ZipFile(f'{bundle_path}.tmp', 'w', compression=zipfile.ZIP_DEFLATED) as bundle:
+        for root, _, file_names in os.walk(directory_path):
+            for file_name in sorted(file_names):
+                path = os.path.join(root, file_name)
+                name = os.path.relpath(path, directory_path).replace(os.sep, '/')
+                bundle.write(path, name, compress_type=zipfile.ZIP_STORED
+                             if file_name.endswith(STORED_EXTENSIONS) else zipfile.ZIP_DEFLATED)
+                files.append({'name': name,
+                              'size': os.path.getsize(path),
+                              'mtime': int(os.path.getmtime(path))})
+
+        bundle.writestr(INDEX_NAME, json.dumps({'directory': os.path.basename(directory_path.rstrip('/')),
+                                                'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                                                'files': files}, indent=4))
+
+    os.replace(f'{bundle_path}.tmp', bundle_path)
+
+    return bundle_path
+
+
+def read_index(bundle_path: str) -> dict:
+    """Read the index of a bundle
+
+    Parameters
+    ----------
+    bundle_path : str
+        Path of the bundle
+
+    Returns
+    -------
+    dict
+        Index with keys: directory, created, files. Files are dict with keys: name, size, mtime
+    """
+    with zipfile.ZipFile(bundle_path) as bundle:
+        return json.loads(bundle.read(INDEX_NAME))
+
+
+def read_file(bundle_path: str, name: str) -> Optional[bytes]:
+    """Read one file of a bundle without unpacking it
+
+    Parameters
+    ----------
+    bundle_path : str
+        Path of the bundle
+    name : str
+        Name of the file in the bundle, relative to the task directory
+
+    Returns
+    -------
+    Optional[bytes]
+        Content of the file, None if the file is not in the bundle
+    """
+    with zipfile.ZipFile(bundle_path) as bundle:
+        if name not in bundle.namelist():
+            return None
+        return bundle.read(name)
+
+
+def unpack(bundle_path: str, directory_path: str) -> None:
+    """Unpack a bundle in a task directory
+
+    The index is not extracted. If the directory already exists, it is replaced.
+
+    Parameters
+    ----------
+    bundle_path : str
+        Path of the bundle
+    directory_path : str
+        Path of the directory to create
+
+    Returns
+    -------
+    None
+    """
+    if os.path.exists(directory_path) is True:
+        shutil.rmtree(directory_path)
+
+    with zipfile.ZipFile(bundle_path) as bundle:
+        names = [name for name in bundle.namelist() if name != INDEX_NAME]
+        for name in names:
+            if os.path.isabs(name) is True or '..' in name.split('/'):
+                raise ValueError(f'{bundle_path}: invalid file name "{name}"')
+        os.makedirs(directory_path)
+        bundle.extractall(directory_path, members=names)
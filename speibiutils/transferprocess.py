@@ -11,13 +11,38 @@
 
 # Import libraries
 import speibiutils.speibiutils as speibi
+from speibiutils import almacache, barcodecheck, excelpool, logqueue, pipeline, processingfile
+from speibiutils.formreader import FormReader
+from speibiutils.recordarchive import RecordArchive
+from speibiutils.ratelimiter import limit_api_calls, get_api_call_statistics
 from almapiwrapper.inventory import IzBib, Holding, Item
 import pandas as pd
 from copy import deepcopy
+from operator import itemgetter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional
 import os
+import json
+import time
 import logging
-import openpyxl
 import re
+from config import TWO_PHASE_RENAME, RENAME_CONCURRENCY, ALMA_API_CALLS_PER_SECOND, ALMA_DAILY_API_QUOTA, \
+    PIPELINE_CONCURRENCY, PIPELINE_JOBS_PER_SECOND, RETRY_SWEEPS, RETRY_SWEEP_DELAY_SECONDS
+
+# API calls of the operations in the destination IZ and on the source items, used to project the calls of a
+# dry run. Bib and holding lookups are made before each copy, the source item is updated once it is copied.
+OPERATION_API_CALLS = {'bib_lookup': 1,
+                       'bib_copy': 1,
+                       'holding_lookup': 1,
+                       'holding_create': 1,
+                       'item_create': 1,
+                       'source_item_update': 1}
+
+# almapiwrapper stops the process when less calls remain in the daily quota
+API_QUOTA_MIN_REMAINING = 5000
+
+# Error messages of almapiwrapper when Alma didn't answer the request, for example after a timeout or a 503 error
+TRANSIENT_ERROR_MESSAGES = ['No response from Alma', 'unknown error']
 
 
 def get_process_file_path(task_path):
@@ -26,149 +51,616 @@ def get_process_file_path(task_path):
         return f'{task_path}/{m.group(1)}_items_processing.csv'
 
 
-def process_task(task: speibi.Task):
-    """Process a task"""
+def get_form_parameters(task: speibi.Task) -> dict:
+    """Get the parameters of the transfer from the "General" sheet of the form
+
+    Parameters
+    ----------
+    task : speibi.Task
+        Task to process
+
+    Returns
+    -------
+    dict
+        Parameters of the transfer, keys are: iz_s, iz_d, env, force_copy, force_update
+    """
+    # Only the "General" sheet is parsed, the workbook is not loaded
+    with FormReader(task.get_form_path(local=True)) as form:
+        cells = form.get_cells('General', ['B3', 'B4', 'B5', 'B7', 'B8'])
+
+    return {'iz_s': cells['B3'],
+            'iz_d': cells['B4'],
+            'env': {'Production': 'P',
+                    'Sandbox': 'S'}.get(cells['B5'], 'P'),
+            'force_copy': {'Yes': True, 'No': False}.get(cells['B7'], False),
+            'force_update': {'Yes': True, 'No': False}.get(cells['B8'], False)}
+
+
+def load_mapping_tables(task: speibi.Task) -> (pd.DataFrame, pd.DataFrame):
+    """Load the locations and item policies mapping tables of the form
+
+    Parameters
+    ----------
+    task : speibi.Task
+        Task to process
+
+    Returns
+    -------
+    pd.DataFrame
+        Locations mapping table
+    pd.DataFrame
+        Item policies mapping table
+    """
+    sheets = excelpool.read_sheets(task.get_form_path(local=True), ['Locations_mapping', 'Item_policies_mapping'])
+
+    return sheets['Locations_mapping'], sheets['Item_policies_mapping']
+
+
+def get_destination_location(locations_table: pd.DataFrame,
+                             library_s: str,
+                             location_s: str) -> Optional[tuple[str, str]]:
+    """Get the destination library and location of a source location
+
+    Parameters
+    ----------
+    locations_table : pd.DataFrame
+        Locations mapping table
+    library_s : str
+        Source library code
+    location_s : str
+        Source location code
+
+    Returns
+    -------
+    tuple[str, str]
+        Destination library code and location code, None if the location is not in the table and no default
+        location is available
+    """
+    loc_temp = locations_table.loc[(locations_table['Source library code'] == library_s) &
+                                   (locations_table['Source location code'] == location_s),
+    ['Destination library code', 'Destination location code']]
+
+    if len(loc_temp) == 0:
+        # Check if default location is available
+        loc_temp = locations_table.loc[(locations_table['Source library code'] == '*DEFAULT*') &
+                                       (locations_table['Source location code'] == '*DEFAULT*') &
+                                       (~pd.isnull(locations_table['Destination library code'])) &
+                                       (~pd.isnull(locations_table['Destination location code'])),
+        ['Destination library code', 'Destination location code']]
+
+    if len(loc_temp) == 0:
+        return None
+
+    return loc_temp['Destination library code'].values[0], loc_temp['Destination location code'].values[0]
+
+
+def get_destination_policy(item_policies_table: pd.DataFrame, policy_s: str) -> Optional[str]:
+    """Get the destination item policy of a source item policy
+
+    Parameters
+    ----------
+    item_policies_table : pd.DataFrame
+        Item policies mapping table
+    policy_s : str
+        Source item policy code
+
+    Returns
+    -------
+    str
+        Destination item policy code, None if the policy is not in the table and no default policy is available
+    """
+    policy_temp = item_policies_table.loc[item_policies_table['Source item policy code'] == policy_s]
+
+    # Check if default policy is available
+    if len(policy_temp) == 0:
+        policy_temp = item_policies_table.loc[item_policies_table['Source item policy code'] == '*DEFAULT*']
+
+    if len(policy_temp) == 0:
+        return None
+
+    return policy_temp['Destination item policy code'].values[0]
+
+
+def load_processing_file(task: speibi.Task) -> Optional[pd.DataFrame]:
+    """Load the processing file of a task
+
+    Parameters
+    ----------
+    task : speibi.Task
+        Task to process
+
+    Returns
+    -------
+    pd.DataFrame
+        Processing data with the dtypes of :data:`processingfile.PROCESSING_FILE_SCHEMA`, None if the processing
+        file doesn't exist
+    """
+    if os.path.exists(task.get_processing_file_path(local=True)) is False:
+        return None
+
+    return processingfile.read_processing_file(task.get_processing_file_path(local=True))
+
+
+def rename_source_item(item_s: Item, force_update: bool) -> bool:
+    """Add the "OLD_" prefix to the barcode of the source item
+
+    Parameters
+    ----------
+    item_s : Item
+        Source item
+    force_update : bool
+        If True, blocking fields are removed from the source item
+
+    Returns
+    -------
+    bool
+        True if the barcode of the source item has been updated or was already updated, False otherwise
+    """
+    # Change barcode of source item
+    if item_s.barcode.startswith('OLD_'):
+        # Skip this step if barcode already updated, the item is renamed
+        logging.warning(f'{repr(item_s)}: barcode already updated "{item_s.barcode}"')
+        return True
+
+    old_barcode = item_s.barcode
+    item_s.barcode = 'OLD_' + item_s.barcode
+
+    # Clean source item
+    if force_update is True:
+        for field_name in ['provenance', 'temp_location', 'temp_library', 'in_temp_location', 'pattern_type',
+                           'statistics_note_1', 'statistics_note_2', 'statistics_note_3', 'po_line']:
+            fields = item_s.data.findall(f'.//{field_name}')
+            for field in fields:
+                if field.text is not None:
+                    logging.info(f'{repr(item_s)}: remove field "{field_name}", content: "{field.text}"')
+                    field.getparent().remove(field)
+
+    item_s.update()
+
+    # The cached source item is replaced by the updated one
+    almacache.get_cache().update_item(item_s, old_barcode)
+
+    return item_s.error is False
+
+
+def rename_source_items(task: speibi.Task,
+                        df: pd.DataFrame,
+                        parameters: dict,
+                        items_s: Optional[dict] = None,
+                        concurrency: Optional[int] = None) -> None:
+    """Second phase of the transfer: update the barcodes of the source items
+
+    Only the items already created in the destination IZ and not yet renamed are handled. The renaming is
+    done in parallel, the processing file is updated after each item so that the phase can be resumed.
+
+    Parameters
+    ----------
+    task : speibi.Task
+        Task to process
+    df : pd.DataFrame
+        Processing data
+    parameters : dict
+        Parameters of the transfer, see :func:`get_form_parameters`
+    items_s : dict
+        Source items fetched in the first phase, keys are barcodes. Missing items are fetched again.
+    concurrency : int
+        Number of items renamed in parallel, default is RENAME_CONCURRENCY of the configuration
+
+    Returns
+    -------
+    None
+    """
+    if items_s is None:
+        items_s = {}
+
+    barcodes = df.loc[(~pd.isnull(df['Item_id_d'])) & (~df['Renamed']), 'Barcode'].tolist()
+    logging.info(f'{len(barcodes)} source items to rename')
+    cache = almacache.get_cache()
+
+    def rename(barcode: str) -> (bool, Optional[str]):
+        item_s = items_s.get(barcode)
+        if item_s is None:
+            item_s = cache.get_item(barcode, parameters['iz_s'], parameters['env'])
+
+            if item_s.error is True:
+                # Barcode may have been updated in an interrupted run
+                if cache.get_item('OLD_' + barcode, parameters['iz_s'], parameters['env']).error is False:
+                    logging.warning(f'{barcode}: barcode already updated "OLD_{barcode}"')
+                    return True, None
+                return False, 'Error by fetching source item'
+
+        if rename_source_item(item_s, parameters['force_update']) is False:
+            return False, 'source_barcode_not_updated'
+
+        return True, None
+
+    with ThreadPoolExecutor(max_workers=concurrency or RENAME_CONCURRENCY) as executor:
+        futures = {executor.submit(logqueue.with_context(rename), barcode): barcode for barcode in barcodes}
+        for future in as_completed(futures):
+            barcode = futures[future]
+            renamed, error_label = future.result()
+
+            if renamed is True:
+                df.loc[df.Barcode == barcode, 'Renamed'] = True
+                df.loc[df.Barcode == barcode, 'Copied'] = True
+            elif error_label is not None:
+                processingfile.set_error(df, df.Barcode == barcode, error_label)
+
+            processingfile.write_processing_file(df, task.get_processing_file_path(local=True))
+
+
+def verify_rename(task: speibi.Task, concurrency: Optional[int] = None) -> pd.DataFrame:
+    """Check both sides of the transfer of the items of a task
+
+    For each item created in the destination IZ, check that the item is available in the destination IZ with
+    the barcode and that the source item has the "OLD_" barcode. The result is saved in the
+    "_items_verification.csv" file of the task.
+
+    Parameters
+    ----------
+    task : speibi.Task
+        Task to verify
+    concurrency : int
+        Number of items verified in parallel, default is RENAME_CONCURRENCY of the configuration
+
+    Returns
+    -------
+    pd.DataFrame
+        Result of the verification with columns: Barcode, In_destination, Source_renamed, Verified
+    """
+    limit_api_calls()
+    parameters = get_form_parameters(task)
+    df = load_processing_file(task)
+    if df is None:
+        logging.error(f'{task.get_name()}: no processing file, impossible to verify the task')
+        return pd.DataFrame(columns=['Barcode', 'In_destination', 'Source_renamed', 'Verified'])
+
+    barcodes = df.loc[~pd.isnull(df['Item_id_d']), 'Barcode'].tolist()
+
+    def verify(barcode: str) -> dict:
+        item_d = Item(barcode=barcode, zone=parameters['iz_d'], env=parameters['env'])
+        item_s = Item(barcode='OLD_' + barcode, zone=parameters['iz_s'], env=parameters['env'])
+        return {'Barcode': barcode,
+                'In_destination': item_d.error is False,
+                'Source_renamed': item_s.error is False,
+                'Verified': item_d.error is False and item_s.error is False}
+
+    with ThreadPoolExecutor(max_workers=concurrency or RENAME_CONCURRENCY) as executor:
+        verification = pd.DataFrame(list(executor.map(logqueue.with_context(verify), barcodes)),
+                                    columns=['Barcode', 'In_destination', 'Source_renamed', 'Verified'])
+
+    verification.to_csv(task.get_processing_file_path(local=True)
+                        .replace('_processing.csv', '_verification.csv'), index=False)
+    logging.info(f'{task.get_name()}: {verification["Verified"].sum()} / {len(verification)} items verified')
+
+    return verification
+
+
+def estimate_task(task: speibi.Task, concurrency: Optional[int] = None) -> dict:
+    """Simulate the processing of a task with source reads only
+
+    The source items and holdings are fetched, the locations and item policies are mapped and the bib
+    records and holdings shared by several barcodes are detected. Nothing is written in the destination IZ
+    and the processing file is not changed. Barcodes already handled in the processing file are skipped.
+
+    Bib records and holdings are counted as created when they are not yet in the processing file. They are
+    not created if the destination IZ already has them, the counts are upper bounds. The runtime is
+    estimated with the mean latency of the source reads, limited by ALMA_API_CALLS_PER_SECOND.
+
+    The estimate is saved in the "_dry_run.json" file of the task.
+
+    Parameters
+    ----------
+    task : speibi.Task
+        Task to simulate
+    concurrency : int
+        Number of source items fetched in parallel, default is RENAME_CONCURRENCY of the configuration
+
+    Returns
+    -------
+    dict
+        Estimate with keys: barcodes, creates, updates, errors, api_calls, quota_remaining, quota_sufficient,
+        estimated_seconds
+    """
+    sheets_future = excelpool.read_sheets_async(task.get_form_path(local=True),
+                                                ['Items', 'Locations_mapping', 'Item_policies_mapping'])
+
+    limit_api_calls()
+    statistics = get_api_call_statistics()
+    statistics.reset()
+
+    parameters = get_form_parameters(task)
+    df = load_processing_file(task)
+    sheets = excelpool.get_sheets(sheets_future)
+    barcodes = barcodecheck.normalize_barcodes(sheets['Items']['Barcode'].dropna())
+    locations_table = sheets['Locations_mapping']
+    item_policies_table = sheets['Item_policies_mapping']
+
+    # Bib records and holdings already copied are reused by the processing
+    known_mms_ids = set()
+    known_holding_ids = set()
+    to_rename = []
+    if df is not None:
+        known_mms_ids = set(df['MMS_id_s'].dropna())
+        known_holding_ids = set(df['Holding_id_s'].dropna())
+        to_rename = df.loc[(~pd.isnull(df['Item_id_d'])) & (~df['Renamed']), 'Barcode'].tolist()
+        handled = set(df.loc[df['Copied'], 'Barcode']) | set(to_rename)
+        barcodes = barcodes.loc[~barcodes.isin(handled)]
+
+    # Invalid barcodes are not fetched
+    invalid = barcodecheck.validate_barcodes(barcodes, parameters['iz_s']).notna()
+    barcodes = barcodes.loc[~invalid].tolist()
+
+    cache = almacache.get_cache()
+
+    def fetch(barcode: str) -> Item:
+        item_s = cache.get_item(barcode, parameters['iz_s'], parameters['env'])
+        if item_s.error is False:
+            # Load the source holding, the records are cached for the processing
+            cache.load_holding(item_s)
+        return item_s
+
+    with ThreadPoolExecutor(max_workers=concurrency or RENAME_CONCURRENCY) as executor:
+        items_s = list(executor.map(logqueue.with_context(fetch), barcodes))
+    cache.log_statistics()
+
+    creates = {'bib': 0, 'holding': 0, 'item': 0}
+    errors = {barcodecheck.INVALID_BARCODE_ERROR: int(invalid.sum())} if invalid.any() else {}
+    new_mms_ids = set()
+    new_holding_ids = set()
+
+    for barcode, item_s in zip(barcodes, items_s):
+        error_label = None
+
+        if item_s.error is True:
+            error_label = 'Error by fetching source item'
+        elif get_destination_location(locations_table, item_s.holding.library, item_s.holding.location) is None:
+            error_label = 'Location not existing in location table'
+        elif get_destination_location(locations_table, item_s.library, item_s.location) is None:
+            error_label = 'Location not existing in location table'
+        elif get_destination_policy(item_policies_table, item_s.data.find('.//policy').text) is None:
+            error_label = 'Item policy not existing in policies table'
+
+        if error_label is not None:
+            logging.warning(f'Dry run: {barcode}: {error_label}')
+            errors[error_label] = errors.get(error_label, 0) + 1
+            continue
+
+        mms_id_s = item_s.get_mms_id()
+        if mms_id_s not in known_mms_ids and mms_id_s not in new_mms_ids:
+            new_mms_ids.add(mms_id_s)
+            creates['bib'] += 1
+
+        holding_id_s = item_s.get_holding_id()
+        if holding_id_s not in known_holding_ids and holding_id_s not in new_holding_ids:
+            new_holding_ids.add(holding_id_s)
+            creates['holding'] += 1
+
+        creates['item'] += 1
+
+    updates = {'source_item': creates['item'] + len(to_rename)}
+
+    # Projection of the calls of the processing: source reads are measured, other calls are estimated
+    source_reads = statistics.get_total_calls()
+    projected_calls = (source_reads
+                       + creates['item'] * OPERATION_API_CALLS['bib_lookup']
+                       + creates['bib'] * OPERATION_API_CALLS['bib_copy']
+                       + creates['holding'] * (OPERATION_API_CALLS['holding_lookup']
+                                               + OPERATION_API_CALLS['holding_create'])
+                       + creates['item'] * OPERATION_API_CALLS['item_create']
+                       + updates['source_item'] * OPERATION_API_CALLS['source_item_update'])
+
+    quota_remaining = statistics.remaining if statistics.remaining is not None else ALMA_DAILY_API_QUOTA
+    mean_latency = statistics.get_mean_duration() or 0
+    estimated_seconds = projected_calls * max(mean_latency, 1 / ALMA_API_CALLS_PER_SECOND)
+
+    estimate = {'barcodes': len(barcodes) + len(to_rename),
+                'creates': creates,
+                'updates': updates,
+                'errors': errors,
+                'api_calls': {'source_reads': source_reads, 'projected': projected_calls},
+                'mean_latency': round(mean_latency, 3),
+                'quota_remaining': quota_remaining,
+                'quota_sufficient': quota_remaining - projected_calls >= API_QUOTA_MIN_REMAINING,
+                'estimated_seconds': round(estimated_seconds)}
+
+    logging.info(f'Dry run {task.get_name()}: {estimate["barcodes"]} barcodes to handle, '
+                 f'creates: {creates}, updates: {updates}, errors: {errors}')
+    logging.info(f'Dry run {task.get_name()}: {projected_calls} API calls projected, '
+                 f'{quota_remaining} remaining in the daily quota, '
+                 f'estimated runtime {estimate["estimated_seconds"]} seconds')
+    if estimate['quota_sufficient'] is False:
+        logging.warning(f'Dry run {task.get_name()}: daily API quota not sufficient to process the task')
+
+    with open(task.get_processing_file_path(local=True).replace('_processing.csv', '_dry_run.json'), 'w') as f:
+        json.dump(estimate, f, indent=4)
+
+    return estimate
+
+
+def process_task(task: speibi.Task,
+                 two_phase_rename: Optional[bool] = None,
+                 concurrency: Optional[int] = None,
+                 budget: Optional[float] = None) -> bool:
+    """Process a task
+
+    The barcodes go through a pipeline of stages with their own workers, see PIPELINE_CONCURRENCY of the
+    configuration: fetch of the source item, bib record, holding, item creation and rename of the source item.
+    Bib records and holdings of the same NZ record are handled by the same worker. Only the calling thread
+    updates the processing file.
+
+    Once all the barcodes are handled, the barcodes with transient errors are retried RETRY_SWEEPS times, see
+    TRANSIENT_ERRORS of the configuration.
+
+    Use :func:`estimate_task` to simulate the processing without writing in the destination IZ.
+
+    Parameters
+    ----------
+    task : speibi.Task
+        Task to process
+    two_phase_rename : bool
+        If True, all the items are created in the destination IZ before the barcodes of the source items are
+        updated in a separate stage. Default is TWO_PHASE_RENAME of the configuration.
+    concurrency : int
+        Number of items renamed in parallel in the rename stage, default is RENAME_CONCURRENCY with the
+        two-phase rename and PIPELINE_CONCURRENCY otherwise
+    budget : float
+        Maximum duration in seconds, no new barcode is handled once it is exceeded. The task can be resumed
+        later with the processing file. No limit if None.
+
+    Returns
+    -------
+    bool
+        True if all the barcodes were handled, False if the budget was exceeded
+    """
+    if two_phase_rename is None:
+        two_phase_rename = TWO_PHASE_RENAME
+
+    start_time = time.time()
+
+    # The sheets of the form are parsed in the Excel process pool while the task is prepared
+    sheets_future = excelpool.read_sheets_async(task.get_form_path(local=True),
+                                                ['Items', 'Locations_mapping', 'Item_policies_mapping'])
+
+    limit_api_calls()
 
     # Get configuration
-    wb = openpyxl.load_workbook(task.get_form_path(local=True))
-    wb.active = wb['General']
-    sheet = wb.active
-    iz_s = sheet.cell(row=3, column=2).value
-    iz_d = sheet.cell(row=4, column=2).value
-    env = {'Production': 'P',
-           'Sandbox': 'S'}.get(sheet.cell(row=5, column=2).value, 'P')
-    force_copy = {'Yes': True, 'No': False}.get(sheet.cell(row=7, column=2).value, False)
-    force_update = {'Yes': True, 'No': False}.get(sheet.cell(row=8, column=2).value, False)
+    parameters = get_form_parameters(task)
+    iz_s = parameters['iz_s']
+    iz_d = parameters['iz_d']
+    env = parameters['env']
+    force_copy = parameters['force_copy']
+
+    # Check if processing file exists
+    df = load_processing_file(task)
+
+    sheets = excelpool.get_sheets(sheets_future)
 
     # Load barcodes
-    barcodes = pd.read_excel(task.get_form_path(local=True),
-                             sheet_name='Items', dtype=str)['Barcode'].dropna().str.strip("'")
+    barcodes = barcodecheck.normalize_barcodes(sheets['Items']['Barcode'].dropna())
     logging.info(f'{len(barcodes)} barcodes loaded from "{task.get_form_name()}" file.')
 
-    # Load locations
-    locations_table = pd.read_excel(task.get_form_path(local=True),
-                                    sheet_name='Locations_mapping', dtype=str)
+    # Load locations and item policies
+    locations_table = sheets['Locations_mapping']
+    item_policies_table = sheets['Item_policies_mapping']
+    if df is None:
+        df = processingfile.new_processing_file(barcodes)
 
-    # Load item policies
-    item_policies_table = pd.read_excel(task.get_form_path(local=True),
-                                        sheet_name='Item_policies_mapping', dtype=str)
+        # Invalid barcodes flagged by the form check are not processed
+        processingfile.set_error(df, barcodecheck.validate_barcodes(df['Barcode'], iz_s).notna(),
+                                 barcodecheck.INVALID_BARCODE_ERROR)
 
-    # Check if processing file exists
-    if os.path.exists(task.get_processing_file_path(local=True)) is True:
-        df = pd.read_csv(task.get_processing_file_path(local=True), dtype=str)
-        df = df.replace('False', False)
-        df = df.replace('True', True)
-        df = df.replace('NaN', None)
-
-    else:
-        df = pd.DataFrame(columns=['Barcode',
-                                   'NZ_mms_id',
-                                   'MMS_id_s',
-                                   'Holding_id_s',
-                                   'Item_id_s',
-                                   'MMS_id_d',
-                                   'Holding_id_d',
-                                   'Item_id_d',
-                                   'Process',
-                                   'Copied',
-                                   'Error'])
-
-        df['Barcode'] = barcodes
-        df['Copied'] = False
+    # Source items kept for the rename stage
+    items_s = {}
+
+    # Source records already fetched by a previous run are taken from the cache
+    cache = almacache.get_cache()
+
+    # Destination bib records and holdings already copied, they are only read and written by the worker of their
+    # NZ record
+    mms_ids_d = dict(df.loc[~pd.isnull(df['MMS_id_s']), ['MMS_id_s', 'MMS_id_d']]
+                     .drop_duplicates('MMS_id_s').values)
+    holding_ids_d = dict(df.loc[~pd.isnull(df['Holding_id_s']), ['Holding_id_s', 'Holding_id_d']]
+                         .drop_duplicates('Holding_id_s').values)
+
+    # Barcodes to handle: rows already processed or with an invalid barcode are skipped, and with the two-phase
+    # rename the rows with an item already created and waiting for the rename stage
+    skipped = df['Copied'] | (df['Error'] == barcodecheck.INVALID_BARCODE_ERROR)
+    if two_phase_rename is True:
+        skipped |= ~pd.isnull(df['Item_id_d'])
+    skipped_barcodes = set(df.loc[skipped, 'Barcode'])
+    jobs = [{'barcode': barcode} for barcode in df['Barcode'].drop_duplicates().values
+            if barcode not in skipped_barcodes]
+
+    logging.info(f'{len(jobs)} barcodes to handle')
 
     ######################
     # Start copy of data #
     ######################
 
-    for i, barcode in enumerate(df['Barcode'].values):
+    # Snapshots of the records are archived in background
+    archive = RecordArchive(task.get_records_archive_path(local=True))
 
-        logging.info(f'{i + 1} / {len(df["Barcode"].values)}: Handling {barcode}')
-
-        # Skip row if already processed
-        if len(df.loc[(df['Barcode'] == barcode) & (df['Copied'])]) > 0:
-            continue
+    def fetch(job: dict) -> (Optional[str], dict):
+        barcode = job['barcode']
+        logging.info(f'{job["position"]}: Handling {barcode}')
 
         # Fetch item data
-        item_s = Item(barcode=barcode, zone=iz_s, env=env)
-
-        holding_id_s = item_s.get_holding_id()
-        mms_id_s = item_s.get_mms_id()
-        nz_mms_id = item_s.get_nz_mms_id()
+        item_s = cache.get_item(barcode, iz_s, env)
 
         # Save item data
-        item_s.save()
+        archive.add(item_s, barcode)
 
         # Skip the row if error on the item
         if item_s.error is True:
-            error_label = 'Error by fetching source item'
+            if any(message in (item_s.error_msg or 'unknown error') for message in TRANSIENT_ERROR_MESSAGES):
+                values = {'Error': 'source_fetch_timeout'}
+            else:
+                values = {'Error': 'Error by fetching source item'}
 
             # check if item already exists in the destination
             item_d_test = Item(barcode=barcode, zone=iz_d, env=env)
-            item_s_test = Item(barcode='OLD_' + barcode, zone=iz_s, env=env)
+            item_s_test = cache.get_item('OLD_' + barcode, iz_s, env)
             if item_d_test.error is False and item_s_test.error is False:
-                error_label = 'Item in the destination IZ and barcode of source record already updated'
-                df.loc[df.Barcode == barcode, 'Copied'] = True
+                values = {'Error': 'Item in the destination IZ and barcode of source record already updated',
+                          'Copied': True}
 
-            df.loc[df.Barcode == barcode, 'Error'] = error_label
-            df.to_csv(task.get_processing_file_path(local=True), index=False)
+            return None, values
 
-            continue
+        job['item_s'] = item_s
+        job['holding_id_s'] = item_s.get_holding_id()
+        job['mms_id_s'] = item_s.get_mms_id()
+        job['nz_mms_id'] = item_s.get_nz_mms_id()
+
+        return 'bib', {}
 
-        # Bib record
-        # ----------
+    def resolve_bib(job: dict) -> (Optional[str], dict):
+        mms_id_s = job['mms_id_s']
+        nz_mms_id = job['nz_mms_id']
 
         # Check if copy bib record is required
-        if len(df.loc[df['MMS_id_s'] == mms_id_s]) > 0:
-            mms_id_d = df.loc[df['MMS_id_s'] == mms_id_s, 'MMS_id_d'].values[0]
+        if mms_id_s in mms_ids_d:
+            mms_id_d = mms_ids_d[mms_id_s]
             bib_d = IzBib(nz_mms_id, zone=iz_d, env=env, from_nz_mms_id=True)
         else:
             bib_d = IzBib(nz_mms_id, zone=iz_d, env=env, from_nz_mms_id=True, copy_nz_rec=True)
             mms_id_d = bib_d.get_mms_id()
 
         if bib_d.error is True:
-            error_label = 'Unable to get a destination bib record'
-            df.loc[df.Barcode == barcode, 'Error'] = error_label
-            continue
+            return None, {'Error': 'Unable to get a destination bib record'}
+
+        mms_ids_d[mms_id_s] = mms_id_d
+        job['bib_d'] = bib_d
+        job['mms_id_d'] = mms_id_d
 
-        df.loc[df.Barcode == barcode, 'MMS_id_s'] = mms_id_s
-        df.loc[df.MMS_id_s == mms_id_s, 'MMS_id_d'] = mms_id_d
-        df.loc[df.Barcode == barcode, 'NZ_mms_id'] = nz_mms_id
-        df.to_csv(task.get_processing_file_path(local=True), index=False)
+        return 'holding', {'MMS_id_s': mms_id_s, 'MMS_id_d': mms_id_d, 'NZ_mms_id': nz_mms_id}
 
-        # Holding record
-        # --------------
+    def resolve_holding(job: dict) -> (Optional[str], dict):
+        barcode = job['barcode']
+        item_s = job['item_s']
+        holding_id_s = job['holding_id_s']
 
         # Check if copy holding is required
-        if len(df.loc[df['Holding_id_s'] == holding_id_s]) > 0:
+        if holding_id_s in holding_ids_d:
 
             # Holding already created
-            holding_id_d = df.loc[df['Holding_id_s'] == holding_id_s, 'Holding_id_d'].values[0]
+            holding_id_d = holding_ids_d[holding_id_s]
         else:
-            item_s.holding.save()
+            cache.load_holding(item_s)
+            archive.add(item_s.holding, barcode)
 
             # Get location according to the provided table
-            loc_temp = locations_table.loc[(locations_table['Source library code'] == item_s.holding.library) &
-                                           (locations_table['Source location code'] == item_s.holding.location),
-            ['Destination library code', 'Destination location code']]
-
-            if len(loc_temp) == 0:
-                # Check if default location is available
-                loc_temp = locations_table.loc[(locations_table['Source library code'] == '*DEFAULT*') &
-                                               (locations_table['Source location code'] == '*DEFAULT*') &
-                                               (~pd.isnull(locations_table['Destination library code'])) &
-                                               (~pd.isnull(locations_table['Destination location code'])),
-                ['Destination library code', 'Destination location code']]
-
-            if len(loc_temp) == 0:
+            location_mapping = get_destination_location(locations_table,
+                                                        item_s.holding.library,
+                                                        item_s.holding.location)
+
+            if location_mapping is None:
                 # No corresponding location found => error
                 logging.error(f'Location {item_s.holding.library}/{item_s.holding.location} not in locations table')
-                error_label = 'Location not existing in location table'
-                df.loc[df.Barcode == barcode, 'Error'] = error_label
-                continue
+                return None, {'Error': 'Location not existing in location table'}
 
             # Get library and location destination
-            library_d = loc_temp['Destination library code'].values[0]
-            location_d = loc_temp['Destination location code'].values[0]
+            library_d, location_d = location_mapping
 
             # Load data of the source holding
             holding_temp = deepcopy(item_s.holding)
@@ -187,7 +679,7 @@ def process_task(task: speibi.Task):
             holding_d = None
 
             # Check if exists a destination holding with the same callnumber
-            for holding in bib_d.get_holdings():
+            for holding in job['bib_d'].get_holdings():
                 callnumber_d = holding.callnumber
 
                 # Suppress empty chars from call numbers
@@ -201,65 +693,48 @@ def process_task(task: speibi.Task):
 
             if holding_d is None:
                 # No holding found => need to be created
-                holding_d = Holding(mms_id=mms_id_d, zone=iz_d, env=env, data=holding_temp.data, create_holding=True)
+                holding_d = Holding(mms_id=job['mms_id_d'], zone=iz_d, env=env, data=holding_temp.data,
+                                    create_holding=True)
 
-            holding_d.save()
+            archive.add(holding_d, barcode)
             if holding_d.error is True:
                 if 'Holding for this title at this location already exists' in holding_d.error_msg:
                     error_label = 'similar_holding_existing'
                 else:
                     error_label = 'unknown_holding_error'
 
-                df.loc[df.Barcode == barcode, 'Error'] = error_label
-                continue
+                return None, {'Error': error_label}
             holding_id_d = holding_d.get_holding_id()
 
-        df.loc[df.Barcode == barcode, 'Holding_id_s'] = holding_id_s
-        df.loc[df.Holding_id_s == holding_id_s, 'Holding_id_d'] = holding_id_d
-        df.to_csv(task.get_processing_file_path(local=True), index=False)
+        holding_ids_d[holding_id_s] = holding_id_d
+        job['holding_id_d'] = holding_id_d
 
-        # Create item
-        # -----------
-        loc_temp = locations_table.loc[(locations_table['Source library code'] == item_s.library) &
-                                       (locations_table['Source location code'] == item_s.location),
-        ['Destination library code', 'Destination location code']]
+        return 'item', {'Holding_id_s': holding_id_s, 'Holding_id_d': holding_id_d}
+
+    def create_item(job: dict) -> (Optional[str], dict):
+        barcode = job['barcode']
+        item_s = job['item_s']
+        values = {}
 
-        if len(loc_temp) == 0:
-            # Check if default location is available
-            loc_temp = locations_table.loc[(locations_table['Source library code'] == '*DEFAULT*') &
-                                           (locations_table['Source location code'] == '*DEFAULT*') &
-                                           (~pd.isnull(locations_table['Destination library code'])) &
-                                           (~pd.isnull(locations_table['Destination location code'])),
-            ['Destination library code', 'Destination location code']]
+        location_mapping = get_destination_location(locations_table, item_s.library, item_s.location)
 
-        if len(loc_temp) == 0:
+        if location_mapping is None:
             # No corresponding location found => error
             logging.error(f'Location {item_s.library}/{item_s.location} not in locations table')
-            error_label = 'Location not existing in location table'
-            df.loc[df.Barcode == barcode, 'Error'] = error_label
-            continue
+            return None, {'Error': 'Location not existing in location table'}
 
         # Get the new location and library of the item
-        library_d = loc_temp['Destination library code'].values[0]
-        location_d = loc_temp['Destination location code'].values[0]
+        library_d, location_d = location_mapping
 
         # Get the item policy
         policy_s = item_s.data.find('.//policy').text
 
-        policy_temp = item_policies_table.loc[item_policies_table['Source item policy code'] == policy_s]
+        policy_d = get_destination_policy(item_policies_table, policy_s)
 
-        # Check if default policy is available
-        if len(policy_temp) == 0:
-            policy_temp = item_policies_table.loc[item_policies_table['Source item policy code'] == '*DEFAULT*']
-
-        if len(policy_temp) == 0:
+        if policy_d is None:
             # No corresponding item policy found => error
             logging.error(f'Item policy {policy_s} not in item policies table')
-            error_label = 'Item policy not existing in policies table'
-            df.loc[df.Barcode == barcode, 'Error'] = error_label
-            continue
-
-        policy_d = policy_temp['Destination item policy code'].values[0]
+            return None, {'Error': 'Item policy not existing in policies table'}
 
         # Prepare the new item with a copy of the source item
         item_temp = deepcopy(item_s)
@@ -277,7 +752,8 @@ def process_task(task: speibi.Task):
                         logging.info(f'{repr(item_temp)}: remove field "{field_name}", content: "{field.text}"')
                         field.getparent().remove(field)
 
-        item_d = Item(mms_id_d, holding_id_d, zone=iz_d, env=env, data=item_temp.data, create_item=True)
+        item_d = Item(job['mms_id_d'], job['holding_id_d'], zone=iz_d, env=env, data=item_temp.data,
+                      create_item=True)
 
         # Error handling => skip remaining process
         if item_d.error is True:
@@ -301,41 +777,104 @@ def process_task(task: speibi.Task):
                     logging.warning(f'{repr(item_d)}: success to create it')
             else:
                 error_label = 'unknown_item_error'
-            df.loc[df.Barcode == barcode, 'Error'] = error_label
+            values['Error'] = error_label
 
             # Skip remaining process
             if error_label not in ['already_exist', 'error_503_success_to_create']:
-                continue
+                return None, values
 
-        item_d.save()
+        archive.add(item_d, barcode)
 
-        df.loc[df.Barcode == barcode, 'Item_id_s'] = item_s.get_item_id()
-        df.loc[df.Barcode == barcode, 'Item_id_d'] = item_d.get_item_id()
+        values['Item_id_s'] = item_s.get_item_id()
+        values['Item_id_d'] = item_d.get_item_id()
 
-        # Change barcode of source item
-        if item_s.barcode.startswith('OLD_'):
-            # Skip this step if barcode already updated
-            logging.warning(f'{repr(item_d)}: barcode already updated "{item_d.barcode}"')
-            continue
+        # The barcode of the source item is updated in a separate stage
+        if two_phase_rename is True:
+            items_s[barcode] = item_s
+            return None, values
 
-        item_s.barcode = 'OLD_' + item_s.barcode
+        return 'rename', values
 
-        # Clean source item
-        if force_update is True:
-            for field_name in ['provenance', 'temp_location', 'temp_library', 'in_temp_location', 'pattern_type',
-                               'statistics_note_1', 'statistics_note_2', 'statistics_note_3', 'po_line']:
-                fields = item_s.data.findall(f'.//{field_name}')
-                for field in fields:
-                    if field.text is not None:
-                        logging.info(f'{repr(item_temp)}: remove field "{field_name}", content: "{field.text}"')
-                        field.getparent().remove(field)
+    def rename(job: dict) -> (Optional[str], dict):
+        item_s = job['item_s']
 
-        item_s.update()
+        if rename_source_item(item_s, parameters['force_update']) is False:
+            return None, {'Error': 'source_barcode_not_updated'}
 
-        df.loc[df.Barcode == barcode, 'Copied'] = True
-        df.to_csv(task.get_processing_file_path(local=True), index=False)
+        return None, {'Renamed': True, 'Copied': True}
+
+    def update_processing_file(job: dict, values: dict, finished: bool) -> None:
+        barcode = job['barcode']
+        for column, value in values.items():
+            if column == 'Error':
+                processingfile.set_error(df, df.Barcode == barcode, value)
+            else:
+                df.loc[df.Barcode == barcode, column] = value
+
+        # Bib records and holdings are shared by the rows with the same source records
+        if 'MMS_id_d' in values:
+            df.loc[df.MMS_id_s == values['MMS_id_s'], 'MMS_id_d'] = values['MMS_id_d']
+        if 'Holding_id_d' in values:
+            df.loc[df.Holding_id_s == values['Holding_id_s'], 'Holding_id_d'] = values['Holding_id_d']
+
+        if len(values) > 0:
+            processingfile.write_processing_file(df, task.get_processing_file_path(local=True))
+
+    stage_concurrency = dict(PIPELINE_CONCURRENCY)
+    if two_phase_rename is False and concurrency is not None:
+        stage_concurrency['rename'] = concurrency
+
+    def budget_exceeded() -> bool:
+        return budget is not None and time.time() - start_time > budget
+
+    def run_pipeline(pipeline_jobs: list) -> bool:
+        for position, job in enumerate(pipeline_jobs):
+            job['position'] = f'{position + 1} / {len(pipeline_jobs)}'
+
+        # Bib records and holdings are routed by NZ record: a record is copied only once and the holdings of a
+        # bib record are matched by call number one after the other
+        stages = [pipeline.Stage(name, fn, concurrency=stage_concurrency[name], key=key,
+                                 jobs_per_second=PIPELINE_JOBS_PER_SECOND[name])
+                  for name, fn, key in [('fetch', fetch, None),
+                                        ('bib', resolve_bib, itemgetter('nz_mms_id')),
+                                        ('holding', resolve_holding, itemgetter('nz_mms_id')),
+                                        ('item', create_item, None),
+                                        ('rename', rename, None)]]
+
+        return pipeline.Pipeline(task.get_name(), stages).run(pipeline_jobs, update_processing_file,
+                                                              stop=budget_exceeded)
+
+    try:
+        completed = run_pipeline(jobs)
+
+        # Barcodes with transient errors are retried once all the barcodes are handled
+        for sweep in range(RETRY_SWEEPS):
+            retry_rows = processingfile.get_transient_rows(df)
+            if completed is False or budget_exceeded() is True or retry_rows.sum() == 0:
+                break
+
+            logging.info(f'Retry sweep {sweep + 1} / {RETRY_SWEEPS}: {retry_rows.sum()} barcodes with transient '
+                         f'errors, retried in {RETRY_SWEEP_DELAY_SECONDS} seconds')
+            time.sleep(RETRY_SWEEP_DELAY_SECONDS)
+
+            retry_barcodes = df.loc[retry_rows, 'Barcode'].drop_duplicates().tolist()
+            processingfile.set_error(df, retry_rows, None)
+            completed = run_pipeline([{'barcode': barcode} for barcode in retry_barcodes])
+    finally:
+        archive.close()
+        cache.log_statistics()
+
+    if completed is False:
+        logging.warning(f'{task.get_name()}: time budget of {budget} seconds exceeded => process stopped, '
+                        f'{len(df.loc[df["Copied"]])} / {len(df)} barcodes copied')
+
+    # Rename stage of the two-phase transfer
+    if two_phase_rename is True and completed is True:
+        rename_source_items(task, df, parameters, items_s, concurrency=concurrency)
 
     # Make a report with the errors
-    df.loc[(~df['Copied']) | (df['Error'])].to_csv(task.get_processing_file_path(local=True)
-                                                   .replace('_processing.csv', '_not_copied.csv'),
-                                                   index=False)
+    df.loc[(~df['Copied']) | (df['Error'].notna())].to_csv(task.get_processing_file_path(local=True)
+                                                           .replace('_processing.csv', '_not_copied.csv'),
+                                                           index=False)
+
+    return completed
@@ -1,7 +1,14 @@
 import speibiutils.speibiutils as speibi
 import logging
-from datetime import datetime
-import speibiutils.transferprocess as tp
+from datetime import date, datetime
+from typing import Optional
+from speibiutils.lazyimport import lazy_import
+from speibiutils.profiling import profile, profiled
+from config import AUTO_RESTART_TRANSIENT_ERRORS
+
+# Transfer and reconciliation modules load almapiwrapper, they are only loaded when a task is processed
+tp = lazy_import('speibiutils.transferprocess')
+reconciliation = lazy_import('speibiutils.reconciliation')
 
 
 def task_workflow_new_to_ready() -> None:
@@ -17,6 +24,84 @@ def task_workflow_new_to_ready() -> None:
     task_summary.save()
 
 
+def is_idle(size: str) -> bool:
+    """Check if nothing changed on the remote server and no task is waiting
+
+    Parameters
+    ----------
+    size : str
+        Size of the tasks to process
+
+    Returns
+    -------
+    bool
+        True if the workflow has nothing to do
+    """
+    remote = speibi.RemoteLocation()
+
+    return (len(remote.get_new_tasks()) == 0 and remote.is_idle() is True
+            and speibi.TaskSummary.has_pending_tasks(size) is False)
+
+
+@profiled('discover')
+def discover(dry_run: Optional[bool] = False) -> None:
+    """Handle the new forms, reconcile the task summary with the remote directories and archive old DONE tasks
+
+    Parameters
+    ----------
+    dry_run : bool
+        If True, the changes are only logged
+
+    Returns
+    -------
+    None
+    """
+    speibi.TaskSummary.clean_local_directories()
+    remote = speibi.RemoteLocation()
+    new_tasks = remote.get_new_tasks()
+
+    if dry_run is True:
+        for new_task_path in new_tasks:
+            logging.info(f'Dry run: form {new_task_path} would be handled')
+        for action, target, message in speibi.TaskSummary().get_reconciliation_actions(remote.paths):
+            target = target if isinstance(target, str) else target.get_directory()
+            logging.info(f'Dry run: {action} {target}{"" if message is None else f" ({message})"}')
+        speibi.TaskSummary().archive_done_tasks(dry_run=True)
+        return
+
+    for new_task_path in new_tasks:
+        speibi.NewTask(new_task_path)
+
+    task_summary = speibi.TaskSummary()
+    task_summary.clean_remote_directories()
+    task_summary.archive_done_tasks()
+
+
+@profiled('check')
+def check(concurrency: Optional[int] = None, dry_run: Optional[bool] = False) -> None:
+    """Check the forms of the NEW tasks
+
+    Parameters
+    ----------
+    concurrency : int
+        Number of forms checked in parallel
+    dry_run : bool
+        If True, the tasks to check are only logged
+
+    Returns
+    -------
+    None
+    """
+    task_summary = speibi.TaskSummary()
+
+    if dry_run is True:
+        for directory in task_summary.tasks.loc[task_summary.tasks['State'] == 'NEW', 'Directory'].values:
+            logging.info(f'Dry run: form of {directory} would be checked')
+        return
+
+    task_summary.check_forms_conformity(concurrency=concurrency)
+
+
 def start(size: str) -> None:
     """Start the workflow
 
@@ -25,50 +110,288 @@ def start(size: str) -> None:
     None
     """
     speibi.LogFile()
-    speibi.TaskSummary.clean_local_directories()
-    new_tasks = speibi.RemoteLocation().get_new_tasks()
-    for new_task_path in new_tasks:
-        new_task = speibi.NewTask(new_task_path)
 
-    task_workflow_new_to_ready()
+    # Nothing to do if the remote directories didn't change since the last run
+    if is_idle(size) is True:
+        logging.info('No change on the remote server and no task to process')
+        speibi.LogFile.close_log()
+        return
+
+    discover()
+    check()
+
+    # Changes of the remote directories are handled, the next runs can be skipped until a new change
+    speibi.RemoteSnapshot().mark_handled()
+
+    # Tasks admitted on the same date are processed one after the other while the processing window is open
+    while run_next(size) is True and speibi.is_in_processing_window(size) is True:
+        pass
+
+    speibi.LogFile.close_log()
+
+
+def run_next(size: str,
+             concurrency: Optional[int] = None,
+             budget: Optional[float] = None,
+             dry_run: Optional[bool] = False) -> bool:
+    """Process the next READY task of the day
+
+    Parameters
+    ----------
+    size : str
+        Size of the task
+    concurrency : int
+        Number of items renamed in parallel
+    budget : float
+        Maximum duration of the processing in seconds
+    dry_run : bool
+        If True, the processing of the next task is only simulated, see :func:`estimate`
+
+    Returns
+    -------
+    bool
+        True if a task has been processed until the DONE state
+    """
     task_summary = speibi.TaskSummary()
     if task_summary.get_processing_task() is not None:
         logging.warning('Processing task already exists')
-        return
+        return False
+
+    if dry_run is True:
+        next_tasks = task_summary.tasks.loc[(task_summary.tasks['State'] == 'READY') &
+                                            (task_summary.tasks['Size'] == size) &
+                                            (task_summary.tasks['Scheduled_date'] == date.today().isoformat())]
+        if len(next_tasks) == 0:
+            logging.warning('No task to process')
+        else:
+            logging.info(f'Dry run: next task would be {next_tasks["Directory"].values[0]}')
+            estimate(task_summary.get_task(next_tasks['Directory'].values[0]), concurrency=concurrency)
+        return False
+
     next_task = task_summary.get_next_task(size=size)
     if next_task is None:
         logging.warning('No task to process')
+        return False
+
+    return run(task_summary, next_task, concurrency=concurrency, budget=budget)
+
+
+def run_task(name: str,
+             concurrency: Optional[int] = None,
+             budget: Optional[float] = None,
+             dry_run: Optional[bool] = False) -> None:
+    """Process or resume one task, whatever its scheduled date
+
+    Parameters
+    ----------
+    name : str
+        Name or directory of the task, the task must be READY or PROCESSING
+    concurrency : int
+        Number of items renamed in parallel
+    budget : float
+        Maximum duration of the processing in seconds
+    dry_run : bool
+        If True, the processing is only simulated, see :func:`estimate`
+
+    Returns
+    -------
+    None
+    """
+    task_summary = speibi.TaskSummary()
+    task = task_summary.get_task(name)
+
+    if task is None or task.state not in ['READY', 'PROCESSING']:
+        logging.error(f'{name}: no READY or PROCESSING task with this name')
         return
-    next_task = task_summary.update_task_state(next_task,
-                                               new_state='PROCESSING',
-                                               parameters={'Start_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
-    task_summary.save()
-    logging.info(f'Next task: {next_task.get_name()} => process will start now')
-    process_task(next_task)
+
+    processing_task = task_summary.get_processing_task()
+    if processing_task is not None and processing_task != task:
+        logging.error(f'{processing_task.get_directory()} is already processing')
+        return
+
+    if dry_run is True:
+        estimate(task, concurrency=concurrency)
+        return
+
+    task.copy_to_local()
+    run(task_summary, task, concurrency=concurrency, budget=budget)
+
+
+def run(task_summary: speibi.TaskSummary,
+        task: speibi.Task,
+        concurrency: Optional[int] = None,
+        budget: Optional[float] = None) -> bool:
+    """Process a task and update its state
+
+    The task is DONE once all the barcodes are handled. If the budget is exceeded, the task stays
+    PROCESSING and can be resumed with :func:`run_task`.
+
+    Parameters
+    ----------
+    task_summary : speibi.TaskSummary
+        Task summary
+    task : speibi.Task
+        READY or PROCESSING task
+    concurrency : int
+        Number of items renamed in parallel
+    budget : float
+        Maximum duration of the processing in seconds
+
+    Returns
+    -------
+    bool
+        True if the task is DONE
+    """
+    if task.state == 'READY':
+        task = task_summary.update_task_state(task,
+                                              new_state='PROCESSING',
+                                              parameters={'Start_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+        task_summary.save()
+
+    logging.info(f'Next task: {task.get_name()} => process will start now')
+    completed = process_task(task, concurrency=concurrency, budget=budget)
+
+    if completed is False:
+        logging.warning(f'Task {task.get_name()} => process interrupted, task stays in PROCESSING state')
+        return False
+
     ended_task = task_summary.get_processing_task()
     logging.info(f'Task {ended_task.get_name()} => process ended')
 
-    task_summary.update_task_state(ended_task,
-                                   new_state='DONE',
-                                   parameters={'End_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
+    done_task = task_summary.update_task_state(ended_task,
+                                               new_state='DONE',
+                                               parameters={'End_time': datetime.now().strftime("%Y-%m-%d %H:%M:%S")})
 
-    speibi.LogFile.close_log()
+    # Barcodes with transient errors left by the retry sweeps are processed again by a SMALL task
+    if AUTO_RESTART_TRANSIENT_ERRORS is True and done_task is not None:
+        task_summary.schedule_continuation(done_task)
 
+    return True
 
-def process_task(task: speibi.Task) -> None:
+
+def process_task(task: speibi.Task, concurrency: Optional[int] = None, budget: Optional[float] = None) -> bool:
     """Process a task
 
     Parameters
     ----------
     task : speibi.Task
         Task to process
+    concurrency : int
+        Number of items renamed in parallel
+    budget : float
+        Maximum duration of the processing in seconds
+
+    Returns
+    -------
+    bool
+        True if all the barcodes were handled
+    """
+    log_file = speibi.LogFile(task=task, file_name=task.get_name())
+    try:
+        logging.info(f'START processing task {task.get_name()}')
+
+        # Profile artifacts are saved next to the log of the task
+        with profile(task.get_name(), task.get_directory_path(local=True)):
+            completed = tp.process_task(task, concurrency=concurrency, budget=budget)
+        logging.info(f'END processing task {task.get_name()}')
+    finally:
+        log_file.close()
+
+    return completed
+
+
+def estimate(task: speibi.Task, concurrency: Optional[int] = None) -> None:
+    """Simulate the processing of a task with source reads only
+
+    See :func:`transferprocess.estimate_task`, nothing is written in the destination IZ.
+
+    Parameters
+    ----------
+    task : speibi.Task
+        Task to simulate
+    concurrency : int
+        Number of source items fetched in parallel
 
     Returns
     -------
     None
     """
-    speibi.LogFile(task=task, file_name=task.get_name())
-    logging.info(f'START processing task {task.get_name()}')
-    tp.process_task(task)
-    logging.info(f'END processing task {task.get_name()}')
-    speibi.LogFile()
+    task.copy_to_local()
+    log_file = speibi.LogFile(task=task, file_name=f'{task.get_name()}_dry_run')
+    try:
+        logging.info(f'START dry run of task {task.get_name()}')
+        tp.estimate_task(task, concurrency=concurrency)
+        logging.info(f'END dry run of task {task.get_name()}')
+    finally:
+        log_file.close()
+
+
+def verify(name: str, concurrency: Optional[int] = None) -> None:
+    """Check one task against the source and destination IZ
+
+    The items are reconciled with the form and both sides of the transfer are checked, see
+    :func:`reconciliation.reconcile_task` and :func:`transferprocess.verify_rename`.
+
+    Parameters
+    ----------
+    name : str
+        Name or directory of the task
+    concurrency : int
+        Number of items checked in parallel
+
+    Returns
+    -------
+    None
+    """
+    task = speibi.TaskSummary().get_task(name)
+    if task is None:
+        logging.error(f'{name}: no task with this name')
+        return
+
+    logging.info(f'START verification of task {task.get_name()}')
+    reconciliation.reconcile_task(task, concurrency=concurrency)
+    tp.verify_rename(task, concurrency=concurrency)
+    logging.info(f'END verification of task {task.get_name()}')
+
+
+def stats() -> str:
+    """Build statistics of the task summary
+
+    Returns
+    -------
+    str
+        Number of tasks by state and size, and next scheduled tasks
+    """
+    rows = speibi.TaskSummary.read_rows(['Directory', 'Scheduled_date', 'Size', 'State'])
+
+    counts = {}
+    for row in rows:
+        counts[(row['State'], row['Size'])] = counts.get((row['State'], row['Size']), 0) + 1
+
+    lines = [f'{len(rows)} tasks in the task summary']
+    for state in speibi.STATES:
+        for size in speibi.SIZE:
+            if (state, size) in counts:
+                lines.append(f'    {state} {size}: {counts[(state, size)]}')
+
+    next_tasks = sorted([row for row in rows if row['State'] in ['READY', 'PROCESSING']],
+                        key=lambda row: row['Scheduled_date'] or '')
+    if len(next_tasks) > 0:
+        lines.append('Next tasks:')
+        lines += [f'    {row["Scheduled_date"]} {row["Directory"]}' for row in next_tasks]
+
+    return '\n'.join(lines)
+
+
+def reconcile() -> None:
+    """Reconcile the DONE tasks of the last days with the destination IZ
+
+    Returns
+    -------
+    None
+    """
+    speibi.LogFile(file_name='reconciliation')
+    logging.info('START reconciliation of DONE tasks')
+    reconciliation.reconcile_recent_tasks()
+    logging.info('END reconciliation of DONE tasks')
+    speibi.LogFile.close_log()
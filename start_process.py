@@ -1,16 +1,28 @@
-# This script is used to start the workflow. It takes the size of the dataset as an argument.
+# This script is used to start the workflow.
 #
 # To start the workflow with a small dataset, run the following command:
 # python start_process.py -size SMALL
 #
 # To start the workflow with a large dataset, run the following command:
 # python start_process.py -size LARGE
+#
+# To reconcile the DONE tasks of the last days with the destination IZ, run the following command:
+# python start_process.py -reconcile
+#
+# To start the workflow as a resident process running the SMALL and LARGE tasks according to the schedule:
+# python start_process.py -daemon
+#
+# To measure the import time of the entry points with "-X importtime", run the following command:
+# python start_process.py -bench
+#
+# Each phase of the workflow can also be started alone, see:
+# python start_process.py --help
 
-import sys
 import os
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
-from speibiutils.workflow import start
+# Modules are imported by the selected command only, a run without task doesn't load pandas or almapiwrapper
+if __name__ == '__main__':
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
-if sys.argv[1] == '-size' and sys.argv[2] in ['SMALL', 'LARGE']:
-    start(size=sys.argv[2])
\ No newline at end of file
+    from speibiutils.cli import main
+    main()
@@ -0,0 +1,76 @@
+import unittest
+import os
+from unittest import mock
+
+from speibiutils.almacache import AlmaCache
+
+
+class Test_almacache(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.isfile('./test_data/alma_cache.db'):
+            os.remove('./test_data/alma_cache.db')
+        self.cache = AlmaCache('./test_data/alma_cache.db', ttl=3600, max_size=100)
+
+    def tearDown(self):
+        self.cache.close()
+        os.remove('./test_data/alma_cache.db')
+
+    def test_get_put(self):
+        self.assertIsNone(self.cache.get('UBS', 'P', 'item', 'A1'), 'Record should not be cached')
+        self.cache.put('UBS', 'P', 'item', 'A1', b'<item>A1</item>')
+        self.assertEqual(self.cache.get('UBS', 'P', 'item', 'A1'), b'<item>A1</item>', 'Record should be cached')
+        self.assertIsNone(self.cache.get('UBS', 'S', 'item', 'A1'), 'Environment should be part of the key')
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2), 'Hits and misses should be counted')
+
+        self.cache.close()
+        self.cache = AlmaCache('./test_data/alma_cache.db', ttl=3600, max_size=100)
+        self.assertEqual(self.cache.get('UBS', 'P', 'item', 'A1'), b'<item>A1</item>', 'Cache should persist')
+        self.assertEqual(self.cache.size, 15, 'Size should be read from the database')
+
+    def test_ttl(self):
+        self.cache.put('UBS', 'P', 'item', 'A1', b'<item>A1</item>')
+        self.cache.ttl = -1
+        self.assertIsNone(self.cache.get('UBS', 'P', 'item', 'A1'), 'Cache should be disabled')
+
+        self.cache.close()
+        self.cache = AlmaCache('./test_data/alma_cache.db', ttl=0, max_size=100)
+        self.cache.ttl = 3600
+        self.assertIsNone(self.cache.get('UBS', 'P', 'item', 'A1'), 'Expired record should be removed')
+        self.assertEqual(self.cache.size, 0, 'Cache should be empty')
+
+    def test_eviction_invalidation(self):
+        for barcode in ['A1', 'A2', 'A3']:
+            self.cache.put('UBS', 'P', 'item', barcode, b'x' * 40)
+        self.assertIsNone(self.cache.get('UBS', 'P', 'item', 'A1'), 'Oldest record should be evicted')
+
+        self.cache.get('UBS', 'P', 'item', 'A2')
+        self.cache.put('UBS', 'P', 'item', 'A4', b'x' * 40)
+        self.assertIsNotNone(self.cache.get('UBS', 'P', 'item', 'A2'), 'Recently used record should be kept')
+        self.assertIsNone(self.cache.get('UBS', 'P', 'item', 'A3'), 'Least recently used record should be evicted')
+        self.assertEqual(self.cache.size, 80, 'Size should be updated')
+
+        self.cache.invalidate('UBS', 'P', 'item', ['A2', 'A5'])
+        self.assertIsNone(self.cache.get('UBS', 'P', 'item', 'A2'), 'Invalidated record should be removed')
+        self.assertEqual(self.cache.size, 40, 'Size should be updated')
+
+    def test_get_item_refresh(self):
+        class FakeItem:
+            def __init__(self, barcode, zone, env):
+                self.barcode = barcode
+                self.error = False
+
+            def __bytes__(self):
+                return b'<item>fresh</item>'
+
+        self.cache.put('UBS', 'P', 'item', 'OLD_A1', b'<item>cached</item>')
+        with mock.patch('speibiutils.almacache.Item', FakeItem) as item_class:
+            item = self.cache.get_item('OLD_A1', 'UBS', 'P', refresh=True)
+
+        self.assertIsInstance(item, item_class, 'Item should be fetched from Alma')
+        self.assertEqual(self.cache.get('UBS', 'P', 'item', 'OLD_A1'), b'<item>fresh</item>',
+                         'Cache should be updated with the fetched item')
+
+
+if __name__ == '__main__':
+    unittest.main()
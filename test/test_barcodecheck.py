@@ -0,0 +1,33 @@
+import unittest
+
+from speibiutils import barcodecheck
+
+
+class Test_barcodecheck(unittest.TestCase):
+
+    def test_normalize_barcodes(self):
+        barcodes = barcodecheck.normalize_barcodes([" 'A1001180332' ", '123456.0', '', 'DSV0319573'])
+        self.assertEqual(barcodes.tolist(), ['A1001180332', '123456', 'DSV0319573'],
+                         'Whitespaces, apostrophes, float decimals and empty barcodes should be removed')
+
+    def test_validate_barcodes(self):
+        barcodes = barcodecheck.normalize_barcodes(['A1001180332', 'A100 1180331', '1.23457E+11',
+                                                    'OLD_A1001180330', 'A100#118'])
+        invalid_barcodes = barcodecheck.get_invalid_barcodes(barcodes, 'UBS')
+
+        self.assertEqual(set(invalid_barcodes), {'A100 1180331', '1.23457E+11', 'OLD_A1001180330', 'A100#118'},
+                         'Only the malformed barcodes should be invalid')
+        self.assertEqual(invalid_barcodes['A100 1180331'], 'embedded space', 'Reason should be given')
+        self.assertEqual(invalid_barcodes['1.23457E+11'], 'scientific notation from Excel', 'Reason should be given')
+        self.assertEqual(invalid_barcodes['A100#118'], 'format not valid for IZ UBS', 'Reason should be given')
+
+        barcodecheck.BARCODE_PATTERNS['UBS'] = r'A\d{10}'
+        try:
+            self.assertEqual(list(barcodecheck.get_invalid_barcodes(['A1001180332', 'DSV0319573'], 'UBS')),
+                             ['DSV0319573'], 'Pattern of the source IZ should be used')
+        finally:
+            del barcodecheck.BARCODE_PATTERNS['UBS']
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import unittest
+import os
+import shutil
+import pandas as pd
+
+import speibiutils.speibiutils as speibi
+from speibiutils.barcodeindex import BarcodeIndex
+
+
+class Test_barcodeindex(unittest.TestCase):
+
+    def setUp(self):
+        if os.path.isfile('./test_data/barcode_index.db'):
+            os.remove('./test_data/barcode_index.db')
+        self.barcode_index = BarcodeIndex('./test_data/barcode_index.db')
+
+    def tearDown(self):
+        self.barcode_index.close()
+        os.remove('./test_data/barcode_index.db')
+
+    def test_get_conflicts(self):
+        self.assertTrue(self.barcode_index.created, 'New database should be created')
+        self.barcode_index.set_task_barcodes('sbkubs', 'task_2050-01-01_UBS_LARGE', ['A1', 'A2'], 'READY')
+        self.barcode_index.set_task_barcodes('sbkuzh', 'task_2050-01-01_UZH_SMALL', ['B1'], 'DONE')
+
+        reserved, transferred = self.barcode_index.get_conflicts(['A1', 'B1', 'C1'],
+                                                                 'sbkzbs', 'task_2051-01-01_ZBS_SMALL')
+        self.assertEqual(reserved, {'A1'}, 'A1 should be reserved by another task')
+        self.assertEqual(transferred, {'B1'}, 'B1 should be already transferred')
+
+        reserved, transferred = self.barcode_index.get_conflicts(['A1', 'A2'],
+                                                                 'sbkubs', 'task_2050-01-01_UBS_LARGE')
+        self.assertEqual(len(reserved) + len(transferred), 0, 'Barcodes of the same task are not conflicts')
+
+    def test_state_transitions(self):
+        self.barcode_index.set_task_barcodes('sbkubs', 'task_2050-01-01_UBS_LARGE', ['A1', 'A2'], 'READY')
+        self.barcode_index.update_task_state('sbkubs', 'task_2050-01-01_UBS_LARGE', 'PROCESSING')
+        self.assertEqual(self.barcode_index.get_owners(['A1'])['A1'][2], 'PROCESSING', 'State should be updated')
+
+        self.barcode_index.set_task_barcodes('sbkubs', 'task_2050-01-01_UBS_LARGE', ['A1'], 'DONE')
+        self.assertEqual(set(self.barcode_index.get_owners(['A1', 'A2']).keys()), {'A1'},
+                         'Not copied barcodes should be released')
+
+        self.barcode_index.set_task_barcodes('sbkuzh', 'task_2050-01-01_UZH_SMALL', ['B1'], 'READY')
+        self.barcode_index.prune([])
+        self.assertEqual(len(self.barcode_index.get_owners(['A1', 'B1'])), 1,
+                         'Only barcodes of removed active tasks should be released')
+
+    def test_expire(self):
+        self.barcode_index.set_task_barcodes('sbkubs', 'task_2050-01-01_UBS_LARGE', ['A1'], 'DONE')
+        self.barcode_index.set_task_barcodes('sbkuzh', 'task_2050-01-01_UZH_SMALL', ['B1'], 'READY')
+        with self.barcode_index.connection:
+            self.barcode_index.connection.execute("UPDATE barcodes SET update_time = '2000-01-01 00:00:00'")
+
+        self.barcode_index.expire(30)
+        self.assertEqual(set(self.barcode_index.get_owners(['A1', 'B1']).keys()), {'B1'},
+                         'Only barcodes of old DONE tasks should be released')
+
+    def test_build_from_task_summary(self):
+        self.barcode_index.close()
+        os.remove('./test_data/barcode_index.db')
+
+        # Installation with tasks existing before the barcode index
+        task_dir = './data/sbkubs/download/storage_tasks/task_2050-02-01_UBS_LARGE_PROCESSING'
+        os.makedirs(task_dir, exist_ok=True)
+        shutil.copy('./test_data/test_data.xlsx', f'{task_dir}/task_2050-02-01_UBS_LARGE.xlsx')
+
+        task_summary = object.__new__(speibi.TaskSummary)
+        task_summary.tasks = pd.DataFrame([{'Account': 'sbkubs',
+                                            'Directory': 'task_2050-02-01_UBS_LARGE_PROCESSING',
+                                            'State': 'PROCESSING'}])
+        try:
+            self.barcode_index = task_summary.get_barcode_index('./test_data/barcode_index.db')
+            barcodes = speibi.Task(directory='task_2050-02-01_UBS_LARGE_PROCESSING', account='sbkubs').get_barcodes()
+        finally:
+            shutil.rmtree(task_dir)
+
+        self.assertGreater(len(barcodes), 0, 'Form should have barcodes')
+        owners = self.barcode_index.get_owners(barcodes)
+        self.assertEqual(len(owners), len(barcodes), 'Barcodes of existing tasks should be indexed')
+        self.assertEqual(set(owners.values()), {('sbkubs', 'task_2050-02-01_UBS_LARGE', 'PROCESSING')},
+                         'Barcodes should be reserved by the PROCESSING task')
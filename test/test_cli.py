@@ -0,0 +1,46 @@
+import unittest
+
+from speibiutils.cli import build_parser, get_legacy_arguments
+
+
+class Test_cli(unittest.TestCase):
+
+    def test_legacy_arguments(self):
+        self.assertEqual(get_legacy_arguments(['-size', 'LARGE']), ['start', '--size', 'LARGE'],
+                         '"-size" should start the entire workflow')
+        self.assertEqual(get_legacy_arguments(['-reconcile']), ['reconcile'], '"-reconcile" should be converted')
+        self.assertIsNone(get_legacy_arguments(['stats']), 'Subcommands should not be converted')
+
+    def test_subcommands(self):
+        args = build_parser().parse_args(['run-task', 'task_2041-01-01_UBS_LARGE', '--budget', '600',
+                                          '--concurrency', '3', '--dry-run'])
+        self.assertEqual(args.command, 'run-task', 'Command should be run-task')
+        self.assertEqual(args.name, 'task_2041-01-01_UBS_LARGE', 'Task name should be read')
+        self.assertEqual(args.budget, 600, 'Budget should be 600 seconds')
+        self.assertEqual(args.concurrency, 3, 'Concurrency should be 3')
+        self.assertTrue(args.dry_run, 'Dry run should be enabled')
+
+        with self.assertRaises(SystemExit):
+            build_parser().parse_args(['run-next', '--size', 'MEDIUM'])
+
+    def test_verify_options(self):
+        args = build_parser().parse_args(['verify', 'task_2041-01-01_UBS_LARGE', '--concurrency', '3'])
+        self.assertEqual(args.concurrency, 3, 'Concurrency should be 3')
+
+        for option in ['--dry-run', '--budget=600', '--profile']:
+            with self.assertRaises(SystemExit):
+                build_parser().parse_args(['verify', 'task_2041-01-01_UBS_LARGE', option])
+
+    def test_phase_options(self):
+        args = build_parser().parse_args(['discover', '--dry-run', '--profile'])
+        self.assertTrue(args.dry_run and args.profile, 'Dry run and profiling should be enabled')
+        args = build_parser().parse_args(['check', '--concurrency', '3', '--dry-run'])
+        self.assertEqual(args.concurrency, 3, 'Concurrency should be 3')
+
+        for argv in [['discover', '--concurrency', '3'], ['discover', '--budget', '600'], ['check', '--budget', '600']]:
+            with self.assertRaises(SystemExit):
+                build_parser().parse_args(argv)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+import os
+import logging
+from unittest import mock
+from datetime import datetime, timedelta
+
+import config
+from speibiutils import daemon, logqueue
+from speibiutils.daemon import get_due_size
+
+
+class Test_daemon(unittest.TestCase):
+
+    def test_get_due_size(self):
+        large_hour = config.LARGE_TASK_HOUR % 24
+        now = datetime.now().replace(hour=large_hour, minute=5)
+        self.assertEqual(get_due_size(now, None, None), 'LARGE', 'LARGE tasks should run at LARGE_TASK_HOUR')
+        self.assertIsNone(get_due_size(now, None, now.date()), 'LARGE tasks should run only once a day')
+
+        now = now.replace(hour=(large_hour + 1) % 24)
+        self.assertEqual(get_due_size(now, None, None), 'SMALL', 'SMALL tasks should run outside of LARGE hour')
+        self.assertIsNone(get_due_size(now, now - timedelta(seconds=10), None),
+                          'SMALL tasks should wait for the interval')
+        self.assertEqual(get_due_size(now, now - timedelta(seconds=config.DAEMON_SMALL_INTERVAL_SECONDS), None),
+                         'SMALL', 'SMALL tasks should run again after the interval')
+
+    def test_run_once_logs(self):
+        def start(size):
+            # Like workflow.start, the run opens the main log file
+            logqueue.set_main_log('./test_data/log_main_test.txt')
+            logging.info(f'workflow message {size}')
+
+        token = logqueue.open_task_log('daemon', './test_data/log_daemon_test.txt')
+        try:
+            with mock.patch.object(daemon, 'start', side_effect=start):
+                daemon.Daemon().run_once('SMALL')
+                logging.info('daemon message after run')
+        finally:
+            logqueue.close_task_log(token)
+            logqueue.stop()
+
+        with open('./test_data/log_daemon_test.txt') as f:
+            daemon_log = f.read()
+        with open('./test_data/log_main_test.txt') as f:
+            main_log = f.read()
+        for file_name in ['log_daemon_test.txt', 'log_main_test.txt']:
+            os.remove(f'./test_data/{file_name}')
+
+        self.assertIn('daemon message after run', daemon_log, 'Daemon records should stay in the daemon log')
+        self.assertNotIn('workflow message', daemon_log, 'Records of the run should not be in the daemon log')
+        self.assertIn('workflow message SMALL', main_log, 'Records of the run should be in the main log')
+        self.assertNotIn('daemon message', main_log, 'Daemon records should not be in the main log')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+import os
+import pandas as pd
+
+from speibiutils import excelpool
+
+
+class Test_excelpool(unittest.TestCase):
+
+    def test_read_sheets(self):
+        sheets = excelpool.read_sheets('./test_data/test_data.xlsx', ['Items', 'Locations_mapping'])
+        expected = pd.read_excel('./test_data/test_data.xlsx', sheet_name='Locations_mapping', dtype=str)
+
+        self.assertEqual(sorted(sheets.keys()), ['Items', 'Locations_mapping'], 'Both sheets should be parsed')
+        self.assertEqual(len(sheets['Items']['Barcode'].dropna()), 5, 'Form should have 5 barcodes')
+        self.assertEqual(sheets['Locations_mapping'].fillna('').values.tolist(), expected.fillna('').values.tolist(),
+                        'Tables should be the same as with "read_excel"')
+
+    def test_write_excel(self):
+        df = pd.DataFrame([['UBS', 'task_2041-01-01_UBS_LARGE_NEW', '']],
+                          columns=['Account', 'Directory', 'Message'])
+        excelpool.write_excel(df, './test_data/excelpool_test.xlsx')
+
+        df_read = excelpool.read_sheets('./test_data/excelpool_test.xlsx', [0])[0].fillna('')
+        self.assertEqual(list(df_read.columns), list(df.columns), 'Columns should be read back unchanged')
+        self.assertEqual(df_read.values.tolist(), df.values.tolist(), 'Rows should be read back unchanged')
+
+    @classmethod
+    def tearDownClass(cls):
+        excelpool.shutdown()
+        if os.path.exists('./test_data/excelpool_test.xlsx'):
+            os.remove('./test_data/excelpool_test.xlsx')
+
+
+if __name__ == '__main__':
+    unittest.main()
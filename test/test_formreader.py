@@ -0,0 +1,38 @@
+import unittest
+
+from speibiutils.formreader import FormReader
+
+
+class Test_formreader(unittest.TestCase):
+
+    def test_sheet_names(self):
+        with FormReader('./test_data/test_data.xlsx') as form:
+            self.assertEqual(form.sheet_names,
+                             ['General', 'Items', 'Locations_mapping', 'Item_policies_mapping', 'data_validation'],
+                             'Sheet names should be in the order of the workbook')
+
+        with FormReader('./test_data/test_data_bad1.xlsx') as form:
+            self.assertFalse('General' in form.sheet_names, 'Bad form has no "General" sheet')
+
+    def test_get_cells(self):
+        with FormReader('./test_data/test_data.xlsx') as form:
+            self.assertEqual(form.get_cells('data_validation', ['D2'])['D2'], 'v1.0', 'Version should be v1.0')
+            self.assertEqual(form.get_cells('General', ['B3', 'B4', 'Z99']),
+                             {'B3': 'UBS', 'B4': 'ISR', 'Z99': None},
+                             'Source and destination IZ should be read, empty cells are None')
+
+    def test_read_column(self):
+        with FormReader('./test_data/test_data.xlsx') as form:
+            barcodes = form.read_column('Items', 'Barcode')
+            self.assertEqual(len(barcodes), 5, 'Form should have 5 barcodes')
+            self.assertTrue('A1001180331' in barcodes, 'Barcode A1001180331 should be in the form')
+            self.assertIsNone(form.read_column('Items', 'Barcode', max_values=4),
+                              'Reading should be aborted when there are too many barcodes')
+
+    def test_read_rows(self):
+        with FormReader('./test_data/test_data.xlsx') as form:
+            rows = form.read_rows('Locations_mapping', ['Source library code', 'Destination location code'])
+            self.assertEqual(rows[1], {'Source library code': 'A100', 'Destination location code': '610940001'},
+                             'Values of the selected columns should be read')
+            self.assertIsNone(rows[0]['Destination location code'], 'Empty cells should be None')
+            self.assertEqual(form.read_column('Items', 'Missing header'), [], 'Unknown header gives no values')
@@ -0,0 +1,54 @@
+import unittest
+import os
+import json
+import logging
+import threading
+
+from speibiutils import logqueue
+
+
+class Test_logqueue(unittest.TestCase):
+
+    def tearDown(self):
+        logqueue.stop()
+        for file_name in ['log_main_test.txt', 'log_task_test.txt']:
+            if os.path.exists(f'./test_data/{file_name}'):
+                os.remove(f'./test_data/{file_name}')
+
+    def test_task_log(self):
+        logqueue.set_main_log('./test_data/log_main_test.txt')
+        logging.info('main message')
+
+        token = logqueue.open_task_log('task_test', './test_data/log_task_test.txt')
+        logging.info('task message')
+
+        # Threads started with the context of the task log in the file of the task
+        thread = threading.Thread(target=logqueue.with_context(lambda: logging.info('thread message')))
+        thread.start()
+        thread.join()
+        logqueue.close_task_log(token)
+
+        logging.info('main message after task')
+        logqueue.flush()
+
+        with open('./test_data/log_main_test.txt') as f:
+            main_log = f.read()
+        with open('./test_data/log_task_test.txt') as f:
+            task_log = f.read()
+
+        self.assertIn('main message after task', main_log, 'Records without task should be in the main log')
+        self.assertNotIn('task message', main_log, 'Records of the task should not be in the main log')
+        self.assertIn('task message', task_log, 'Records of the task should be in the task log')
+        self.assertIn('thread message', task_log, 'Records of the threads should be in the task log')
+        self.assertNotIn('main message', task_log, 'Records without task should not be in the task log')
+
+    def test_json_lines_formatter(self):
+        record = logging.makeLogRecord({'msg': 'message %s', 'args': ('test',), 'levelname': 'INFO',
+                                        'task': 'task_test'})
+        data = json.loads(logqueue.JsonLinesFormatter().format(record))
+        self.assertEqual(data['message'], 'message test', 'Message should be formatted')
+        self.assertEqual(data['task'], 'task_test', 'Task should be in the json line')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import threading
+import time
+
+from speibiutils.pipeline import Pipeline, Stage
+
+
+class Test_pipeline(unittest.TestCase):
+
+    def test_run(self):
+        threads = {}
+
+        def double(job):
+            return 'route', {'double': job['value'] * 2}
+
+        def route(job):
+            threads.setdefault(job['value'] % 3, set()).add(threading.current_thread().name)
+            return None, {'routed': True}
+
+        results = {}
+
+        def on_result(job, values, finished):
+            results.setdefault(job['value'], {}).update(values)
+            results[job['value']]['finished'] = finished
+
+        pipeline = Pipeline('test', [Stage('double', double, concurrency=3, queue_size=2),
+                                     Stage('route', route, concurrency=3, key=lambda job: job['value'] % 3,
+                                           queue_size=2)])
+        completed = pipeline.run([{'value': i} for i in range(30)], on_result)
+
+        self.assertTrue(completed, 'All the jobs should be handled')
+        self.assertEqual(len(results), 30, 'Coordinator should receive all the jobs')
+        self.assertTrue(all(result['finished'] is True and result['routed'] is True for result in results.values()),
+                        'Jobs should go through all the stages')
+        self.assertEqual(results[7]['double'], 14, 'Values of each stage should be given to the coordinator')
+        self.assertTrue(all(len(names) == 1 for names in threads.values()),
+                        'Jobs with the same key should be handled by the same worker')
+        self.assertEqual(pipeline.stages['route'].handled, 30, 'Handled jobs should be counted')
+
+    def test_stop_and_error(self):
+        def slow(job):
+            time.sleep(0.01)
+            return None, {}
+
+        finished = []
+        completed = Pipeline('test', [Stage('slow', slow)]).run([{'value': i} for i in range(100)],
+                                                                lambda job, values, done: finished.append(job),
+                                                                stop=lambda: len(finished) >= 3)
+        self.assertFalse(completed, 'Pipeline should be stopped')
+        self.assertLess(len(finished), 100, 'No new job should be started once stopped')
+
+        def fail(job):
+            if job['value'] == 5:
+                raise ValueError('failure')
+            return None, {}
+
+        with self.assertRaises(ValueError):
+            Pipeline('test', [Stage('fail', fail, concurrency=2)]).run([{'value': i} for i in range(20)],
+                                                                       lambda job, values, done: None)
+
+    def test_system_exit(self):
+        def exit_on_quota(job):
+            if job['value'] == 5:
+                # almapiwrapper exits when the API calls fail or the quota is low
+                raise SystemExit(1)
+            return None, {}
+
+        finished = []
+        pipeline = Pipeline('test', [Stage('exit', exit_on_quota, concurrency=2)])
+        with self.assertRaises(SystemExit):
+            pipeline.run([{'value': i} for i in range(20)], lambda job, values, done: finished.append(job))
+
+        self.assertTrue(all(job['value'] != 5 for job in finished), 'Failed job should not be given to the coordinator')
+
+
+if __name__ == '__main__':
+    unittest.main()
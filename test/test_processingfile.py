@@ -0,0 +1,52 @@
+import unittest
+import os
+
+from speibiutils import processingfile
+
+
+class Test_processingfile(unittest.TestCase):
+
+    def tearDown(self):
+        if os.path.exists('./test_data/test_items_processing.csv'):
+            os.remove('./test_data/test_items_processing.csv')
+
+    def test_read_previous_format(self):
+        df = processingfile.read_processing_file(
+            './test_data/task_today_UZB_SMALL_NEW/task_today_UZB_LARGE_items_processing.csv')
+
+        self.assertEqual(list(df.columns), list(processingfile.PROCESSING_FILE_SCHEMA),
+                         'Columns of the schema should be added to previous processing files')
+        self.assertEqual(str(df['Copied'].dtype), 'boolean', '"Copied" should be boolean')
+        self.assertTrue(df['Renamed'].equals(df['Copied']), '"Renamed" should be copied from "Copied"')
+        self.assertEqual(df.loc[0, 'MMS_id_s'], '9926054560105504', 'Alma ids should be read as strings')
+
+    def test_round_trip(self):
+        df = processingfile.new_processing_file(['A1', 'A2', 'A3'])
+        df.loc[df.Barcode == 'A1', ['Item_id_d', 'Copied', 'Renamed']] = ['2330924810005525', True, True]
+        processingfile.set_error(df, df.Barcode == 'A2', 'unknown_holding_error')
+        processingfile.set_error(df, df.Barcode == 'A3', 'new error')
+
+        processingfile.write_processing_file(df, './test_data/test_items_processing.csv')
+        df_read = processingfile.read_processing_file('./test_data/test_items_processing.csv')
+
+        self.assertTrue(df_read.equals(df), 'Processing data should be the same after writing and reading')
+        self.assertTrue(df_read.dtypes.equals(df.dtypes), 'Dtypes should be the same after writing and reading')
+        self.assertEqual(df_read['Error_category'].tolist()[1:], ['holding', processingfile.OTHER_ERROR_CATEGORY],
+                         'Category should be set with the error')
+        self.assertEqual(df_read['Copied'].tolist(), [True, False, False], 'Missing booleans should be False')
+
+    def test_get_transient_rows(self):
+        df = processingfile.new_processing_file(['A1', 'A2', 'A3', 'A4'])
+        processingfile.set_error(df, df.Barcode.isin(['A1', 'A2']), 'error_503_failed_to_create')
+        processingfile.set_error(df, df.Barcode == 'A3', 'Location not existing in location table')
+        df.loc[df.Barcode == 'A2', 'Copied'] = True
+
+        self.assertEqual(df.loc[processingfile.get_transient_rows(df), 'Barcode'].tolist(), ['A1'],
+                         'Only the barcodes not copied with a transient error should be retried')
+
+        processingfile.set_error(df, processingfile.get_transient_rows(df), None)
+        self.assertTrue(df.loc[0, ['Error', 'Error_category']].isna().all(), 'Error should be removed')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import os
+import shutil
+import threading
+
+from speibiutils import profiling
+
+
+class Test_profiling(unittest.TestCase):
+
+    def tearDown(self):
+        profiling.enable(None)
+        shutil.rmtree('./test_data/profiling', ignore_errors=True)
+
+    def test_profile(self):
+        profiling.enable(False)
+        with profiling.profile('disabled', './test_data/profiling'):
+            sum(range(1000))
+        self.assertFalse(os.path.exists('./test_data/profiling'), 'Nothing should be saved when disabled')
+
+        profiling.enable()
+
+        def work():
+            return [str(i) for i in range(10000)]
+
+        with profiling.profile('task', './test_data/profiling'):
+            thread = threading.Thread(target=profiling.profile_thread(work))
+            thread.start()
+            thread.join()
+            with profiling.profile('nested', './test_data/profiling'):
+                work()
+
+        self.assertTrue(os.path.isfile('./test_data/profiling/profile_task.prof'), 'CPU profile should be saved')
+        self.assertTrue(os.path.isfile('./test_data/profiling/memory_task.txt'), 'Memory report should be saved')
+        self.assertFalse(os.path.exists('./test_data/profiling/profile_nested.prof'),
+                         'Nested blocks should be profiled with the session in progress')
+
+        with open('./test_data/profiling/profile_task.prof', 'rb') as f:
+            self.assertGreater(len(f.read()), 0, 'CPU profile should not be empty')
+
+    def test_is_enabled(self):
+        os.environ[profiling.PROFILE_ENV_VAR] = '1'
+        try:
+            self.assertTrue(profiling.is_enabled(), 'Profiling should be enabled by the environment variable')
+            profiling.enable(False)
+            self.assertFalse(profiling.is_enabled(), 'Option should override the environment variable')
+        finally:
+            del os.environ[profiling.PROFILE_ENV_VAR]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,34 @@
+import unittest
+import time
+
+from speibiutils.ratelimiter import RateLimiter, ApiCallStatistics
+
+
+class Test_ratelimiter(unittest.TestCase):
+
+    def test_acquire(self):
+        limiter = RateLimiter(50)
+        start_time = time.monotonic()
+        for _ in range(6):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - start_time, 0.09, 'Calls should be spaced out')
+
+    def test_api_call_statistics(self):
+        statistics = ApiCallStatistics()
+        self.assertIsNone(statistics.get_mean_duration(), 'No mean duration without call')
+
+        statistics.add('get', 0.2, 10000)
+        statistics.add('get', 0.4)
+        statistics.add('put', 0.6, 9998)
+        self.assertEqual(statistics.get_total_calls(), 3, 'Three calls should be counted')
+        self.assertAlmostEqual(statistics.get_mean_duration('get'), 0.3, msg='Mean duration of GET should be 0.3')
+        self.assertAlmostEqual(statistics.get_mean_duration(), 0.4, msg='Mean duration should be 0.4')
+        self.assertEqual(statistics.remaining, 9998, 'Remaining quota should come from the last response')
+
+        statistics.reset()
+        self.assertEqual(statistics.get_total_calls(), 0, 'Statistics should be empty after reset')
+        self.assertEqual(statistics.remaining, 9998, 'Remaining quota should be kept after reset')
+
+
+if __name__ == '__main__':
+    unittest.main()
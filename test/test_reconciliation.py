@@ -0,0 +1,171 @@
+import unittest
+import os
+from unittest import mock
+import pandas as pd
+from lxml import etree
+from datetime import date, timedelta
+
+from speibiutils import almacache, processingfile
+from speibiutils import reconciliation
+
+
+class FakeItem:
+    def __init__(self, error=False, ids=('I1', 'H1', 'M1'), library='LIB_D', location='LOC_D', policy='POL_D'):
+        self.error = error
+        self.ids = ids
+        self.library = library
+        self.location = location
+        self.data = etree.fromstring(f'<item><item_data><policy>{policy}</policy></item_data></item>')
+
+    def get_item_id(self):
+        return self.ids[0]
+
+    def get_holding_id(self):
+        return self.ids[1]
+
+    def get_mms_id(self):
+        return self.ids[2]
+
+
+class FakeTask:
+    def __init__(self):
+        self.uploaded = []
+
+    @staticmethod
+    def is_valid():
+        return True
+
+    @staticmethod
+    def get_name():
+        return 'task_2050-01-01_UBS_LARGE'
+
+    @staticmethod
+    def copy_to_local(sftp=None):
+        pass
+
+    @staticmethod
+    def get_processing_file_path(local=False):
+        return './test_data/test_items_processing.csv'
+
+    def upload_files(self, paths, sftp=None):
+        self.uploaded += paths
+
+
+ROW = {'Barcode': 'A1', 'Item_id_d': 'I1', 'Holding_id_d': 'H1', 'MMS_id_d': 'M1'}
+
+PARAMETERS = {'iz_s': 'UBS', 'iz_d': 'HPH', 'env': 'S'}
+
+LOCATIONS_TABLE = pd.DataFrame([['LIB_S', 'LOC_S', 'LIB_D', 'LOC_D']],
+                               columns=['Source library code', 'Source location code',
+                                        'Destination library code', 'Destination location code'])
+
+ITEM_POLICIES_TABLE = pd.DataFrame([['POL_S', 'POL_D']],
+                                   columns=['Source item policy code', 'Destination item policy code'])
+
+
+def compare_item(item_d: FakeItem, item_s: FakeItem, row: dict = None) -> list:
+    """Compare fake destination and source items with the expected values of a row"""
+    cache = mock.Mock()
+    cache.get_item.return_value = item_s
+    with mock.patch.object(reconciliation, 'Item', return_value=item_d), \
+            mock.patch.object(almacache, 'get_cache', return_value=cache):
+        differences = reconciliation.compare_item(row or ROW, PARAMETERS, LOCATIONS_TABLE, ITEM_POLICIES_TABLE)
+
+    cache.get_item.assert_called_with('OLD_A1', 'UBS', 'S', refresh=True)
+    return differences
+
+
+class Test_reconciliation(unittest.TestCase):
+
+    def tearDown(self):
+        for path in ['./test_data/test_items_processing.csv', './test_data/test_items_reconciliation.csv']:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def test_compare_item_matching(self):
+        self.assertEqual(compare_item(FakeItem(), FakeItem(library='LIB_S', location='LOC_S', policy='POL_S')), [],
+                         'Item transferred as expected should have no difference')
+
+    def test_compare_item_missing_source(self):
+        differences = compare_item(FakeItem(), FakeItem(error=True))
+        self.assertEqual(differences, [{'Barcode': 'A1', 'Field': 'source_barcode', 'Expected': 'OLD_A1',
+                                        'Found': None}],
+                         'Source item without "OLD_" barcode should be reported, mappings are not checked')
+
+        differences = compare_item(FakeItem(error=True), FakeItem(error=True))
+        self.assertEqual([difference['Field'] for difference in differences], ['source_barcode', 'destination_item'],
+                         'Missing destination item should be reported')
+
+    def test_compare_item_ids(self):
+        differences = compare_item(FakeItem(ids=('I2', 'H1', 'M2')),
+                                   FakeItem(library='LIB_S', location='LOC_S', policy='POL_S'))
+        self.assertEqual(differences, [{'Barcode': 'A1', 'Field': 'item_id', 'Expected': 'I1', 'Found': 'I2'},
+                                       {'Barcode': 'A1', 'Field': 'mms_id', 'Expected': 'M1', 'Found': 'M2'}],
+                         'Item and MMS ids should be compared')
+
+        differences = compare_item(FakeItem(ids=('I1', 'H2', 'M1')),
+                                   FakeItem(library='LIB_S', location='LOC_S', policy='POL_S'))
+        self.assertEqual([difference['Field'] for difference in differences], ['holding_id'],
+                         'Holding id should be compared')
+
+    def test_compare_item_mappings(self):
+        differences = compare_item(FakeItem(library='LIB_X', location='LOC_X', policy='POL_X'),
+                                   FakeItem(library='LIB_S', location='LOC_S', policy='POL_S'))
+        self.assertEqual(differences, [{'Barcode': 'A1', 'Field': 'library', 'Expected': 'LIB_D', 'Found': 'LIB_X'},
+                                       {'Barcode': 'A1', 'Field': 'location', 'Expected': 'LOC_D', 'Found': 'LOC_X'},
+                                       {'Barcode': 'A1', 'Field': 'policy', 'Expected': 'POL_D', 'Found': 'POL_X'}],
+                         'Library, location and policy should follow the mapping tables')
+
+        differences = compare_item(FakeItem(), FakeItem(library='LIB_U', location='LOC_U', policy='POL_U'))
+        self.assertEqual([(difference['Field'], difference['Expected']) for difference in differences],
+                         [('library', None), ('location', None), ('policy', None)],
+                         'Source values missing in the mapping tables should be reported')
+
+    def test_reconcile_task(self):
+        df = processingfile.new_processing_file(['A1', 'A2', 'A3'])
+        df.loc[:, ['Item_id_d', 'Holding_id_d', 'MMS_id_d']] = ['I1', 'H1', 'M1']
+        df.loc[df.Barcode != 'A3', 'Copied'] = True
+        task = FakeTask()
+
+        def compare(row, parameters, locations_table, item_policies_table):
+            if row['Barcode'] == 'A2':
+                return [{'Barcode': 'A2', 'Field': 'location', 'Expected': 'LOC_D', 'Found': 'LOC_X'}]
+            return []
+
+        with mock.patch.object(reconciliation, 'compare_item', side_effect=compare) as compare_mock, \
+                mock.patch.object(reconciliation.tp, 'load_processing_file', return_value=df), \
+                mock.patch.object(reconciliation.tp, 'get_form_parameters', return_value=PARAMETERS), \
+                mock.patch.object(reconciliation.tp, 'load_mapping_tables',
+                                  return_value=(LOCATIONS_TABLE, ITEM_POLICIES_TABLE)), \
+                mock.patch.object(almacache, 'get_cache'):
+            report = reconciliation.reconcile_task(task, sftp=mock.Mock(), concurrency=2)
+
+        self.assertEqual(compare_mock.call_count, 2, 'Only copied items should be compared')
+        self.assertEqual(report.to_dict('records'),
+                         [{'Barcode': 'A2', 'Field': 'location', 'Expected': 'LOC_D', 'Found': 'LOC_X'}],
+                         'Differences should be in the report')
+
+        saved_report = pd.read_csv('./test_data/test_items_reconciliation.csv')
+        self.assertEqual(list(saved_report.columns), reconciliation.REPORT_COLUMNS, 'Report should be saved')
+        self.assertEqual(saved_report['Barcode'].tolist(), ['A2'], 'Saved report should have the differences')
+        self.assertEqual(task.uploaded, ['./test_data/test_items_reconciliation.csv'], 'Report should be uploaded')
+
+    def test_reconcile_recent_tasks(self):
+        recent_date = (date.today() - timedelta(days=2)).isoformat()
+        task_summary = mock.Mock()
+        task_summary.tasks = pd.DataFrame([['sbkubs', f'task_{recent_date}_UBS_LARGE_DONE', 'DONE'],
+                                           ['sbkubs', 'task_2000-01-01_UBS_LARGE_DONE', 'DONE'],
+                                           ['sbkuzh', f'task_{recent_date}_UZH_SMALL_READY', 'READY']],
+                                          columns=['Account', 'Directory', 'State'])
+
+        with mock.patch.object(reconciliation.speibi, 'TaskSummary', return_value=task_summary), \
+                mock.patch.object(reconciliation, 'reconcile_task') as reconcile_task:
+            reconciliation.reconcile_recent_tasks(concurrency=2)
+
+        self.assertEqual([call.args[0].get_directory() for call in reconcile_task.call_args_list],
+                         [f'task_{recent_date}_UBS_LARGE_DONE'],
+                         'Only the DONE tasks of the retention period should be reconciled')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import os
+import shutil
+import zipfile
+from unittest import mock
+from almapiwrapper.inventory import Item
+from almapiwrapper.record import XmlData
+
+from speibiutils.recordarchive import RecordArchive
+
+
+class Test_recordarchive(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if os.path.exists('./test_data/records_archive'):
+            shutil.rmtree('./test_data/records_archive')
+        os.mkdir('./test_data/records_archive')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree('./test_data/records_archive')
+
+    def test_add_and_get_records(self):
+        archive_path = './test_data/records_archive/task_2050-01-01_UBS_LARGE_records.zip'
+        item = Item(zone='UBS', env='P',
+                    data=XmlData(filepath='./records/UBS_9926054130105504/'
+                                          'item_22188447070005504_23188447060005504_01.xml'))
+        barcode = item.barcode
+
+        archive = RecordArchive(archive_path)
+        archive.add(item, barcode)
+        archive.add(item, barcode)
+        archive.close()
+
+        self.assertTrue(os.path.isfile(archive_path), 'Archive should be created')
+        self.assertEqual(len(RecordArchive.read_index(archive_path)), 2, 'Index should have 2 rows')
+        self.assertEqual(RecordArchive.read_index(archive_path)[1]['Entry'],
+                         'UBS_9926054130105504/item_22188447070005504_23188447060005504_02.xml',
+                         'Second snapshot should have version 02')
+
+        records = RecordArchive.get_records(archive_path, barcode=barcode)
+        self.assertEqual(len(records), 2, 'Two snapshots should be found by barcode')
+        self.assertTrue(barcode in records[0], 'Snapshot should contain the barcode')
+
+        records = RecordArchive.get_records(archive_path, record_id='23188447060005504')
+        self.assertEqual(len(records), 2, 'Two snapshots should be found by item ID')
+
+        # Archive is extended when the task is restarted
+        archive = RecordArchive(archive_path)
+        archive.add(item, barcode)
+        archive.close()
+        self.assertEqual(RecordArchive.read_index(archive_path)[2]['Entry'],
+                         'UBS_9926054130105504/item_22188447070005504_23188447060005504_03.xml',
+                         'Versions should continue after restart')
+
+    def test_flush_error(self):
+        archive_path = './test_data/records_archive/task_2050-01-02_UBS_LARGE_records.zip'
+        item = Item(zone='UBS', env='P',
+                    data=XmlData(filepath='./records/UBS_9926054130105504/'
+                                          'item_22188447070005504_23188447060005504_01.xml'))
+
+        archive = RecordArchive(archive_path)
+
+        # Invalid content, the snapshot is not written but the writer thread is not stopped
+        with self.assertLogs(level='ERROR'):
+            archive._flush([(None, {'Entry': 'UBS_9926054130105504/bad_01.xml'})])
+
+        archive.add(item, item.barcode)
+        with self.assertLogs(level='ERROR'):
+            self.assertFalse(archive.close(), 'Closing should report the snapshot not written')
+        self.assertEqual(archive.lost, 1, 'Invalid snapshot should be counted as lost')
+        self.assertEqual(len(RecordArchive.read_index(archive_path)), 1, 'Next snapshots should be written')
+
+    def test_index_error(self):
+        archive_path = './test_data/records_archive/task_2050-01-03_UBS_LARGE_records.zip'
+        item = Item(zone='UBS', env='P',
+                    data=XmlData(filepath='./records/UBS_9926054130105504/'
+                                          'item_22188447070005504_23188447060005504_01.xml'))
+
+        archive = RecordArchive(archive_path)
+        snapshot = (str(item), {'Barcode': item.barcode, 'Record_type': 'item', 'Zone': 'UBS',
+                                'MMS_id': '9926054130105504', 'Holding_id': '22188447070005504',
+                                'Item_id': '23188447060005504', 'Entry': 'UBS_9926054130105504/item_'
+                                '22188447070005504_23188447060005504_01.xml', 'Saved_time': ''})
+
+        # Zip is extended but the index can't be written, the batch is retried when closing
+        with mock.patch.object(archive, '_write_index', side_effect=OSError('disk full')), \
+                self.assertLogs(level='ERROR'):
+            self.assertFalse(archive._flush([snapshot]), 'Failed batch should be reported')
+
+        self.assertTrue(archive.close(), 'Failed batch should be written when closing')
+        with zipfile.ZipFile(archive_path) as f:
+            self.assertEqual(len(f.namelist()), 1, 'Entry should not be written twice')
+        self.assertEqual(len(RecordArchive.read_index(archive_path)), 1, 'Index row should be written')
+
+    def test_restart_without_index(self):
+        archive_path = './test_data/records_archive/task_2050-01-04_UBS_LARGE_records.zip'
+        item = Item(zone='UBS', env='P',
+                    data=XmlData(filepath='./records/UBS_9926054130105504/'
+                                          'item_22188447070005504_23188447060005504_01.xml'))
+
+        archive = RecordArchive(archive_path)
+        archive.add(item, item.barcode)
+        archive.close()
+
+        # Process stopped after writing the zip and before writing the index
+        os.remove(RecordArchive.get_index_path(archive_path))
+
+        with self.assertLogs(level='WARNING'):
+            archive = RecordArchive(archive_path)
+        archive.add(item, item.barcode)
+        archive.close()
+
+        rows = RecordArchive.read_index(archive_path)
+        self.assertEqual([row['Entry'] for row in rows],
+                         ['UBS_9926054130105504/item_22188447070005504_23188447060005504_01.xml',
+                          'UBS_9926054130105504/item_22188447070005504_23188447060005504_02.xml'],
+                         'Missing row should be rebuilt and versions should continue')
+        self.assertEqual(rows[0]['Item_id'], '23188447060005504', 'Rebuilt row should have the item ID')
+        self.assertEqual(len(RecordArchive.get_records(archive_path, record_id='23188447060005504')), 2,
+                         'Rebuilt row should allow to find the snapshot')
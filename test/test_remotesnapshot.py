@@ -0,0 +1,77 @@
+import unittest
+import os
+import shutil
+from types import SimpleNamespace
+
+from speibiutils.remotesnapshot import RemoteSnapshot
+
+
+class LocalSFTP:
+    """Local directories with the interface of the SFTP class used by the snapshot"""
+    def __init__(self):
+        self.nb_listings = 0
+
+    @staticmethod
+    def get_mtime(path):
+        return int(os.stat(path).st_mtime) if os.path.exists(path) else None
+
+    @staticmethod
+    def mkdir(path):
+        os.makedirs(path)
+
+    def listdir_attr(self, path):
+        self.nb_listings += 1
+        return [SimpleNamespace(filename=entry.name, st_mode=entry.stat().st_mode) for entry in os.scandir(path)]
+
+
+class Test_remotesnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = './test_data/snapshot_test'
+        self.snapshot_path = './test_data/snapshot_test.json'
+        os.makedirs(f'{self.directory}/task_2041-01-01_UBS_LARGE_NEW')
+        with open(f'{self.directory}/task_summary.xlsx', 'w') as f:
+            f.write('')
+
+        # Directory modified long before the listing
+        os.utime(self.directory, (0, 1000000000))
+
+    def test_listdir(self):
+        sftp = LocalSFTP()
+        snapshot = RemoteSnapshot(self.snapshot_path)
+        self.assertEqual(snapshot.listdir(sftp, self.directory, directories_only=True),
+                         ['task_2041-01-01_UBS_LARGE_NEW'], 'Only directories should be listed')
+        self.assertEqual(snapshot.listdir(sftp, self.directory),
+                         ['task_2041-01-01_UBS_LARGE_NEW', 'task_summary.xlsx'], 'All entries should be listed')
+        self.assertTrue(snapshot.has_changed(), 'First listing is a change')
+        snapshot.save()
+
+        # Run stopped before the changes were handled
+        snapshot = RemoteSnapshot(self.snapshot_path)
+        snapshot.listdir(sftp, self.directory, directories_only=True)
+        self.assertTrue(snapshot.has_changed(), 'Saved changes should stay pending until they are handled')
+        snapshot.save()
+        RemoteSnapshot(self.snapshot_path).mark_handled()
+
+        snapshot = RemoteSnapshot(self.snapshot_path)
+        snapshot.listdir(sftp, self.directory, directories_only=True)
+        self.assertEqual(sftp.nb_listings, 2, 'Unchanged directory should not be listed again')
+        self.assertFalse(snapshot.has_changed(), 'Nothing changed')
+
+        os.makedirs(f'{self.directory}/task_2041-01-02_UBS_LARGE_NEW')
+        os.utime(self.directory, (0, 1000000100))
+        self.assertEqual(len(snapshot.listdir(sftp, self.directory, directories_only=True)), 2,
+                         'New directory should be listed')
+        self.assertTrue(snapshot.has_changed(), 'Modified directory is a change')
+
+        self.assertEqual(snapshot.listdir(sftp, f'{self.directory}/missing'), [],
+                         'Missing directory should be created')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        if os.path.exists(self.snapshot_path):
+            os.remove(self.snapshot_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -80,4 +80,54 @@ class Test_sftp(unittest.TestCase):
         self.assertTrue('task_2020-01-01_UBS_SMALL_NEW' in files)
         self.assertFalse('task_2020-01-01_UBS_LARGE_NEW' in files)
         sftp.rename('./storage_tasks_sftp_test/task_2020-01-01_UBS_SMALL_NEW',
-                    './storage_tasks_sftp_test/task_2020-01-01_UBS_LARGE_NEW')
\ No newline at end of file
+                    './storage_tasks_sftp_test/task_2020-01-01_UBS_LARGE_NEW')
+
+    def test_rmtree(self):
+        sftp.mkdir('./storage_tasks_sftp_test/test_rmtree')
+        sftp.mkdir('./storage_tasks_sftp_test/test_rmtree/sub')
+        sftp.put('./test_data/test.txt', './storage_tasks_sftp_test/test_rmtree/test.txt')
+        sftp.put('./test_data/test.txt', './storage_tasks_sftp_test/test_rmtree/sub/test.txt')
+
+        errors = sftp.rmtree('./storage_tasks_sftp_test/test_rmtree')
+        self.assertEqual(len(errors), 0)
+        self.assertFalse(sftp.is_path('./storage_tasks_sftp_test/test_rmtree'))
+
+    def test_put_many_get_many(self):
+        sftp.mkdir('./storage_tasks_sftp_test/test_many')
+        errors = sftp.put_many([('./test_data/test.txt', './storage_tasks_sftp_test/test_many/test1.txt'),
+                                ('./test_data/test_data.xlsx', './storage_tasks_sftp_test/test_many/test2.xlsx')])
+        self.assertEqual(len(errors), 0)
+
+        errors = sftp.get_many([('./storage_tasks_sftp_test/test_many/test2.xlsx',
+                                 './test_data/test_data_downloaded_many.xlsx')])
+        self.assertEqual(len(errors), 0)
+        with open('./test_data/test_data.xlsx', 'rb') as f1:
+            with open('./test_data/test_data_downloaded_many.xlsx', 'rb') as f2:
+                self.assertEqual(f1.read(), f2.read())
+        os.remove('./test_data/test_data_downloaded_many.xlsx')
+
+    def test_many_without_pipelining(self):
+        # Paramiko without the private request API
+        sftp.pipelining = False
+        try:
+            sftp.mkdir('./storage_tasks_sftp_test/test_sequential')
+            errors = sftp.put_many([('./test_data/test_data.xlsx',
+                                     './storage_tasks_sftp_test/test_sequential/test.xlsx')])
+            self.assertEqual(len(errors), 0)
+
+            errors = sftp.get_many([('./storage_tasks_sftp_test/test_sequential/test.xlsx',
+                                     './test_data/test_data_downloaded_sequential.xlsx')])
+            self.assertEqual(len(errors), 0)
+            with open('./test_data/test_data.xlsx', 'rb') as f1:
+                with open('./test_data/test_data_downloaded_sequential.xlsx', 'rb') as f2:
+                    self.assertEqual(f1.read(), f2.read())
+            os.remove('./test_data/test_data_downloaded_sequential.xlsx')
+
+            self.assertEqual(len(sftp.rmtree('./storage_tasks_sftp_test/test_sequential')), 0)
+            self.assertFalse(sftp.is_path('./storage_tasks_sftp_test/test_sequential'))
+        finally:
+            sftp.pipelining = sftpmodule.PipelinedRequests.is_supported(sftp.SFTP_Client)
+
+    def test_split_by_size(self):
+        self.assertEqual(sftpmodule.split_by_size(['a', 'b', 'c', 'd'], [10, 10, 30, 5], 20),
+                         [['a', 'b'], ['c'], ['d']], 'Groups should not exceed the maximum size')
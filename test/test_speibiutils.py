@@ -3,10 +3,13 @@ import sftp.sftp as sftpmodule
 import dotenv
 import os
 import shutil
+from unittest import mock
+import pandas as pd
 
 import speibiutils.speibiutils as speibi
 import speibiutils.workflow as workflow
-from datetime import date, timedelta
+from speibiutils.barcodeindex import BarcodeIndex
+from datetime import date, datetime, time, timedelta
 
 dotenv.load_dotenv()
 host = os.getenv('SFTP_HOST')
@@ -18,6 +21,53 @@ log = speibi.LogFile()
 SBK_DIR = speibi.SBK_DIR
 
 
+def check_forms_offline(directories: list,
+                        check_results: dict,
+                        concurrency: int = 1) -> (speibi.TaskSummary, mock.Mock):
+    """Check NEW forms with the results of check_remote_form given by directory, without SFTP connection
+
+    Results are tuples (is_available, is_conform, barcodes, messages) or an exception raised by the check.
+    Returns the task summary and the mock of the save method.
+    """
+    for account, directory in directories:
+        os.makedirs(f'./data/{account}/download/storage_tasks/{directory}', exist_ok=True)
+        shutil.copy('./test_data/test_data.xlsx', f'./data/{account}/download/storage_tasks/{directory}/'
+                                                  f'{directory[:-len("_NEW")]}.xlsx')
+    if os.path.isfile('./test_data/barcode_index.db'):
+        os.remove('./test_data/barcode_index.db')
+
+    task_summary = object.__new__(speibi.TaskSummary)
+    task_summary.tasks = pd.DataFrame([speibi.Task(directory=directory, account=account).get_parameters()
+                                       for account, directory in directories],
+                                      columns=speibi.TASK_SUMMARY_COLUMNS).astype(object).fillna('')
+
+    def check_remote_form(task):
+        result = check_results[task.get_directory()]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    with mock.patch.object(speibi.TaskSummary, 'check_remote_form', staticmethod(check_remote_form)), \
+            mock.patch.object(speibi.TaskSummary, 'get_barcode_index',
+                              lambda self: BarcodeIndex('./test_data/barcode_index.db')), \
+            mock.patch.object(speibi.TaskSummary, 'save') as save:
+        try:
+            task_summary.check_forms_conformity(sftp=mock.MagicMock(), concurrency=concurrency)
+        finally:
+            os.remove('./test_data/barcode_index.db')
+
+    return task_summary, save
+
+
+def remove_local_tasks(directories: list) -> None:
+    """Remove the local directories of the tasks, whatever their state"""
+    for account, directory in directories:
+        task_name = speibi.Task(directory=directory, account=account).get_name()
+        for local_directory in os.listdir(f'./data/{account}/download/storage_tasks'):
+            if local_directory.startswith(task_name):
+                shutil.rmtree(f'./data/{account}/download/storage_tasks/{local_directory}')
+
+
 class Test_speibiutils(unittest.TestCase):
 
     @classmethod
@@ -105,6 +155,151 @@ class Test_speibiutils(unittest.TestCase):
         # sftp.remove('./sbkrzs/download/storage_tasks/task_2033-01-01_RZS_LARGE_NEW')
         # sftp.remove('./sbkzbs/download/storage_tasks/task_2033-01-01_ZBS_LARGE_ERROR')
 
+    def test_get_reconciliation_actions(self):
+        task_summary = speibi.TaskSummary()
+        task_summary.tasks.loc[len(task_summary.tasks)] = {'Account': 'sbkrzs',
+                                                           'Directory': 'task_2035-01-01_RZS_LARGE_READY',
+                                                           'Scheduled_date': '2035-01-01',
+                                                           'Size': 'LARGE',
+                                                           'State': 'READY'}
+        remote_dir = 'download/storage_tasks'
+        actions = task_summary.get_reconciliation_actions(
+            [f'sbkrzs/{remote_dir}/task_2035-01-01_RZS_LARGE_READY',
+             f'sbkrzs/{remote_dir}/task_2035-01-01_RZS_LARGE_NEW',
+             f'sbkzbs/{remote_dir}/task_2035-01-01_ZBS_LARGE_NEW',
+             f'sbkzbs/{remote_dir}/task_2035-02-01_ZBS_LARGE_NEW',
+             f'sbkzbs/{remote_dir}/task_2000-01-01_ZBS_LARGE_NEW'])
+        actions = [(action, target if isinstance(target, str) else target.get_directory())
+                   for action, target, _ in actions]
+
+        self.assertEqual(actions,
+                         [('remove', f'sbkrzs/{remote_dir}/task_2035-01-01_RZS_LARGE_NEW'),
+                          ('add', 'task_2035-01-01_ZBS_LARGE_NEW'),
+                          ('add', 'task_2035-02-01_ZBS_LARGE_NEW'),
+                          ('expire', f'sbkzbs/{remote_dir}/task_2000-01-01_ZBS_LARGE_NEW')],
+                         'Duplicate, new tasks and outdated task should be detected, durations are checked later')
+
+    def test_is_task_date_available(self):
+        task_summary = speibi.TaskSummary()
+        task_summary.tasks.loc[len(task_summary.tasks)] = {'Account': 'sbkubs',
+                                                           'Directory': 'task_2035-03-01_UBS_LARGE_DONE',
+                                                           'Start_time': '2035-03-01 02:00:00',
+                                                           'End_time': '2035-03-01 04:00:00',
+                                                           'Scheduled_date': '2035-03-01',
+                                                           'Size': 'LARGE',
+                                                           'State': 'DONE',
+                                                           'Barcodes': '1000',
+                                                           'Source_IZ': 'UBS'}
+        task_summary.tasks.loc[len(task_summary.tasks)] = {'Account': 'sbkubs',
+                                                           'Directory': 'task_2035-04-01_UBS_LARGE_READY',
+                                                           'Scheduled_date': '2035-04-01',
+                                                           'Size': 'LARGE',
+                                                           'State': 'READY',
+                                                           'Barcodes': '1500',
+                                                           'Source_IZ': 'UBS'}
+
+        self.assertEqual(task_summary.get_items_per_hour('UBS'), 500, 'Throughput should come from DONE tasks')
+        self.assertEqual(task_summary.get_items_per_hour('ZBS'), 500, 'Throughput of all IZ should be used')
+        self.assertEqual(task_summary.get_scheduled_hours('2035-04-01', 'LARGE'), 3, 'READY task should last 3 h')
+
+        task = speibi.Task(directory='task_2035-04-01_ZBS_LARGE_NEW', account='sbkzbs')
+        self.assertTrue(task_summary.is_task_date_available(task)[0], 'Without barcodes the date is available')
+        self.assertTrue(task_summary.is_task_date_available(task, 1000, 'ZBS')[0],
+                        'Task should fit in the processing window')
+        self.assertFalse(task_summary.is_task_date_available(task, 1600, 'ZBS')[0],
+                         'Task should not fit in the processing window')
+
+        # LARGE tasks of today only get the remaining part of the window of today
+        task = speibi.Task(directory=f'task_{date.today().isoformat()}_ZBS_LARGE_NEW', account='sbkzbs')
+        self.assertTrue(task_summary.is_task_date_available(task, 1000, 'ZBS',
+                                                            now=datetime.combine(date.today(), time(1)))[0],
+                        'LARGE task of today should be admitted before the window starts')
+        self.assertFalse(task_summary.is_task_date_available(task, 1000, 'ZBS',
+                                                             now=datetime.combine(date.today(), time(7)))[0],
+                         'LARGE task of today should not fit in the end of the window')
+        self.assertFalse(task_summary.is_task_date_available(task, None, None,
+                                                             now=datetime.combine(date.today(), time(10)))[0],
+                         'LARGE task of today should be rejected once the window is over')
+
+    def test_check_forms_processing_window(self):
+        # 1000 barcodes last 3.3 h with the default throughput, only one task fits in the 6 h LARGE window
+        directories = [('sbkzbs', 'task_2036-01-01_ZBS_LARGE_NEW'), ('sbkrzs', 'task_2036-01-01_RZS_LARGE_NEW')]
+        self.addCleanup(remove_local_tasks, directories)
+        task_summary, save = check_forms_offline(
+            directories,
+            {'task_2036-01-01_ZBS_LARGE_NEW': (True, True, [f'A{i}' for i in range(1000)], []),
+             'task_2036-01-01_RZS_LARGE_NEW': (True, True, [f'B{i}' for i in range(1000)], [])})
+
+        self.assertTrue('task_2036-01-01_ZBS_LARGE_READY' in task_summary.get_directories(),
+                        'First task should be admitted')
+        self.assertTrue('task_2036-01-01_RZS_LARGE_ERROR' in task_summary.get_directories(),
+                        'Second task of the same check should not fit in the remaining window')
+        with open('./data/sbkrzs/download/storage_tasks/task_2036-01-01_RZS_LARGE_ERROR/form_check_result.txt') as f:
+            self.assertTrue('Not enough time' in f.read(), 'Reason should be written in the check result')
+
+    def test_check_forms_concurrency(self):
+        directories = [('sbkzbs', 'task_2037-01-01_ZBS_LARGE_NEW'), ('sbkrzs', 'task_2037-01-02_RZS_LARGE_NEW'),
+                       ('sbkuzh', 'task_2037-01-03_UZH_LARGE_NEW'), ('sbkubs', 'task_2037-01-04_UBS_LARGE_NEW'),
+                       ('sbkhsg', 'task_2037-01-05_HSG_LARGE_NEW')]
+        self.addCleanup(remove_local_tasks, directories)
+
+        # Fourth form has a barcode of the first one
+        task_summary, _ = check_forms_offline(
+            directories,
+            {'task_2037-01-01_ZBS_LARGE_NEW': (True, True, ['C1', 'C2'], []),
+             'task_2037-01-02_RZS_LARGE_NEW': (True, True, ['C3'], []),
+             'task_2037-01-03_UZH_LARGE_NEW': (True, True, ['C4'], []),
+             'task_2037-01-04_UBS_LARGE_NEW': (True, True, ['C5', 'C2'], []),
+             'task_2037-01-05_HSG_LARGE_NEW': (True, True, ['C6'], [])},
+            concurrency=4)
+
+        self.assertEqual(task_summary.tasks['Directory'].tolist(),
+                         ['task_2037-01-01_ZBS_LARGE_READY', 'task_2037-01-02_RZS_LARGE_READY',
+                          'task_2037-01-03_UZH_LARGE_READY', 'task_2037-01-04_UBS_LARGE_ERROR',
+                          'task_2037-01-05_HSG_LARGE_READY'],
+                         'Forms checked in parallel should be handled in the order of the task summary')
+        self.assertEqual(task_summary.tasks['Barcodes'].tolist()[:3], [2, 1, 1],
+                         'Number of barcodes should be set for the READY tasks')
+
+    def test_check_forms_mixed_results(self):
+        directories = [('sbkzbs', 'task_2037-02-01_ZBS_LARGE_NEW'), ('sbkrzs', 'task_2037-02-02_RZS_LARGE_NEW'),
+                       ('sbkuzh', 'task_2037-02-03_UZH_LARGE_NEW')]
+        self.addCleanup(remove_local_tasks, directories)
+
+        task_summary, save = check_forms_offline(
+            directories,
+            {'task_2037-02-01_ZBS_LARGE_NEW': (True, True, ['D1'], []),
+             'task_2037-02-02_RZS_LARGE_NEW': (True, False, [], ['Invalid barcode column']),
+             'task_2037-02-03_UZH_LARGE_NEW': (False, False, [], ['Missing file task_2037-02-03_UZH_LARGE.xlsx'])},
+            concurrency=2)
+
+        self.assertEqual(task_summary.tasks['State'].tolist(), ['READY', 'ERROR', 'ERROR'],
+                         'Accepted and rejected forms should be applied')
+        self.assertEqual(task_summary.tasks['Message'].tolist()[1:],
+                         ['task_2037-02-02_RZS_LARGE_NEW: invalid form', 'Missing file task_2037-02-03_UZH_LARGE.xlsx'],
+                         'Reason of the rejection should be in the task summary')
+        self.assertEqual(save.call_count, 1, 'Task summary should be saved once for all the transitions')
+
+    def test_check_forms_error(self):
+        directories = [('sbkzbs', 'task_2037-03-01_ZBS_LARGE_NEW'), ('sbkrzs', 'task_2037-03-02_RZS_LARGE_NEW'),
+                       ('sbkuzh', 'task_2037-03-03_UZH_LARGE_NEW')]
+        self.addCleanup(remove_local_tasks, directories)
+
+        with self.assertLogs(level='ERROR') as logs:
+            task_summary, save = check_forms_offline(
+                directories,
+                {'task_2037-03-01_ZBS_LARGE_NEW': (True, True, ['E1'], []),
+                 'task_2037-03-02_RZS_LARGE_NEW': ConnectionError('connection lost'),
+                 'task_2037-03-03_UZH_LARGE_NEW': (True, False, [], ['Invalid barcode column'])},
+                concurrency=2)
+
+        self.assertEqual(task_summary.tasks['Directory'].tolist(),
+                         ['task_2037-03-01_ZBS_LARGE_READY', 'task_2037-03-02_RZS_LARGE_NEW',
+                          'task_2037-03-03_UZH_LARGE_ERROR'],
+                         'Form with an error should stay NEW, the others should still be handled')
+        self.assertTrue(any('connection lost' in line for line in logs.output), 'Error should be logged')
+        self.assertEqual(save.call_count, 1, 'Transitions of the other forms should be saved')
+
     def test_check_forms_conformity(self):
 
         sftp.mkdir('./sbkuzh/download/storage_tasks/task_2050-01-01_UZH_LARGE_NEW')
@@ -210,6 +405,25 @@ class Test_speibiutils(unittest.TestCase):
         self.assertEqual(t.get_parameters()['State'], 'NEW', 'State should be NEW')
         self.assertEqual(t.get_parameters()['Account'], 'sbkhsg', 'Account should be sbkhsg')
 
+        self.assertEqual(t, speibi.Task('sbkhsg/download/storage_tasks/task_2041-01-01_HSG_LARGE_NEW'),
+                         'Tasks with the same path should be equal')
+        self.assertEqual(len({t, speibi.Task(directory='task_2041-01-01_HSG_LARGE_NEW', account='sbkhsg')}), 1,
+                         'Tasks with the same path should have the same hash')
+        with self.assertRaises(AttributeError):
+            t.state = 'DONE'
+
+        self.assertFalse(speibi.Task(directory='task_2041-13-01_HSG_LARGE_NEW', account='sbkhsg').is_valid(),
+                         'Task with impossible date is not valid')
+        self.assertIsNone(speibi.Task(directory='task_HSG_LARGE_NEW', account='sbkhsg').get_directory_path(),
+                          'Invalid task has no path')
+
+        archived = speibi.Task('sbkhsg/download/storage_tasks/task_2041-01-01_HSG_LARGE_DONE.zip')
+        self.assertTrue(archived.is_valid() and archived.archived, 'Bundle of a task is an archived task')
+        self.assertEqual(archived.get_directory(), 'task_2041-01-01_HSG_LARGE_DONE',
+                         'Directory of an archived task should not have the suffix of the bundle')
+        self.assertEqual(archived.get_bundle_path(), archived.remote_path,
+                         'Bundle path should be the remote path of an archived task')
+
     def test_check_excel_file_conformity(self):
 
         # Valid form
@@ -357,6 +571,33 @@ class Test_speibiutils(unittest.TestCase):
 
         tasks = speibi.TaskSummary().get_directories()
 
+    def test_new_task_4(self):
+        old_date = (date.today() + timedelta(days=10)).isoformat()
+        new_date = (date.today() + timedelta(days=12)).isoformat()
+        sftp.mkdir(f'./sbkzbz/download/storage_tasks/task_{old_date}_ZBZ4_SMALL_DONE')
+        sftp.put('./test_data/test_data.xlsx',
+                 f'./sbkzbz/download/storage_tasks/task_{old_date}_ZBZ4_SMALL_DONE/task_{old_date}_ZBZ4_SMALL.xlsx')
+        sftp.put('./test_data/task_today_UZB_SMALL_NEW/task_today_UZB_LARGE_items_processing.csv',
+                 f'./sbkzbz/download/storage_tasks/task_{old_date}_ZBZ4_SMALL_DONE/'
+                 f'task_{old_date}_ZBZ4_SMALL_items_processing.csv')
+
+        sftp.put('./test_data/test_data.xlsx',
+                 f'./sbkzbz/upload/storage_tasks/task_{old_date}_{new_date}_ZBZ4_SMALL_RESTART.xlsx')
+
+        new_tasks = speibi.RemoteLocation().get_new_tasks()
+        for new_task_path in new_tasks:
+            speibi.NewTask(new_task_path)
+
+        self.assertTrue(sftp.is_file(f'./sbkzbz/download/storage_tasks/task_{new_date}_ZBZ4_SMALL_NEW/'
+                                     f'task_{new_date}_ZBZ4_SMALL.xlsx'),
+                        'Form of the restarted SMALL task should have the new date')
+        self.assertTrue(sftp.is_file(f'./sbkzbz/download/storage_tasks/task_{new_date}_ZBZ4_SMALL_NEW/'
+                                     f'task_{new_date}_ZBZ4_SMALL_items_processing.csv'),
+                        'Processing file of the restarted SMALL task should have the new date')
+        self.assertFalse(sftp.is_file(f'./sbkzbz/upload/storage_tasks/'
+                                      f'task_{old_date}_{new_date}_ZBZ4_SMALL_RESTART.xlsx'),
+                         'Restart form should be removed')
+
     @classmethod
     def tearDownClass(cls):
         sftp.close()
@@ -0,0 +1,46 @@
+import unittest
+import os
+import shutil
+
+from speibiutils import taskbundle
+
+
+class Test_taskbundle(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        if os.path.exists('./test_data/bundle'):
+            shutil.rmtree('./test_data/bundle')
+        shutil.copytree('./test_data/task_2020-01-01_UBS_LARGE_NEW',
+                        './test_data/bundle/task_2020-01-01_UBS_LARGE_DONE')
+        os.mkdir('./test_data/bundle/task_2020-01-01_UBS_LARGE_DONE/logs')
+        with open('./test_data/bundle/task_2020-01-01_UBS_LARGE_DONE/logs/log.txt', 'w') as f:
+            f.write('test log')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree('./test_data/bundle')
+
+    def test_pack_and_unpack(self):
+        directory_path = './test_data/bundle/task_2020-01-01_UBS_LARGE_DONE'
+        bundle_path = taskbundle.pack(directory_path)
+        self.assertEqual(bundle_path, f'{directory_path}.zip', 'Bundle should be next to the directory')
+
+        index = taskbundle.read_index(bundle_path)
+        self.assertEqual(index['directory'], 'task_2020-01-01_UBS_LARGE_DONE', 'Index should have the directory')
+        names = [f['name'] for f in index['files']]
+        self.assertIn('logs/log.txt', names, 'Files of subdirectories should be in the index')
+
+        self.assertEqual(taskbundle.read_file(bundle_path, 'logs/log.txt'), b'test log',
+                         'Files should be readable without unpacking')
+        self.assertIsNone(taskbundle.read_file(bundle_path, 'missing.txt'), 'Missing file should return None')
+
+        shutil.rmtree(directory_path)
+        taskbundle.unpack(bundle_path, directory_path)
+        self.assertEqual(sorted(os.listdir(directory_path)), ['logs', 'test_data.xlsx'],
+                         'Unpacked directory should have the packed files')
+        self.assertFalse(os.path.exists(f'{directory_path}/{taskbundle.INDEX_NAME}'), 'Index should not be unpacked')
+
+
+if __name__ == '__main__':
+    unittest.main()
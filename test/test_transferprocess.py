@@ -0,0 +1,59 @@
+import unittest
+import os
+import pandas as pd
+
+from speibiutils import almacache, processingfile
+from speibiutils import transferprocess
+
+
+class FakeItem:
+    def __init__(self, barcode):
+        self.barcode = barcode
+        self.error = False
+        self.updated = False
+
+    def update(self):
+        self.updated = True
+
+
+class FakeTask:
+    @staticmethod
+    def get_processing_file_path(local=False):
+        return './test_data/test_items_processing.csv'
+
+
+class Test_transferprocess(unittest.TestCase):
+
+    def setUp(self):
+        # The shared cache is created in the test data instead of the data directory
+        almacache._cache = almacache.AlmaCache('./test_data/alma_cache.db')
+
+    def tearDown(self):
+        almacache._cache.close()
+        almacache._cache = None
+        os.remove('./test_data/alma_cache.db')
+        if os.path.exists('./test_data/test_items_processing.csv'):
+            os.remove('./test_data/test_items_processing.csv')
+
+    def test_rename_source_item_already_updated(self):
+        item_s = FakeItem('OLD_A1')
+
+        self.assertTrue(transferprocess.rename_source_item(item_s, False),
+                        'Item with the "OLD_" prefix should be considered as renamed')
+        self.assertFalse(item_s.updated, 'Item already renamed should not be updated again')
+        self.assertEqual(item_s.barcode, 'OLD_A1', 'Barcode should not get a second prefix')
+
+    def test_rename_source_items_already_updated(self):
+        df = processingfile.new_processing_file(['A1'])
+        df.loc[df.Barcode == 'A1', 'Item_id_d'] = '2330924810005525'
+
+        transferprocess.rename_source_items(FakeTask(), df, {'force_update': False}, {'A1': FakeItem('OLD_A1')},
+                                            concurrency=1)
+
+        self.assertTrue(df.loc[0, 'Renamed'], 'Item already renamed should be marked as renamed')
+        self.assertTrue(df.loc[0, 'Copied'], 'Item already renamed should be marked as copied')
+        self.assertTrue(pd.isna(df.loc[0, 'Error']), 'No error should be set')
+
+
+if __name__ == '__main__':
+    unittest.main()